@@ -0,0 +1,258 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from models_config import MODEL_REGISTRY, get_model_path, list_available_models
+
+# Scores per (model file, eval set) persist here, so sweeps over threads or
+# affinity do not re-run the suite for a model that was already scored
+ACCURACY_CACHE_ENV = "EDGE_ACCURACY_CACHE"
+DEFAULT_CACHE_PATH = "accuracy_cache.json"
+
+CATEGORIES = ["Coding", "Reasoning", "Chat"]
+
+# Few-shot prefix per category; shared by every item through KV reuse
+FEW_SHOT = {
+    "Coding": (
+        "Answer with the exact output of the Python code.\n\n"
+        "Q: print(3 + 4)\nA: 7\n\n"
+        "Q: print(len([1, 2, 3]))\nA: 3\n\n"
+        "Q: print('ab' * 2)\nA: abab\n\n"
+    ),
+    "Reasoning": (
+        "Answer with a single number.\n\n"
+        "Q: Tom has 3 apples and buys 2 more. How many apples does he have?\nA: 5\n\n"
+        "Q: A box holds 4 rows of 5 eggs. How many eggs are in the box?\nA: 20\n\n"
+        "Q: Anna had 10 sweets and ate 4. How many are left?\nA: 6\n\n"
+    ),
+    "Chat": (
+        "Answer with one word.\n\n"
+        "Q: What color is the sky on a clear day?\nA: Blue\n\n"
+        "Q: What is the opposite of hot?\nA: Cold\n\n"
+        "Q: Which animal says meow?\nA: Cat\n\n"
+    ),
+}
+
+# (question, expected answer, answer kind)
+EVAL_ITEMS = {
+    "Coding": [
+        ("print(2 ** 3)", "8", "number"),
+        ("print(10 // 3)", "3", "number"),
+        ("print(len('hello'))", "5", "number"),
+        ("print(sum([1, 2, 3, 4]))", "10", "number"),
+        ("print('abc'.upper())", "ABC", "word"),
+        ("print(max(4, 9, 2))", "9", "number"),
+        ("print([1, 2, 3][-1])", "3", "number"),
+        ("print(7 % 4)", "3", "number"),
+        ("print('x' + 'y')", "xy", "word"),
+        ("print(int('12') + 1)", "13", "number"),
+    ],
+    "Reasoning": [
+        ("Sam has 8 marbles and gives away 3. How many marbles does he have left?", "5", "number"),
+        ("A car has 4 wheels. How many wheels do 3 cars have?", "12", "number"),
+        ("There are 15 birds on a tree and 6 fly away. How many birds remain?", "9", "number"),
+        ("A pizza is cut into 8 slices and 2 people eat 3 slices each. How many slices are left?", "2", "number"),
+        ("Lisa reads 10 pages a day. How many pages does she read in 7 days?", "70", "number"),
+        ("A shirt costs 20 dollars and is sold at half price. What does it cost?", "10", "number"),
+        ("If today is the 3rd and a meeting is in 9 days, on what day of the month is it?", "12", "number"),
+        ("A train leaves with 50 people, 12 get off and 5 get on. How many are on the train?", "43", "number"),
+        ("Each bag holds 6 oranges. How many bags are needed for 24 oranges?", "4", "number"),
+        ("Ben is 4 years older than Ann, who is 9. How old is Ben?", "13", "number"),
+    ],
+    "Chat": [
+        ("What is the capital of France?", "Paris", "word"),
+        ("What is the opposite of up?", "Down", "word"),
+        ("Which planet do we live on?", "Earth", "word"),
+        ("What do bees make?", "Honey", "word"),
+        ("What color is grass?", "Green", "word"),
+        ("Which animal barks?", "Dog", "word"),
+        ("What is frozen water called?", "Ice", "word"),
+        ("What is the opposite of day?", "Night", "word"),
+        ("Which season comes after winter?", "Spring", "word"),
+        ("What do you call a baby cat?", "Kitten", "word"),
+    ],
+}
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?=\D)")
+_WORD = re.compile(r"[A-Za-z]+(?=[^A-Za-z])")
+
+
+def eval_set_version() -> str:
+    """Hash of the prompts and items; cached scores from another version are ignored."""
+    payload = json.dumps([FEW_SHOT, EVAL_ITEMS], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def extract_answer(text: str, kind: str, final: bool = False):
+    """
+    First complete number / word in a completion, or None while it could
+    still grow. final=True accepts a token that runs to the end of text.
+    """
+    text = text.strip() + (" " if final else "")
+    match = (_NUMBER if kind == "number" else _WORD).search(text)
+    return match.group(0) if match else None
+
+
+def _correct(answer, expected: str, kind: str) -> bool:
+    if answer is None:
+        return False
+    if kind == "number":
+        return float(answer) == float(expected)
+    return answer.lower() == expected.lower()
+
+
+def _cache_path() -> str:
+    return os.environ.get(ACCURACY_CACHE_ENV, DEFAULT_CACHE_PATH)
+
+
+def _cache_key(model_key: str) -> str:
+    path = get_model_path(model_key)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    return f"{os.path.basename(path)}:{size}:{eval_set_version()}"
+
+
+def _read_cache() -> dict:
+    try:
+        with open(_cache_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(key: str, scores: dict):
+    cache = _read_cache()
+    cache[key] = scores
+    tmp = _cache_path() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp, _cache_path())
+
+
+def score_items(engine, categories=None, max_tokens: int = 8) -> dict:
+    """
+    Run every eval item through a started BatchEngine; returns per-category
+    percentages plus Total (mean of categories).
+
+    Approach:
+      - Prefill each category's few-shot prefix once (engine.add_prefix);
+        items copy its KV cells and only prefill their own question
+      - Submit all items at once so they share decode steps
+      - Greedy decoding, stopped at a newline or as soon as a complete
+        answer can be extracted from the partial completion
+    """
+    categories = categories or CATEGORIES
+    done = threading.Condition()
+    pending = []
+    results = {c: [] for c in categories}
+
+    def on_event(req, piece, finish_reason, category=None, expected=None, kind=None):
+        if finish_reason is None:
+            if extract_answer(req.text, kind) is not None:
+                req.cancel()
+            return
+        ok = _correct(extract_answer(req.text, kind, final=True), expected, kind)
+        with done:
+            results[category].append(ok)
+            pending.remove(req)
+            done.notify()
+
+    from batch_engine import GenerationRequest
+
+    prefixes = []
+    for category in categories:
+        prefix = engine.add_prefix(engine.tokenize(FEW_SHOT[category]))
+        prefixes.append(prefix)
+        for question, expected, kind in EVAL_ITEMS[category]:
+            suffix = engine.tokenize(f"Q: {question}\nA:", add_bos=False)
+            req = GenerationRequest(
+                prefix.tokens + suffix, max_tokens=max_tokens, temperature=0.0, stop=["\n"],
+                on_event=lambda r, p, f, c=category, e=expected, k=kind: on_event(r, p, f, c, e, k),
+                prefix=prefix,
+            )
+            with done:
+                pending.append(req)
+            engine.submit(req)
+
+    with done:
+        while pending:
+            done.wait()
+    for prefix in prefixes:
+        engine.release_prefix(prefix)
+
+    scores = {c: round(100.0 * sum(r) / len(r), 1) if r else 0.0 for c, r in results.items()}
+    scores["Total"] = round(sum(scores[c] for c in categories) / len(categories), 1)
+    return scores
+
+
+def evaluate_accuracy(llm, key: str, use_cache: bool = True, n_seq: int = 8) -> dict:
+    """
+    Coding / Reasoning / Chat / Total accuracy (%) of a loaded model.
+    The batch context reuses llm's weights; scores are cached per model file.
+    """
+    cache_key = _cache_key(key)
+    if use_cache:
+        cached = _read_cache().get(cache_key)
+        if cached is not None:
+            return cached
+
+    from batch_engine import BatchEngine
+
+    # One extra sequence per category holds its few-shot prefix
+    engine = BatchEngine(key, n_ctx=2048, n_threads=getattr(llm, "n_threads", 4),
+                         n_seq_max=n_seq + len(CATEGORIES), llm=llm).start()
+    try:
+        scores = score_items(engine)
+    finally:
+        engine.close()
+    if use_cache:
+        _write_cache(cache_key, scores)
+    return scores
+
+
+def _evaluate_key(key: str, n_threads: int, use_cache: bool) -> dict:
+    from model_pool import get_pool
+
+    t0 = time.perf_counter()
+    with get_pool().lease(key, n_ctx=2048, n_threads=n_threads) as llm:
+        scores = evaluate_accuracy(llm, key, use_cache=use_cache)
+    scores["eval_s"] = round(time.perf_counter() - t0, 2)
+    return scores
+
+
+def evaluate_models(keys, n_threads: int = 4, workers: int = 1, use_cache: bool = True,
+                    timeout_s: int = 600) -> dict:
+    """Score each model in its own worker process; returns {key: scores or error outcome}."""
+    from worker_pool import run_isolated_many
+
+    jobs = [(key, _evaluate_key, (key, n_threads, use_cache), None) for key in keys]
+    results = {}
+    for key, outcome in run_isolated_many(jobs, max_workers=workers, timeout_s=timeout_s):
+        ok = outcome["status"] == "success"
+        results[key] = outcome["result"] if ok else {"status": outcome["status"]}
+        print(f"{'✅' if ok else '❌'} {MODEL_REGISTRY[key]['name']}: {outcome['status']}")
+    return results
+
+
+if __name__ == "__main__":
+    from tabulate import tabulate
+
+    parser = argparse.ArgumentParser(description="Batched accuracy evaluation (Coding / Reasoning / Chat).")
+    parser.add_argument("models", nargs="*", help="registry keys (default: all downloaded)")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=1, help="models evaluated in parallel processes")
+    parser.add_argument("--no-cache", action="store_true", help=f"ignore and do not update {DEFAULT_CACHE_PATH}")
+    args = parser.parse_args()
+
+    keys = args.models or list_available_models()
+    unknown = [k for k in keys if k not in MODEL_REGISTRY]
+    if unknown:
+        raise SystemExit(f"Error: unknown models: {', '.join(unknown)}")
+
+    results = evaluate_models(keys, args.threads, args.workers, use_cache=not args.no_cache)
+    columns = CATEGORIES + ["Total", "eval_s"]
+    print(tabulate([[MODEL_REGISTRY[k]["name"]] + [r.get(c, r.get("status", "")) for c in columns]
+                    for k, r in results.items()], headers=["model"] + columns, tablefmt="github"))
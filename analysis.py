@@ -0,0 +1,301 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+
+from results_store import BOOL_COLUMNS, INT_COLUMNS, REPORT_COLUMNS, REPORT_PATH, STRING_COLUMNS, read_report_rows
+
+# Decimals report.csv uses for the derived columns
+DERIVED_DECIMALS = {
+    "tps_per_billion_params": 4,
+    "ram_per_billion_params": 4,
+    "ttft_ms_per_billion_params": 2,
+    "cies_score": 4,
+}
+
+# Rows that share these keys differ only in thread count / CPU placement
+WORKLOAD_KEYS = ["model_name", "benchmark_type", "context_window", "input_tokens_target", "max_output_tokens"]
+
+
+def load_results(source: str = REPORT_PATH) -> pd.DataFrame:
+    """
+    Load benchmark rows from report.csv or a results_store directory into
+    a typed DataFrame with the derived columns filled in.
+    """
+    if os.path.isdir(source):
+        from results_store import ResultsStore
+        df = ResultsStore(source).to_pandas()
+    else:
+        try:
+            df = _read_typed_csv(source)
+        except (pd.errors.ParserError, ValueError):
+            # Older rows wrote cpu_affinity lists unquoted
+            df = _typed(pd.DataFrame.from_records(list(read_report_rows(source)), columns=REPORT_COLUMNS))
+    # Files written before columns were appended to the schema lack them
+    missing = [c for c in REPORT_COLUMNS if c not in df]
+    if missing:
+        df = df.reindex(columns=list(df.columns) + missing)
+    return add_derived(df)
+
+
+def write_filled(df: pd.DataFrame, path: str):
+    """Write rows in report.csv column order (derived columns filled by load_results)."""
+    df.reindex(columns=REPORT_COLUMNS).to_csv(path, index=False)
+
+
+def _read_typed_csv(path: str) -> pd.DataFrame:
+    """
+    report.csv parsed straight into column dtypes (no str-then-convert pass).
+    Integer columns are read as float64 by the C parser (nullable Int64
+    parsing is several times slower) and narrowed to int64 when complete.
+    """
+    columns = REPORT_COLUMNS + ["run_id"]
+    text = [c for c in columns if c in STRING_COLUMNS or c == "run_id"]
+    numeric = [c for c in columns if c not in STRING_COLUMNS and c not in BOOL_COLUMNS and c != "run_id"]
+    dtype = {c: "string" for c in text}
+    dtype.update({c: "float64" for c in numeric})
+    df = pd.read_csv(
+        path, index_col=False, dtype=dtype,
+        true_values=["True", "true"], false_values=["False", "false"],
+        keep_default_na=False, na_values={c: [""] for c in columns if c not in text},
+    )
+    for col in df.columns:
+        if col in BOOL_COLUMNS and df[col].dtype != bool:
+            # Blank cells keep the column from parsing as bool
+            df[col] = df[col].fillna(False).astype(bool)
+        elif col in INT_COLUMNS and not df[col].hasnans:
+            df[col] = df[col].astype("int64")
+    return df
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert an all-string frame (the read_report_rows fallback) to column dtypes."""
+    df = df.copy()
+    for col in df.columns:
+        if col in STRING_COLUMNS or col == "run_id":
+            df[col] = df[col].astype("string")
+        elif col in BOOL_COLUMNS:
+            if df[col].dtype != bool:
+                df[col] = df[col].astype("string").str.strip().str.lower() == "true"
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def derived_metrics(params_b, effective_tps, decode_tps, peak_ram_gb, ttft_ms) -> dict:
+    """
+    Size-normalized metrics of report.csv. Works on scalars or on whole
+    columns (NumPy arrays / pandas Series) alike.
+
+    cies_score (CPU Inference Efficiency Score) is decode t/s per GB of
+    peak RAM per billion parameters: higher means more speed for less
+    memory and model size.
+    """
+    return {
+        "tps_per_billion_params": effective_tps / params_b,
+        "ram_per_billion_params": peak_ram_gb / params_b,
+        "ttft_ms_per_billion_params": ttft_ms / params_b,
+        "cies_score": decode_tps / (peak_ram_gb * params_b),
+    }
+
+
+def _threads(df: pd.DataFrame) -> pd.Series:
+    """Threads a row scales with: n_threads for decode, n_threads_batch (if set) for prefill."""
+    if "thread_count_batch" not in df:
+        return df["thread_count"]
+    batch = df["thread_count_batch"].fillna(df["thread_count"])
+    return df["thread_count"].where(df["benchmark_type"] == "decode", batch)
+
+
+def _rate(df: pd.DataFrame) -> pd.Series:
+    """Scaling metric per row: decode rate, or effective throughput for prefill rows."""
+    return df["decode_rate_tps"].where(df["benchmark_type"] == "decode", df["effective_throughput_tps"])
+
+
+def add_derived(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fill tps/ram/ttft per billion params, cies_score and missing
+    parallel_efficiency; add a `speedup` column (rate over the 1-thread
+    rate of the same workload). Prefill rows scale with thread_count_batch
+    when it was swept separately.
+    """
+    df = df.copy()
+    params = df["parameter_count_b"].where(df["parameter_count_b"] > 0)
+    peak = df["peak_ram_gb"].where(df["peak_ram_gb"] > 0)
+    derived = derived_metrics(params, df["effective_throughput_tps"], df["decode_rate_tps"], peak, df["ttft_ms"])
+    for col, values in derived.items():
+        df[col] = values.round(DERIVED_DECIMALS[col])
+
+    rate = _rate(df)
+    threads = _threads(df)
+    keys = [df[k] for k in WORKLOAD_KEYS]
+    base = rate.where(threads == 1).groupby(keys, dropna=False).transform("mean")
+    df["speedup"] = (rate / base).round(3)
+    df["parallel_efficiency"] = df["parallel_efficiency"].fillna((df["speedup"] / threads).round(3))
+    return df
+
+
+def speedup_curves(df: pd.DataFrame, benchmark_type: str = "decode") -> pd.DataFrame:
+    """Model x thread_count table of mean speedup over 1 thread."""
+    rows = df[(df["benchmark_type"] == benchmark_type) & (df["status"] == "success")]
+    rows = rows.assign(threads=_threads(rows))
+    curves = rows.pivot_table(index="model_name", columns="threads", values="speedup", aggfunc="mean")
+    return curves.sort_index(axis=1).rename_axis(columns="thread_count")
+
+
+def knee_thread_count(curves: pd.DataFrame, min_gain: float = 0.10) -> pd.Series:
+    """
+    Per model, the fewest threads reaching within `min_gain` (relative) of
+    the best speedup measured; more threads than that buy little.
+    """
+    threads = curves.columns.to_numpy(dtype=float)
+    s = np.nan_to_num(curves.to_numpy(dtype=float), nan=-np.inf)
+    reached = s >= (1.0 - min_gain) * s.max(axis=1, initial=-np.inf)[:, None]
+    knee = np.full(len(s), np.nan)
+    hit = reached.any(axis=1)
+    knee[hit] = threads[reached.argmax(axis=1)[hit]]
+    return pd.Series(knee, index=curves.index, name="knee_threads")
+
+
+def amdahl_fit(curves: pd.DataFrame) -> pd.DataFrame:
+    """
+    Least-squares serial fraction s per model from Amdahl's law
+    S(n) = 1 / (s + (1 - s) / n), i.e. 1/S - 1/n = s * (1 - 1/n).
+    Returns serial_fraction and the implied speedup ceiling 1/s.
+    """
+    n = curves.columns.to_numpy(dtype=float)
+    s = curves.to_numpy(dtype=float)
+    x = np.broadcast_to(1.0 - 1.0 / n, s.shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        y = 1.0 / s - 1.0 / n
+    valid = np.isfinite(y) & (x > 0)
+    sxy = np.where(valid, x * y, 0.0).sum(axis=1)
+    sxx = np.where(valid, x * x, 0.0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        serial = np.clip(sxy / sxx, 0.0, 1.0)
+        ceiling = 1.0 / serial
+    return pd.DataFrame({"serial_fraction": serial.round(3), "max_speedup": np.round(ceiling, 2)}, index=curves.index)
+
+
+def pareto_front(df: pd.DataFrame, maximize=("decode_rate_tps",),
+                 minimize=("peak_ram_gb", "file_size_gb")) -> pd.DataFrame:
+    """
+    Rows of df not dominated on (maximize, minimize) objectives. Rows with
+    a missing objective are dropped.
+
+    Approach:
+      - Sort lexicographically so no later row can dominate an earlier one
+      - Take the first remaining row as a front member and drop, in one
+        vectorized pass, every remaining row it dominates
+      - Cost is O(rows x front size) instead of O(rows^2)
+    """
+    cols = list(maximize) + list(minimize)
+    df = df.dropna(subset=cols)
+    x = np.column_stack([-df[c].to_numpy(dtype=float) for c in maximize] +
+                        [df[c].to_numpy(dtype=float) for c in minimize])
+    remaining = np.lexsort(x.T[::-1])
+    front = []
+    while remaining.size:
+        head = remaining[0]
+        front.append(head)
+        rest = x[remaining[1:]]
+        dominated = (rest >= x[head]).all(axis=1) & (rest > x[head]).any(axis=1)
+        remaining = remaining[1:][~dominated]
+    return df.iloc[sorted(front)]
+
+
+def pick_threads(df: pd.DataFrame, min_gain: float = 0.10) -> pd.DataFrame:
+    """
+    Per model, n_threads and n_threads_batch read off the measured scaling
+    curves: the decode knee, and the knee of prefill rate (prompt tokens per
+    second to first token), which keeps scaling further on compute-bound
+    prefill.
+    """
+    decode = knee_thread_count(speedup_curves(df, "decode"), min_gain)
+    rows = df[(df["benchmark_type"] == "prefill") & (df["status"] == "success") & (df["ttft_ms"] > 0)]
+    rows = rows.assign(threads=_threads(rows), prefill_rate=rows["input_tokens_actual"] * 1000.0 / rows["ttft_ms"])
+    prefill = rows.pivot_table(index="model_name", columns="threads", values="prefill_rate", aggfunc="mean")
+    batch = knee_thread_count(prefill.sort_index(axis=1), min_gain)
+    return pd.DataFrame({"n_threads": decode, "n_threads_batch": batch})
+
+
+def model_summary(df: pd.DataFrame, benchmark_type: str = "decode", min_gain: float = 0.10) -> pd.DataFrame:
+    """
+    One row per model: best thread count and its mean rate, size, peak
+    RAM and CIES, plus the scaling knee and Amdahl fit.
+    """
+    rows = df[(df["benchmark_type"] == benchmark_type) & (df["status"] == "success")].assign(rate=_rate)
+    per_thread = rows.groupby(["model_name", "thread_count"], as_index=False).agg(
+        parameter_count_b=("parameter_count_b", "first"),
+        file_size_gb=("file_size_gb", "first"),
+        rate=("rate", "mean"),
+        ttft_ms=("ttft_ms", "mean"),
+        peak_ram_gb=("peak_ram_gb", "max"),
+        cies_score=("cies_score", "mean"),
+    )
+    best = per_thread.loc[per_thread.groupby("model_name")["rate"].idxmax().dropna()]
+    best = best.rename(columns={"thread_count": "best_threads"}).set_index("model_name")
+
+    curves = speedup_curves(df, benchmark_type)
+    summary = best.join(knee_thread_count(curves, min_gain)).join(amdahl_fit(curves))
+    return summary.round({"rate": 2, "ttft_ms": 2, "cies_score": 4}).sort_values("rate", ascending=False)
+
+
+def rank_models(rows, by, ascending=False) -> list:
+    """Sort report-style dicts by one or more keys (all in the same direction)."""
+    if not rows:
+        return []
+    return pd.DataFrame(rows).sort_values(by, ascending=ascending, kind="stable").to_dict("records")
+
+
+def print_report(df: pd.DataFrame, benchmark_type: str = "decode", min_gain: float = 0.10):
+    curves = speedup_curves(df, benchmark_type)
+    summary = model_summary(df, benchmark_type, min_gain)
+
+    print(f"\nSPEEDUP vs 1 THREAD ({benchmark_type})")
+    table = curves.round(2).reset_index()
+    print(tabulate(table.values.tolist(), headers=["Model"] + [f"{t}T" for t in curves.columns], tablefmt="github"))
+
+    print("\nTHREAD SCALING")
+    print(tabulate(
+        summary[["best_threads", "knee_threads", "serial_fraction", "max_speedup"]].reset_index().values.tolist(),
+        headers=["Model", "Best threads", "Knee", "Serial frac", "Amdahl ceiling"], tablefmt="github"))
+    knees = summary["knee_threads"].dropna()
+    if len(knees):
+        print(f"\n🎯 Sweet spot: {int(knees.mode().iloc[0])} threads "
+              f"(most common knee across {len(knees)} models)")
+
+    picks = pick_threads(df, min_gain).dropna(how="all")
+    if len(picks):
+        print("\nTHREAD SPLIT (decode knee / prefill knee)")
+        print(tabulate(picks.reset_index().values.tolist(),
+                       headers=["Model", "n_threads", "n_threads_batch"], tablefmt="github"))
+
+    print("\nEFFICIENCY LEADERS (CIES)")
+    leaders = summary.sort_values("cies_score", ascending=False).head(10)
+    print(tabulate(leaders[["parameter_count_b", "rate", "peak_ram_gb", "cies_score"]].reset_index().values.tolist(),
+                   headers=["Model", "Params (B)", "t/s", "Peak RAM", "CIES"], tablefmt="github"))
+
+    print("\nPARETO FRONT (speed vs RAM vs size)")
+    front = pareto_front(summary.reset_index(), maximize=("rate",), minimize=("peak_ram_gb", "file_size_gb"))
+    front = front.sort_values("rate", ascending=False)
+    print(tabulate(front[["model_name", "rate", "peak_ram_gb", "file_size_gb", "best_threads"]].values.tolist(),
+                   headers=["Model", "t/s", "Peak RAM", "File GB", "Threads"], tablefmt="github"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Thread-scaling and efficiency analysis of benchmark results.")
+    parser.add_argument("source", nargs="?", default=REPORT_PATH, help="report.csv or a results store directory")
+    parser.add_argument("--type", default="decode", choices=["decode", "prefill"])
+    parser.add_argument("--min-gain", type=float, default=0.10,
+                        help="relative speedup gain below which adding threads counts as the knee")
+    parser.add_argument("--fill", metavar="CSV", help="write the rows with derived columns filled to CSV")
+    args = parser.parse_args()
+
+    data = load_results(args.source)
+    print_report(data, args.type, args.min_gain)
+    if args.fill:
+        write_filled(data, args.fill)
+        print(f"\n💾 Wrote {len(data)} rows to {args.fill}")
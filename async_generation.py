@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import time
+
+# Sentinel closing a request's token queue
+_DONE = object()
+
+
+class GenerationHandle:
+    """
+    One streaming request: an async iterator of text pieces.
+
+    cancel() (from any thread) stops decode within one token: the check runs
+    as a llama stopping criterion after every evaluated token. Leaving the
+    `async for` early (break, exception, task cancellation) cancels too.
+    finish_reason ends up as "stop", "length", "cancelled" or "deadline".
+    token_ids holds the generated tokens as evaluated into the KV cache
+    (a final sampled token that was never evaluated is not included), so
+    they can be appended to the history without re-tokenizing the text.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, prompt: str, max_queue: int, deadline_s: float = None, **kwargs):
+        self.id = next(self._ids)
+        self.prompt = prompt
+        self.kwargs = kwargs
+        self.deadline = time.monotonic() + deadline_s if deadline_s else None
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.loop = asyncio.get_running_loop()
+        self.text = ""
+        self.tokens = 0
+        self.token_ids = []
+        self.finish_reason = None
+        self.error = None
+        self.submitted_at = time.perf_counter()
+        self.first_token_at = None
+        self._cancelled = False
+        self._done = asyncio.Event()
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def stop_reason(self):
+        """Why generation must stop now ("cancelled" / "deadline"), else None."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "deadline"
+        if self._cancelled:
+            return "cancelled"
+        return None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        try:
+            while True:
+                if self.deadline is None:
+                    item = await self.queue.get()
+                else:
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), max(self.deadline - time.monotonic(), 0))
+                    except asyncio.TimeoutError:
+                        break  # still queued or stalled past the deadline
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            if self.finish_reason is None:
+                self.cancel()
+        if self.error is not None:
+            raise self.error
+
+    async def wait(self) -> str:
+        """Wait for the producer to finish (draining nothing); returns finish_reason."""
+        await self._done.wait()
+        return self.finish_reason
+
+    async def result(self) -> str:
+        """Consume the whole stream and return the full text."""
+        async for _ in self:
+            pass
+        return self.text
+
+
+class AsyncLlama:
+    """
+    Asyncio front end for one Llama instance.
+
+    llama calls run on a dedicated single-thread executor (a Llama context
+    is not thread-safe), so the event loop never blocks on decode; requests
+    run one after another in submission order. Each request streams its
+    pieces through a bounded asyncio.Queue: when a consumer falls behind
+    by max_queue pieces, the executor thread waits instead of decoding
+    tokens nobody is reading.
+    """
+
+    def __init__(self, llm, max_queue: int = 16, poll_s: float = 0.05):
+        self.llm = llm
+        self.max_queue = max_queue
+        self.poll_s = poll_s
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="llama")
+
+    def submit(self, prompt: str, max_tokens: int = 128, deadline_s: float = None, **kwargs) -> GenerationHandle:
+        """
+        Queue a completion (kwargs go to llm(...), e.g. stop, temperature)
+        and return its handle; call from inside the event loop.
+        deadline_s bounds queueing + generation wall time.
+        """
+        handle = GenerationHandle(prompt, self.max_queue, deadline_s, max_tokens=max_tokens, **kwargs)
+        future = handle.loop.run_in_executor(self._executor, self._produce, handle)
+        future.add_done_callback(lambda _: handle._done.set())
+        return handle
+
+    def stream(self, prompt: str, **kwargs) -> GenerationHandle:
+        """Alias of submit() for `async for piece in llm.stream(prompt)`."""
+        return self.submit(prompt, **kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    # --- executor thread ---
+
+    def _put(self, handle: GenerationHandle, item) -> bool:
+        """Blocking put with backpressure; False if the request stopped while waiting."""
+        future = asyncio.run_coroutine_threadsafe(handle.queue.put(item), handle.loop)
+        while True:
+            try:
+                future.result(timeout=self.poll_s)
+                return True
+            except concurrent.futures.TimeoutError:
+                if handle.stop_reason():
+                    future.cancel()
+                    return False
+
+    def _finish(self, handle: GenerationHandle, reason: str):
+        handle.finish_reason = reason
+        if reason in ("cancelled", "deadline"):
+            # Stopped request: the consumer may be gone, so make room for the sentinel
+            handle.loop.call_soon_threadsafe(self._close_queue, handle)
+        else:
+            # A slow consumer gets every piece: the sentinel queues behind
+            # them. Not awaited here, so a consumer that closes the executor
+            # from the loop right after its last piece cannot deadlock us.
+            asyncio.run_coroutine_threadsafe(handle.queue.put(_DONE), handle.loop)
+
+    @staticmethod
+    def _close_queue(handle: GenerationHandle):
+        while True:
+            try:
+                handle.queue.put_nowait(_DONE)
+                return
+            except asyncio.QueueFull:
+                handle.queue.get_nowait()  # only for stopped requests: drop the oldest piece
+
+    def _produce(self, handle: GenerationHandle):
+        reason = handle.stop_reason()
+        if reason:
+            self._finish(handle, reason)
+            return
+
+        kwargs = dict(handle.kwargs)
+        user_criteria = kwargs.pop("stopping_criteria", None)
+
+        def criteria(input_ids, logits):
+            # llama calls this after every evaluated token
+            if handle.stop_reason() is not None:
+                return True
+            return bool(user_criteria and user_criteria(input_ids, logits))
+
+        reason = None
+        stream = self.llm(handle.prompt, stream=True, stopping_criteria=criteria, **kwargs)
+        try:
+            for chunk in stream:
+                choice = chunk["choices"][0]
+                piece = choice["text"]
+                if piece:
+                    if handle.first_token_at is None:
+                        handle.first_token_at = time.perf_counter()
+                    handle.text += piece
+                    handle.tokens += 1
+                    if not self._put(handle, piece):
+                        break
+                reason = choice.get("finish_reason") or reason
+            handle.token_ids = self._generated_ids(handle.prompt)
+        except Exception as e:
+            handle.error = e
+            reason = "error"
+        finally:
+            stream.close()
+        self._finish(handle, handle.stop_reason() or reason or "stop")
+
+    def _generated_ids(self, prompt) -> list:
+        llm = self.llm
+        if isinstance(prompt, str):
+            # Tokenized the way llm(...) tokenizes a text prompt
+            prompt = llm.tokenize(prompt.encode("utf-8"), special=True)
+        return [int(t) for t in llm.input_ids[len(prompt):llm.n_tokens]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a completion through the async API.")
+    parser.add_argument("model", help="registry key")
+    parser.add_argument("prompt")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--deadline", type=float, default=None, help="seconds before the request is cut off")
+    parser.add_argument("--cancel-after", type=int, default=None, help="cancel after N pieces (demo)")
+    args = parser.parse_args()
+
+    from model_pool import get_pool
+
+    async def main(llm):
+        gen = AsyncLlama(llm)
+        handle = gen.submit(args.prompt, max_tokens=args.max_tokens, deadline_s=args.deadline)
+        async for i, piece in _enumerate(handle):
+            print(piece, end="", flush=True)
+            if args.cancel_after is not None and i + 1 >= args.cancel_after:
+                handle.cancel()
+        await handle.wait()
+        print(f"\n✅ {handle.tokens} tokens, finish_reason={handle.finish_reason}")
+        gen.close()
+
+    async def _enumerate(aiterable):
+        i = 0
+        async for item in aiterable:
+            yield i, item
+            i += 1
+
+    with get_pool().lease(args.model, n_ctx=2048, n_threads=4) as llm:
+        asyncio.run(main(llm))
@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from models_config import MODEL_REGISTRY, get_model_path, list_available_models
+from analysis import load_results
+from cpu_topology import CpuTopology
+from results_store import REPORT_PATH
+
+PREFERENCES = ("quality", "speed", "ram")
+
+
+class Constraints:
+    """Deployment targets; None means unconstrained."""
+
+    def __init__(self, min_decode_tps: float = None, max_peak_ram_gb: float = None,
+                 max_ttft_ms: float = None, prompt_tokens: int = 1024, n_ctx: int = 4096):
+        self.min_decode_tps = min_decode_tps
+        self.max_peak_ram_gb = max_peak_ram_gb
+        self.max_ttft_ms = max_ttft_ms
+        self.prompt_tokens = prompt_tokens
+        self.n_ctx = max(n_ctx, prompt_tokens)
+
+    def check(self, decode_tps: float, peak_ram_gb: float, ttft_ms: float) -> list:
+        """Names of the constraints a predicted config violates."""
+        failed = []
+        if self.min_decode_tps is not None and not decode_tps >= self.min_decode_tps:
+            failed.append("decode_tps")
+        if self.max_peak_ram_gb is not None and not peak_ram_gb <= self.max_peak_ram_gb:
+            failed.append("peak_ram_gb")
+        if self.max_ttft_ms is not None and not ttft_ms <= self.max_ttft_ms:
+            failed.append("ttft_ms")
+        return failed
+
+
+def _lstsq(features: np.ndarray, target: np.ndarray) -> np.ndarray:
+    ok = np.isfinite(features).all(axis=1) & np.isfinite(target)
+    if ok.sum() <= features.shape[1]:
+        return None
+    coef, *_ = np.linalg.lstsq(features[ok], target[ok], rcond=None)
+    return coef
+
+
+class PerformanceModel:
+    """
+    Log-linear fits over past runs, used for (model, threads) points that
+    were never measured on a host like this one.
+
+    Approach:
+      - decode t/s: log tps ~ log filesize + log params + log effective threads
+        (threads capped at the run's physical cores; decode is bandwidth bound)
+      - TTFT: log ttft ~ log params + log prompt tokens + log effective threads
+      - peak RAM: linear in filesize, at the run's context window
+      - KV cache for another n_ctx comes from GGUF metadata when the file is
+        on disk, else from the measured kv_cache_growth_mb_per_1k fit
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        ok = df[df["status"] == "success"]
+        decode = ok[ok["benchmark_type"] == "decode"]
+        prefill = ok[ok["benchmark_type"] == "prefill"]
+
+        eff = np.minimum(decode["thread_count"], decode["physical_cores"]).to_numpy(dtype=float)
+        self.decode_coef = _lstsq(
+            np.column_stack([np.ones(len(decode)), np.log(decode["file_size_gb"]),
+                             np.log(decode["parameter_count_b"]), np.log(eff)]),
+            np.log(decode["decode_rate_tps"].to_numpy(dtype=float)),
+        )
+        eff = np.minimum(prefill["thread_count"], prefill["physical_cores"]).to_numpy(dtype=float)
+        self.ttft_coef = _lstsq(
+            np.column_stack([np.ones(len(prefill)), np.log(prefill["parameter_count_b"]),
+                             np.log(prefill["input_tokens_actual"]), np.log(eff)]),
+            np.log(prefill["ttft_ms"].to_numpy(dtype=float)),
+        )
+        self.ram_coef = _lstsq(
+            np.column_stack([np.ones(len(ok)), ok["file_size_gb"]]),
+            ok["peak_ram_gb"].to_numpy(dtype=float),
+        )
+        self.kv_coef = _lstsq(
+            np.column_stack([np.ones(len(ok)), ok["parameter_count_b"]]),
+            ok["kv_cache_growth_mb_per_1k"].to_numpy(dtype=float),
+        )
+        ctx = ok["context_window"].dropna()
+        self.base_ctx = int(ctx.median()) if len(ctx) else 4096
+
+    @property
+    def ready(self) -> bool:
+        return all(c is not None for c in (self.decode_coef, self.ttft_coef, self.ram_coef))
+
+    def decode_tps(self, filesize: float, params: float, threads: float) -> float:
+        c = self.decode_coef
+        return float(np.exp(c[0] + c[1] * np.log(filesize) + c[2] * np.log(params) + c[3] * np.log(threads)))
+
+    def ttft_ms(self, params: float, prompt_tokens: int, threads: float) -> float:
+        c = self.ttft_coef
+        return float(np.exp(c[0] + c[1] * np.log(params) + c[2] * np.log(prompt_tokens) + c[3] * np.log(threads)))
+
+    def peak_ram_gb(self, filesize: float) -> float:
+        return float(self.ram_coef[0] + self.ram_coef[1] * filesize)
+
+    def kv_mb_per_1k(self, model_key: str) -> float:
+        path = get_model_path(model_key)
+        if os.path.exists(path):
+            from kv_cache_profile import kv_cache_mb_per_1k
+            try:
+                return kv_cache_mb_per_1k(model_key)
+            except (OSError, ValueError):
+                pass
+        if self.kv_coef is None:
+            return 0.0
+        return max(float(self.kv_coef[0] + self.kv_coef[1] * MODEL_REGISTRY[model_key]["size"]), 0.0)
+
+
+def thread_options(topology: CpuTopology) -> list:
+    """Powers of two up to the logical core count, plus the core counts themselves."""
+    options = {topology.physical_cores, topology.logical_cores}
+    n = 1
+    while n <= topology.logical_cores:
+        options.add(n)
+        n *= 2
+    return sorted(options)
+
+
+def affinity_for(n_threads: int, topology: CpuTopology) -> str:
+    """Affinity strategy (see cpu_topology.plan_affinity) for n_threads on this host."""
+    if n_threads > topology.physical_cores:
+        return "smt"
+    if len(topology.nodes) > 1 and n_threads <= len(topology.cores(topology.nodes[0])):
+        return "numa"
+    return "physical"
+
+
+def _measured(df: pd.DataFrame, host: dict, prompt_tokens: int) -> dict:
+    """
+    {(model_name, thread_count): (decode_tps, peak_ram_gb, ttft_ms, context_window)}
+    from successful rows recorded on a host with the same core counts.
+    """
+    same = df[(df["status"] == "success") &
+              (df["physical_cores"] == host["physical_cores"]) &
+              (df["logical_cores"] == host["logical_cores"])]
+    decode = same[same["benchmark_type"] == "decode"].groupby(["model_name", "thread_count"]).agg(
+        decode_tps=("decode_rate_tps", "mean"), peak_ram_gb=("peak_ram_gb", "max"),
+        context_window=("context_window", "max"))
+
+    ttft = {}
+    prefill = same[same["benchmark_type"] == "prefill"].dropna(subset=["input_tokens_actual", "ttft_ms"])
+    for key, rows in prefill.groupby(["model_name", "thread_count"]):
+        points = rows.groupby("input_tokens_actual")["ttft_ms"].mean()
+        if len(points) >= 2 or prompt_tokens in points.index:
+            # Linear in prompt length; extrapolate from the last two points
+            x, y = points.index.to_numpy(dtype=float), points.to_numpy()
+            if prompt_tokens > x[-1] and len(x) >= 2:
+                slope = (y[-1] - y[-2]) / (x[-1] - x[-2])
+                ttft[key] = float(y[-1] + slope * (prompt_tokens - x[-1]))
+            else:
+                ttft[key] = float(np.interp(prompt_tokens, x, y))
+
+    return {
+        key: (row.decode_tps, row.peak_ram_gb, ttft.get(key), row.context_window)
+        for key, row in decode.iterrows()
+    }
+
+
+def candidates(constraints: Constraints, df: pd.DataFrame, topology: CpuTopology = None,
+               models=None) -> list:
+    """Every (model, threads) config with predicted metrics and the constraints it fails."""
+    topology = topology or CpuTopology.read()
+    host = topology.summary()
+    models = models or list(MODEL_REGISTRY)
+    fit = PerformanceModel(df)
+    measured = _measured(df, host, constraints.prompt_tokens)
+
+    out = []
+    for key in models:
+        meta = MODEL_REGISTRY[key]
+        kv_per_1k = None
+        for threads in thread_options(topology):
+            eff = min(threads, host["physical_cores"])
+            hit = measured.get((meta["name"], threads))
+            if hit is not None and hit[2] is not None:
+                decode_tps, peak_ram, ttft, base_ctx = hit
+                source = "measured"
+            elif fit.ready:
+                decode_tps = fit.decode_tps(meta["filesize"], meta["size"], eff)
+                peak_ram = fit.peak_ram_gb(meta["filesize"])
+                ttft = fit.ttft_ms(meta["size"], constraints.prompt_tokens, eff)
+                base_ctx = fit.base_ctx
+                source = "fitted"
+            else:
+                continue
+
+            if kv_per_1k is None:
+                kv_per_1k = fit.kv_mb_per_1k(key)
+            peak_ram += kv_per_1k * (constraints.n_ctx - base_ctx) / 1000 / 1024
+            out.append({
+                "model_key": key,
+                "model_name": meta["name"],
+                "n_threads": threads,
+                "n_ctx": constraints.n_ctx,
+                "affinity": affinity_for(threads, topology),
+                "decode_tps": round(float(decode_tps), 2),
+                "peak_ram_gb": round(float(peak_ram), 2),
+                "ttft_ms": round(float(ttft), 1),
+                "source": source,
+                "violates": constraints.check(decode_tps, peak_ram, ttft),
+            })
+    return out
+
+
+def auto_select(constraints: Constraints, source: str = REPORT_PATH, prefer: str = "quality",
+                downloaded_only: bool = False, topology: CpuTopology = None) -> dict:
+    """
+    Pick the registry model and n_threads/n_ctx/affinity meeting constraints.
+
+    prefer:
+      - "quality": largest model (parameter count) that fits
+      - "speed":   highest decode t/s
+      - "ram":     lowest peak RAM
+    Ties go to fewer threads. Returns None when nothing fits.
+    """
+    if prefer not in PREFERENCES:
+        raise ValueError(f"prefer must be one of {PREFERENCES}")
+    df = load_results(source)
+    models = list_available_models() if downloaded_only else None
+    feasible = [c for c in candidates(constraints, df, topology, models) if not c["violates"]]
+    if not feasible:
+        return None
+
+    # Within a model, the fewest threads reaching 90% of its best decode rate
+    best_per_model = {}
+    for key in {c["model_key"] for c in feasible}:
+        rows = sorted((c for c in feasible if c["model_key"] == key), key=lambda c: c["n_threads"])
+        top = max(c["decode_tps"] for c in rows)
+        best_per_model[key] = next(c for c in rows if c["decode_tps"] >= 0.9 * top)
+
+    ranked = list(best_per_model.values())
+    if prefer == "quality":
+        ranked.sort(key=lambda c: (-MODEL_REGISTRY[c["model_key"]]["size"], -c["decode_tps"]))
+    elif prefer == "speed":
+        ranked.sort(key=lambda c: (-c["decode_tps"], c["n_threads"]))
+    else:
+        ranked.sort(key=lambda c: (c["peak_ram_gb"], -c["decode_tps"]))
+    choice = dict(ranked[0])
+    choice.pop("violates")
+    return choice
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick model, threads, n_ctx and affinity for a latency/RAM target.")
+    parser.add_argument("--min-tps", type=float, help="minimum decode tokens/s")
+    parser.add_argument("--max-ram", type=float, help="maximum peak RAM in GB")
+    parser.add_argument("--max-ttft", type=float, help="maximum TTFT in ms at --prompt tokens")
+    parser.add_argument("--prompt", type=int, default=1024, help="prompt length for the TTFT target")
+    parser.add_argument("--ctx", type=int, default=4096)
+    parser.add_argument("--prefer", default="quality", choices=PREFERENCES)
+    parser.add_argument("--downloaded", action="store_true", help="only consider models on disk")
+    parser.add_argument("--results", default=REPORT_PATH, help="report.csv or a results store directory")
+    parser.add_argument("--json", action="store_true", help="print the choice as JSON")
+    args = parser.parse_args()
+
+    target = Constraints(args.min_tps, args.max_ram, args.max_ttft, args.prompt, args.ctx)
+    pick = auto_select(target, args.results, args.prefer, args.downloaded)
+    if pick is None:
+        raise SystemExit("❌ No model in the registry meets these constraints.")
+    if args.json:
+        print(json.dumps(pick, indent=2))
+    else:
+        print(f"✅ {pick['model_name']} ({pick['model_key']})")
+        print(f"   n_threads={pick['n_threads']} n_ctx={pick['n_ctx']} affinity={pick['affinity']}")
+        print(f"   decode {pick['decode_tps']} t/s, TTFT {pick['ttft_ms']} ms @ {args.prompt} tok, "
+              f"peak RAM {pick['peak_ram_gb']} GB ({pick['source']})")
@@ -0,0 +1,408 @@
+import codecs
+import ctypes
+import itertools
+import queue
+import threading
+import time
+
+import numpy as np
+import llama_cpp
+
+from model_loader import resolve_threads
+from model_pool import get_model, get_pool
+
+# Renamed across llama.cpp releases
+_kv_seq_rm = getattr(llama_cpp, "llama_kv_self_seq_rm", None) or getattr(llama_cpp, "llama_kv_cache_seq_rm")
+_kv_seq_cp = getattr(llama_cpp, "llama_kv_self_seq_cp", None) or getattr(llama_cpp, "llama_kv_cache_seq_cp")
+
+# n_ctx of the pooled instance that only lends weights and tokenizer to the
+# batch context; its own KV cache is never decoded into
+WEIGHTS_CTX = 64
+
+
+class SharedPrefix:
+    """
+    Prompt prefix (e.g. few-shot examples) prefilled once into its own KV
+    sequence and copied into every request that starts with it.
+    """
+
+    def __init__(self, tokens: list):
+        self.tokens = list(tokens)
+        self.seq_id = None
+        self.ready = threading.Event()
+
+
+class GenerationRequest:
+    """
+    One sequence inside the batch engine.
+
+    on_event(request, text, finish_reason) is called from the engine thread
+    for every new piece of text; finish_reason is None until the last call.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, prompt_tokens: list, max_tokens: int = 128, temperature: float = 0.0,
+                 top_p: float = 1.0, stop=None, seed: int = None, on_event=None,
+                 prefix: SharedPrefix = None):
+        self.id = next(self._ids)
+        self.prompt_tokens = list(prompt_tokens)
+        self.prefix = prefix
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.stop = [s for s in (stop or []) if s]
+        self.rng = np.random.default_rng(seed)
+        self.on_event = on_event
+
+        self.seq_id = None
+        self.n_past = 0
+        self.next_token = None
+        self.completion_tokens = []
+        self.text = ""
+        self.emitted = 0
+        self.finish_reason = None
+        self.cancelled = False
+        self.holds_prefix = None
+        self.submitted_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def prefilling(self) -> bool:
+        return self.n_past < len(self.prompt_tokens)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class BatchEngine:
+    """
+    Continuous-batching scheduler over one multi-sequence llama context.
+
+    Every step builds a single llama_batch holding one decode token for
+    each running sequence plus as much pending prompt (prefill) as fits in
+    n_batch, then runs one llama_decode. Sequences join and leave between
+    steps, so concurrent requests share forward passes instead of queuing
+    behind each other. Each sequence owns a KV seq_id, freed on finish.
+
+    add_prefix() prefills a shared prefix once into a reserved seq_id;
+    requests created with prefix= get its KV cells copied in
+    (llama_kv_cache_seq_cp) and only prefill their own suffix.
+
+    With a tracing.Tracer, every step records a "batch_decode" span (value:
+    tokens in the batch), plus "sample" / "detokenize" spans and a "token"
+    instant per generated token.
+    """
+
+    def __init__(self, model_key: str, n_ctx: int = 4096, n_threads=4,
+                 n_seq_max: int = 8, n_batch: int = 512, llm=None, n_threads_batch=None, tracer=None):
+        # The pooled instance (or the one passed in) supplies weights and
+        # tokenizer; batching runs in a second context sized for n_seq_max
+        # sequences. The pooled one is loaded with a WEIGHTS_CTX context so
+        # only the batch context holds a full KV cache; a passed-in llm keeps
+        # its own context, costing its n_ctx of KV on top of this one.
+        self.model_key = model_key
+        n_threads, n_threads_batch = resolve_threads(model_key, n_threads, n_threads_batch)
+        self._pooled = llm is None
+        self.llm = llm or get_model(model_key, n_ctx=WEIGHTS_CTX, n_threads=n_threads)
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.n_seq_max = n_seq_max
+        self.n_vocab = self.llm.n_vocab()
+        self._eog_fn = self._resolve_eog(self.llm)
+
+        params = llama_cpp.llama_context_default_params()
+        params.n_ctx = n_ctx
+        params.n_batch = n_batch
+        params.n_seq_max = n_seq_max
+        params.n_threads = n_threads
+        params.n_threads_batch = n_threads_batch or n_threads
+        self.ctx = llama_cpp.llama_new_context_with_model(self.llm.model, params)
+        if not self.ctx:
+            if self._pooled:
+                get_pool().release(self.llm)
+            raise RuntimeError(f"failed to create batch context for {model_key}")
+        self.batch = llama_cpp.llama_batch_init(n_batch, 0, n_seq_max)
+
+        self._incoming = queue.Queue()
+        self._waiting = []
+        self._running = []
+        self._free_seqs = list(range(n_seq_max))
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.steps = 0
+        self.tokens_decoded = 0
+        self.tracer = tracer
+
+    # --- public API ---
+
+    def tokenize(self, text: str, add_bos: bool = True) -> list:
+        return self.llm.tokenize(text.encode("utf-8"), add_bos=add_bos, special=True)
+
+    def submit(self, request: GenerationRequest) -> GenerationRequest:
+        prefix = request.prefix
+        if prefix is not None and (len(request.prompt_tokens) <= len(prefix.tokens)
+                                   or request.prompt_tokens[:len(prefix.tokens)] != prefix.tokens):
+            raise ValueError("prompt must extend its shared prefix by at least one token")
+        self._incoming.put(request)
+        self._wake.set()
+        return request
+
+    def add_prefix(self, tokens: list) -> SharedPrefix:
+        """Reserve a sequence for tokens and prefill it; ready is set once done."""
+        prefix = SharedPrefix(tokens)
+        req = GenerationRequest(prefix.tokens, max_tokens=1)
+        req.holds_prefix = prefix
+        self.submit(req)
+        return prefix
+
+    def release_prefix(self, prefix: SharedPrefix):
+        """Free a prefix's KV sequence (requests already admitted keep their copy)."""
+        self._incoming.put(prefix)
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=f"batch-{self.model_key}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        llama_cpp.llama_batch_free(self.batch)
+        llama_cpp.llama_free(self.ctx)
+        self.ctx = None
+        if self._pooled:
+            get_pool().release(self.llm)
+            self._pooled = False
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "waiting": len(self._waiting) + self._incoming.qsize(),
+            "steps": self.steps,
+            "tokens_decoded": self.tokens_decoded,
+        }
+
+    # --- scheduler ---
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._admit()
+            if not self._running:
+                self._wake.wait(timeout=0.1)
+                self._wake.clear()
+                continue
+            self._step()
+
+    def _admit(self):
+        while True:
+            try:
+                item = self._incoming.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, SharedPrefix):
+                if item.seq_id is not None:
+                    _kv_seq_rm(self.ctx, item.seq_id, -1, -1)
+                    self._free_seqs.append(item.seq_id)
+                    item.seq_id = None
+                continue
+            self._waiting.append(item)
+
+        deferred = []
+        while self._waiting and self._free_seqs:
+            req = self._waiting.pop(0)
+            if req.cancelled:
+                self._finish(req, "cancelled")
+                continue
+            if not req.prompt_tokens or len(req.prompt_tokens) + 1 > self.n_ctx:
+                self._finish(req, "length")
+                continue
+            if req.prefix is not None and not req.prefix.ready.is_set():
+                deferred.append(req)
+                continue
+            if req.prefix is not None and req.prefix.seq_id is None:
+                self._finish(req, "length")  # prefix failed or was released
+                continue
+            req.seq_id = self._free_seqs.pop(0)
+            if req.prefix is not None:
+                n = len(req.prefix.tokens)
+                _kv_seq_cp(self.ctx, req.prefix.seq_id, req.seq_id, 0, n)
+                req.n_past = n
+            self._running.append(req)
+        self._waiting[:0] = deferred
+
+    def _add(self, pos: int, token: int, seq_id: int, want_logits: bool):
+        i = self.batch.n_tokens
+        self.batch.token[i] = token
+        self.batch.pos[i] = pos
+        self.batch.n_seq_id[i] = 1
+        self.batch.seq_id[i][0] = seq_id
+        self.batch.logits[i] = 1 if want_logits else 0
+        self.batch.n_tokens = i + 1
+
+    def _step(self):
+        for req in [r for r in self._running if r.cancelled]:
+            self._finish(req, "cancelled")
+
+        self.batch.n_tokens = 0
+        logit_rows = {}
+        n_past_before = {req.id: req.n_past for req in self._running}
+
+        # Decode tokens first: one per running sequence keeps latency flat
+        for req in self._running:
+            if not req.prefilling and req.next_token is not None:
+                logit_rows[req.id] = self.batch.n_tokens
+                self._add(req.n_past, req.next_token, req.seq_id, True)
+                req.n_past += 1
+
+        # Fill the rest of the batch with prompt chunks
+        for req in self._running:
+            room = self.n_batch - self.batch.n_tokens
+            if room <= 0:
+                break
+            if not req.prefilling:
+                continue
+            chunk = req.prompt_tokens[req.n_past:req.n_past + room]
+            for j, tok in enumerate(chunk):
+                last = req.n_past + j == len(req.prompt_tokens) - 1
+                if last:
+                    logit_rows[req.id] = self.batch.n_tokens
+                self._add(req.n_past + j, tok, req.seq_id, last)
+            req.n_past += len(chunk)
+
+        if self.batch.n_tokens == 0:
+            return
+        start = time.perf_counter_ns()
+        rc = llama_cpp.llama_decode(self.ctx, self.batch)
+        if self.tracer is not None:
+            self.tracer.span("batch_decode", start, time.perf_counter_ns(), self.batch.n_tokens)
+        self.steps += 1
+        self.tokens_decoded += self.batch.n_tokens
+        if rc != 0:
+            # KV cache full: roll every sequence back to where this step
+            # started, drop the longest one and retry on the next step
+            for req in self._running:
+                req.n_past = n_past_before[req.id]
+                _kv_seq_rm(self.ctx, req.seq_id, req.n_past, -1)
+            victim = max(self._running, key=lambda r: r.n_past)
+            self._finish(victim, "length")
+            return
+
+        for req in list(self._running):
+            row = logit_rows.get(req.id)
+            if row is None:
+                continue
+            if req.holds_prefix is not None:
+                self._prefix_ready(req)
+                continue
+            start = time.perf_counter_ns()
+            token = self._sample(req, row)
+            if self.tracer is not None:
+                end = time.perf_counter_ns()
+                self.tracer.span("sample", start, end)
+                self.tracer.instant("token", token, end)
+            self._accept(req, token)
+
+    def _sample(self, req: GenerationRequest, row: int) -> int:
+        ptr = llama_cpp.llama_get_logits_ith(self.ctx, row)
+        logits = np.ctypeslib.as_array(ptr, shape=(self.n_vocab,))
+        if req.temperature <= 0:
+            return int(np.argmax(logits))
+        scaled = logits.astype(np.float64) / req.temperature
+        probs = np.exp(scaled - scaled.max())
+        probs /= probs.sum()
+        if req.top_p < 1.0:
+            order = np.argsort(-probs)
+            keep = order[:int(np.searchsorted(np.cumsum(probs[order]), req.top_p)) + 1]
+            mask = np.zeros_like(probs)
+            mask[keep] = probs[keep]
+            probs = mask / mask.sum()
+        return int(req.rng.choice(self.n_vocab, p=probs))
+
+    def _is_eog(self, token: int) -> bool:
+        if self._eog_fn is not None:
+            return bool(self._eog_fn(self.llm.model, token))
+        return token == self.llm.token_eos()
+
+    @staticmethod
+    def _resolve_eog(llm):
+        # llama_token_is_eog(model, token) only exists in some releases
+        fn = getattr(llama_cpp, "llama_token_is_eog", None)
+        if fn is None:
+            return None
+        try:
+            fn(llm.model, llm.token_eos())
+        except (ctypes.ArgumentError, TypeError):
+            return None
+        return fn
+
+    def _accept(self, req: GenerationRequest, token: int):
+        now = time.perf_counter()
+        if req.first_token_at is None:
+            req.first_token_at = now
+        if self._is_eog(token):
+            self._finish(req, "stop")
+            return
+
+        req.completion_tokens.append(token)
+        req.next_token = token
+        start = time.perf_counter_ns()
+        req.text += req._decoder.decode(self.llm.detokenize([token]))
+        if self.tracer is not None:
+            self.tracer.span("detokenize", start, time.perf_counter_ns())
+
+        for s in req.stop:
+            idx = req.text.find(s)
+            if idx != -1:
+                req.text = req.text[:idx]
+                self._finish(req, "stop")
+                return
+
+        if len(req.completion_tokens) >= req.max_tokens or req.n_past + 1 >= self.n_ctx:
+            self._finish(req, "length")
+            return
+
+        # Hold back text that could still turn into a stop string
+        hold = max((len(s) - 1 for s in req.stop), default=0)
+        ready = len(req.text) - hold
+        if ready > req.emitted:
+            piece = req.text[req.emitted:ready]
+            req.emitted = ready
+            if req.on_event:
+                req.on_event(req, piece, None)
+
+    def _prefix_ready(self, req: GenerationRequest):
+        # Keep the prefilled KV sequence; it now belongs to the prefix
+        prefix = req.holds_prefix
+        prefix.seq_id = req.seq_id
+        req.seq_id = None
+        self._running.remove(req)
+        prefix.ready.set()
+
+    def _finish(self, req: GenerationRequest, reason: str):
+        req.finish_reason = reason
+        req.finished_at = time.perf_counter()
+        if req in self._running:
+            self._running.remove(req)
+        if req.seq_id is not None:
+            _kv_seq_rm(self.ctx, req.seq_id, -1, -1)
+            self._free_seqs.append(req.seq_id)
+            req.seq_id = None
+        if req.holds_prefix is not None:
+            req.holds_prefix.ready.set()  # seq_id stays None: dependents fail
+            return
+        piece = req.text[req.emitted:]
+        req.emitted = len(req.text)
+        if req.on_event:
+            req.on_event(req, piece, reason)
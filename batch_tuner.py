@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import time
+
+from models_config import MODEL_REGISTRY, get_model_path
+
+# Tuned settings per host fingerprint and model file
+TUNING_PATH_ENV = "EDGE_TUNING_PATH"
+DEFAULT_TUNING_PATH = "tuning.json"
+# EDGE_AUTOTUNE=0 stops load_model() from applying tuned settings
+AUTOTUNE_ENV = "EDGE_AUTOTUNE"
+
+DEFAULT_BATCHES = (64, 128, 256, 512, 1024)
+DEFAULT_UBATCHES = (32, 64, 128, 256, 512)
+
+
+def tuning_path() -> str:
+    return os.environ.get(TUNING_PATH_ENV, DEFAULT_TUNING_PATH)
+
+
+def _read_store() -> dict:
+    try:
+        with open(tuning_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_tuning(model_key: str, record: dict, fingerprint: str = None):
+    from cpu_topology import host_fingerprint
+
+    store = _read_store()
+    host = store.setdefault(fingerprint or host_fingerprint(), {})
+    host[os.path.basename(get_model_path(model_key))] = record
+    tmp = tuning_path() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(store, f, indent=1)
+    os.replace(tmp, tuning_path())
+
+
+def lookup(model_key: str, fingerprint: str = None) -> dict:
+    """Stored tuning record for model_key on this host (or fingerprint), else {}."""
+    store = _read_store()
+    if not store:
+        return {}
+    from cpu_topology import host_fingerprint
+
+    host = store.get(fingerprint or host_fingerprint(), {})
+    return host.get(os.path.basename(get_model_path(model_key)), {})
+
+
+def tuned_batch_params(model_key: str) -> dict:
+    """n_batch/n_ubatch kwargs for Llama() from the tuning store; {} if untuned or disabled."""
+    if os.environ.get(AUTOTUNE_ENV, "1") == "0":
+        return {}
+    record = lookup(model_key)
+    return {k: record[k] for k in ("n_batch", "n_ubatch") if k in record}
+
+
+def _prefill_tps(llm, tokens: list, repeats: int) -> float:
+    best = 0.0
+    for _ in range(repeats):
+        llm.reset()
+        t0 = time.perf_counter()
+        llm.eval(tokens)
+        best = max(best, len(tokens) / (time.perf_counter() - t0))
+    return best
+
+
+def _decode_tps(llm, tokens: list, n_decode: int, repeats: int) -> float:
+    # Feeds known tokens one at a time: same compute as decode, no sampling
+    context, steps = tokens[:64], tokens[64:64 + n_decode]
+    best = 0.0
+    for _ in range(repeats):
+        llm.reset()
+        llm.eval(context)
+        t0 = time.perf_counter()
+        for token in steps:
+            llm.eval([token])
+        best = max(best, len(steps) / (time.perf_counter() - t0))
+    return best
+
+
+def tune_model(model_key: str, threads=None, batches=DEFAULT_BATCHES, ubatches=DEFAULT_UBATCHES,
+               prompt_tokens: int = 512, n_decode: int = 32, n_ctx: int = 2048, repeats: int = 2) -> dict:
+    """
+    Sweep n_batch x n_ubatch x threads for prefill, and threads for decode;
+    meant to run in a fresh worker process.
+
+    Approach:
+      - One load per (n_batch, n_ubatch) pair (n_ubatch <= n_batch); the
+        page cache is warm after the first, so reloads are cheap
+      - Thread counts are switched on the loaded context without reloading
+      - Prefill: a token-exact prompt of prompt_tokens, best of `repeats`
+      - Decode: single-token evals after a short context, measured once per
+        thread count (batch size does not change a one-token step)
+    """
+    from auto_select import thread_options
+    from cpu_topology import CpuTopology
+    from model_loader import load_model
+    from model_pool import set_threads
+    from prompts import exact_prompt
+
+    threads = sorted(threads or thread_options(CpuTopology.read()))
+    pairs = [(b, u) for b in batches for u in ubatches if u <= b and b <= n_ctx]
+    prompt_tokens = max(prompt_tokens, 64 + n_decode)
+    rows = []
+    decode = {}
+    tokens = None
+    for n_batch, n_ubatch in pairs:
+        llm, _ = load_model(model_key, n_ctx=n_ctx, n_threads=threads[-1], n_batch=n_batch, n_ubatch=n_ubatch)
+        if tokens is None:
+            tokens = llm.tokenize(exact_prompt(llm, prompt_tokens).encode("utf-8"), add_bos=True)
+        for t in threads:
+            set_threads(llm, t, t)
+            if t not in decode:
+                decode[t] = round(_decode_tps(llm, tokens, n_decode, repeats), 2)
+            rows.append({"n_batch": n_batch, "n_ubatch": n_ubatch, "threads": t,
+                         "prefill_tps": round(_prefill_tps(llm, tokens, repeats), 2)})
+        llm.close()
+
+    best = max(rows, key=lambda r: r["prefill_tps"])
+    decode_threads = max(decode, key=decode.get)
+    return {
+        "n_batch": best["n_batch"],
+        "n_ubatch": best["n_ubatch"],
+        "prefill_threads": best["threads"],
+        "prefill_tps": best["prefill_tps"],
+        "decode_threads": decode_threads,
+        "decode_tps": decode[decode_threads],
+        "prompt_tokens": prompt_tokens,
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "grid": rows,
+        "decode_by_threads": decode,
+    }
+
+
+def autotune(model_keys, threads=None, batches=DEFAULT_BATCHES, ubatches=DEFAULT_UBATCHES,
+             prompt_tokens: int = 512, timeout_s: int = 1800) -> dict:
+    """Tune each model in its own worker (one at a time) and store the optimum."""
+    from cpu_topology import host_fingerprint
+    from worker_pool import run_isolated_many
+
+    fingerprint = host_fingerprint()
+    jobs = [(key, tune_model, (key, threads, batches, ubatches, prompt_tokens), None) for key in model_keys]
+    results = {}
+    for key, outcome in run_isolated_many(jobs, max_workers=1, timeout_s=timeout_s):
+        if outcome["status"] != "success":
+            print(f"❌ {MODEL_REGISTRY[key]['name']}: {outcome['status']}")
+            continue
+        record = outcome["result"]
+        save_tuning(key, record, fingerprint)
+        results[key] = record
+        print(f"✅ {MODEL_REGISTRY[key]['name']}: n_batch={record['n_batch']} n_ubatch={record['n_ubatch']} "
+              f"prefill {record['prefill_tps']} t/s @ {record['prefill_threads']} threads, "
+              f"decode {record['decode_tps']} t/s @ {record['decode_threads']} threads")
+    return results
+
+
+if __name__ == "__main__":
+    from tabulate import tabulate
+
+    parser = argparse.ArgumentParser(description="Tune n_batch/n_ubatch and threads for prefill and decode.")
+    parser.add_argument("models", nargs="+", help="registry keys")
+    parser.add_argument("--threads", type=int, nargs="+", help="thread counts (default: powers of two + core counts)")
+    parser.add_argument("--batches", type=int, nargs="+", default=list(DEFAULT_BATCHES))
+    parser.add_argument("--ubatches", type=int, nargs="+", default=list(DEFAULT_UBATCHES))
+    parser.add_argument("--prompt-tokens", type=int, default=512)
+    parser.add_argument("--show", action="store_true", help="print stored results instead of tuning")
+    args = parser.parse_args()
+
+    unknown = [k for k in args.models if k not in MODEL_REGISTRY]
+    if unknown:
+        raise SystemExit(f"Error: unknown models: {', '.join(unknown)}")
+
+    if args.show:
+        columns = ["n_batch", "n_ubatch", "prefill_threads", "prefill_tps", "decode_threads", "decode_tps", "tuned_at"]
+        table = [[MODEL_REGISTRY[k]["name"]] + [lookup(k).get(c, "") for c in columns] for k in args.models]
+        print(tabulate(table, headers=["model"] + columns, tablefmt="github"))
+    else:
+        autotune(args.models, args.threads, args.batches, args.ubatches, args.prompt_tokens)
+        print(f"\n💾 Saved to {tuning_path()}")
@@ -0,0 +1,332 @@
+import argparse
+import glob
+import json
+import math
+import os
+import statistics
+import time
+
+from models_config import MODEL_REGISTRY, get_model_path
+
+BASELINE_PATH_ENV = "EDGE_BASELINE_PATH"
+DEFAULT_BASELINE_PATH = "baselines.json"
+
+# Two-sided Student t critical values by degrees of freedom (1..30)
+_T_TABLE = {
+    0.90: [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812,
+           1.796, 1.782, 1.771, 1.761, 1.753, 1.746, 1.740, 1.734, 1.729, 1.725,
+           1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697],
+    0.95: [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+           2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+           2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042],
+    0.99: [63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169,
+           3.106, 3.055, 3.012, 2.977, 2.947, 2.921, 2.898, 2.878, 2.861, 2.845,
+           2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750],
+}
+_Z = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}
+
+
+class RunnerConfig:
+    """
+    Repetition policy: `warmup` discarded runs, then at least min_runs and
+    at most max_runs, stopping once the confidence interval half-width of
+    `metric` is within ci_target (relative to the mean).
+    """
+
+    def __init__(self, warmup: int = 1, min_runs: int = 3, max_runs: int = 20, ci_target: float = 0.03,
+                 confidence: float = 0.95, metric: str = "decode_rate_tps", outlier_z: float = 3.5):
+        if confidence not in _T_TABLE:
+            raise ValueError(f"confidence must be one of {sorted(_T_TABLE)}")
+        self.warmup = warmup
+        self.min_runs = max(min_runs, 2)
+        self.max_runs = max(max_runs, self.min_runs)
+        self.ci_target = ci_target
+        self.confidence = confidence
+        self.metric = metric
+        self.outlier_z = outlier_z
+
+
+def t_critical(df: int, confidence: float = 0.95) -> float:
+    if df < 1:
+        return float("inf")
+    table = _T_TABLE[confidence]
+    return table[df - 1] if df <= len(table) else _Z[confidence]
+
+
+def confidence_interval(values: list, confidence: float = 0.95) -> tuple:
+    """(mean, half-width) of the Student t interval for the mean."""
+    n = len(values)
+    if n == 0:
+        return 0.0, float("inf")
+    mean = statistics.fmean(values)
+    if n < 2:
+        return mean, float("inf")
+    return mean, t_critical(n - 1, confidence) * statistics.stdev(values) / math.sqrt(n)
+
+
+def reject_outliers(values: list, z: float = 3.5) -> tuple:
+    """
+    (kept, rejected) by modified z-score on the median absolute deviation
+    (Iglewicz-Hoaglin); robust to the outliers it is looking for.
+    """
+    if len(values) < 3:
+        return list(values), []
+    med = statistics.median(values)
+    mad = statistics.median(abs(v - med) for v in values)
+    if mad == 0:
+        return list(values), []
+    kept, rejected = [], []
+    for v in values:
+        (rejected if abs(0.6745 * (v - med) / mad) > z else kept).append(v)
+    return kept, rejected
+
+
+def _read_int(path: str):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def host_conditions() -> dict:
+    """
+    Frequency governors, current/max frequency ratio, hottest thermal zone
+    (deg C) and the summed core throttle counters, from /sys.
+    """
+    governors = set()
+    ratios = []
+    throttles = 0
+    for cpu in sorted(glob.glob("/sys/devices/system/cpu/cpu[0-9]*")):
+        try:
+            with open(os.path.join(cpu, "cpufreq", "scaling_governor")) as f:
+                governors.add(f.read().strip())
+        except OSError:
+            pass
+        cur = _read_int(os.path.join(cpu, "cpufreq", "scaling_cur_freq"))
+        top = _read_int(os.path.join(cpu, "cpufreq", "cpuinfo_max_freq"))
+        if cur and top:
+            ratios.append(cur / top)
+        throttles += _read_int(os.path.join(cpu, "thermal_throttle", "core_throttle_count")) or 0
+    temps = [t / 1000.0 for t in (_read_int(p) for p in glob.glob("/sys/class/thermal/thermal_zone*/temp")) if t]
+    return {
+        "governors": sorted(governors),
+        "freq_ratio_min": round(min(ratios), 3) if ratios else None,
+        "max_temp_c": max(temps) if temps else None,
+        "throttle_count": throttles,
+    }
+
+
+def host_warnings(before: dict, after: dict) -> list:
+    warnings = []
+    if before["governors"] and before["governors"] != ["performance"]:
+        warnings.append(f"governor {','.join(before['governors'])} (not performance): frequency may ramp mid-run")
+    if after["throttle_count"] > before["throttle_count"]:
+        warnings.append(f"thermal throttling during run (+{after['throttle_count'] - before['throttle_count']} events)")
+    if after["freq_ratio_min"] is not None and after["freq_ratio_min"] < 0.8:
+        warnings.append(f"a core ran at {after['freq_ratio_min'] * 100:.0f}% of max frequency")
+    return warnings
+
+
+def run_until_stable(run_once, config: RunnerConfig = None) -> dict:
+    """
+    Call run_once() (returning a dict holding config.metric) until the
+    metric's confidence interval is narrow enough.
+
+    Approach:
+      - Discard `warmup` runs (page faults, cold caches, frequency ramp-up)
+      - After each run from min_runs on, drop MAD outliers and stop once
+        half-width / mean <= ci_target, or at max_runs
+      - Snapshot governor / frequency / thermal state before and after
+    """
+    config = config or RunnerConfig()
+    for _ in range(config.warmup):
+        run_once()
+
+    before = host_conditions()
+    runs = []
+    values, rejected = [], []
+    mean, half = 0.0, float("inf")
+    while len(runs) < config.max_runs:
+        runs.append(run_once())
+        if len(runs) < config.min_runs:
+            continue
+        values = [r[config.metric] for r in runs]
+        kept, rejected = reject_outliers(values, config.outlier_z)
+        mean, half = confidence_interval(kept, config.confidence)
+        if mean and half / mean <= config.ci_target:
+            break
+    after = host_conditions()
+
+    kept_runs = [r for r in runs if r[config.metric] not in rejected]
+    return {
+        "metric": config.metric,
+        "mean": round(mean, 3),
+        "ci_half_width": round(half, 3),
+        "ci_rel": round(half / mean, 4) if mean else None,
+        "confidence": config.confidence,
+        "converged": bool(mean) and half / mean <= config.ci_target,
+        "runs": len(runs),
+        "kept": len(kept_runs),
+        "outliers": [round(v, 3) for v in rejected],
+        "kept_runs": kept_runs,
+        "host_before": before,
+        "host_after": after,
+        "warnings": host_warnings(before, after),
+    }
+
+
+def run_throughput_stats(llm, model_key: str, config: RunnerConfig = None, max_tokens: int = 128) -> dict:
+    """Throughput profile with warmup, adaptive repetitions and outlier rejection."""
+    from benchmark_suite import _run_single_throughput, summarize_runs
+
+    result = run_until_stable(lambda: _run_single_throughput(llm, max_tokens=max_tokens), config)
+    result["summary"] = summarize_runs(result.pop("kept_runs"))
+    result["model_key"] = model_key
+    return result
+
+
+# --- baselines ---
+
+def baseline_path() -> str:
+    return os.environ.get(BASELINE_PATH_ENV, DEFAULT_BASELINE_PATH)
+
+
+def _baseline_key(model_key: str, metric: str) -> str:
+    from cpu_topology import host_fingerprint
+
+    return f"{host_fingerprint()}|{os.path.basename(get_model_path(model_key))}|{metric}"
+
+
+def runtime_versions() -> dict:
+    import llama_cpp
+
+    return {"llama_cpp_python": getattr(llama_cpp, "__version__", "unknown")}
+
+
+def save_baseline(model_key: str, result: dict):
+    try:
+        with open(baseline_path()) as f:
+            store = json.load(f)
+    except (OSError, ValueError):
+        store = {}
+    store[_baseline_key(model_key, result["metric"])] = {
+        "mean": result["mean"],
+        "ci_half_width": result["ci_half_width"],
+        "runs": result["kept"],
+        "versions": runtime_versions(),
+        "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    tmp = baseline_path() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(store, f, indent=1)
+    os.replace(tmp, baseline_path())
+
+
+def load_baseline(model_key: str, metric: str = "decode_rate_tps") -> dict:
+    try:
+        with open(baseline_path()) as f:
+            return json.load(f).get(_baseline_key(model_key, metric))
+    except (OSError, ValueError):
+        return None
+
+
+def compare_to_baseline(result: dict, baseline: dict, min_effect: float = 0.02,
+                        higher_is_better: bool = True) -> dict:
+    """
+    "regression" / "improvement" only when the change exceeds both the
+    combined confidence half-widths (noise) and min_effect (relative);
+    otherwise "unchanged".
+    """
+    delta = result["mean"] - baseline["mean"]
+    noise = math.hypot(result["ci_half_width"], baseline["ci_half_width"])
+    rel = delta / baseline["mean"] if baseline["mean"] else 0.0
+    status = "unchanged"
+    if abs(delta) > noise and abs(rel) > min_effect:
+        better = (delta > 0) == higher_is_better
+        status = "improvement" if better else "regression"
+    return {"status": status, "delta": round(delta, 3), "delta_rel": round(rel, 4), "noise": round(noise, 3),
+            "baseline_mean": baseline["mean"], "baseline_versions": baseline.get("versions")}
+
+
+def _measure(model_key: str, config: RunnerConfig, n_threads: int, max_tokens: int) -> dict:
+    from model_pool import get_pool
+
+    with get_pool().lease(model_key, n_ctx=2048, n_threads=n_threads) as llm:
+        result = run_throughput_stats(llm, model_key, config, max_tokens)
+    result["versions"] = runtime_versions()
+    return result
+
+
+def gate(model_keys, config: RunnerConfig = None, n_threads: int = 4, max_tokens: int = 128,
+         save: bool = False, min_effect: float = 0.02, timeout_s: int = 1800) -> list:
+    """
+    Measure each model in its own worker and compare with its stored
+    baseline (or store a new one with save=True). Returns one row per model.
+    """
+    from worker_pool import run_isolated_many
+
+    config = config or RunnerConfig()
+    jobs = [(key, _measure, (key, config, n_threads, max_tokens), None) for key in model_keys]
+    rows = []
+    for key, outcome in run_isolated_many(jobs, max_workers=1, timeout_s=timeout_s):
+        row = {"model": MODEL_REGISTRY[key]["name"], "status": outcome["status"]}
+        if outcome["status"] == "success":
+            result = outcome["result"]
+            row.update({k: result[k] for k in ("mean", "ci_rel", "runs", "kept", "converged", "warnings")})
+            if save:
+                save_baseline(key, result)
+                row["status"] = "saved"
+            else:
+                baseline = load_baseline(key, config.metric)
+                row["status"] = compare_to_baseline(result, baseline, min_effect)["status"] if baseline else "no baseline"
+                row["baseline"] = baseline["mean"] if baseline else None
+        rows.append(row)
+    return rows
+
+
+# Gate row statuses that let a change through
+PASSING_STATUSES = ("saved", "unchanged", "improvement", "no baseline")
+
+
+def gate_failures(rows: list, require_baseline: bool = False) -> list:
+    """
+    Rows that fail the gate: regressions, and any worker that crashed, timed
+    out or errored (e.g. a broken llama-cpp-python upgrade). With
+    require_baseline, a model without a stored baseline fails too.
+    """
+    passing = set(PASSING_STATUSES) - ({"no baseline"} if require_baseline else set())
+    return [r for r in rows if r["status"] not in passing]
+
+
+if __name__ == "__main__":
+    from tabulate import tabulate
+
+    parser = argparse.ArgumentParser(description="Benchmark with warmup, CI-based stopping and baseline regression checks.")
+    parser.add_argument("models", nargs="+", help="registry keys")
+    parser.add_argument("--save-baseline", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--min-runs", type=int, default=3)
+    parser.add_argument("--max-runs", type=int, default=20)
+    parser.add_argument("--ci", type=float, default=0.03, help="target CI half-width relative to the mean")
+    parser.add_argument("--confidence", type=float, default=0.95, choices=sorted(_T_TABLE))
+    parser.add_argument("--min-effect", type=float, default=0.02, help="smallest relative change reported")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--require-baseline", action="store_true", help="fail models that have no stored baseline")
+    args = parser.parse_args()
+
+    unknown = [k for k in args.models if k not in MODEL_REGISTRY]
+    if unknown:
+        raise SystemExit(f"Error: unknown models: {', '.join(unknown)}")
+
+    cfg = RunnerConfig(args.warmup, args.min_runs, args.max_runs, args.ci, args.confidence)
+    results = gate(args.models, cfg, args.threads, args.max_tokens, args.save_baseline, args.min_effect)
+    columns = ["model", "mean", "baseline", "ci_rel", "runs", "kept", "converged", "status"]
+    print(tabulate([[r.get(c, "") for c in columns] for r in results], headers=columns, tablefmt="github"))
+    for r in results:
+        for warning in r.get("warnings") or []:
+            print(f"⚠️ {r['model']}: {warning}")
+    failures = gate_failures(results, args.require_baseline)
+    if failures:
+        raise SystemExit("❌ Gate failed: " + ", ".join(f"{r['model']} ({r['status']})" for r in failures))
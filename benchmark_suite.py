@@ -2,6 +2,9 @@ import time
 from llama_cpp import Llama
 
 from models_config import MODEL_REGISTRY
+from prefix_cache import prefix_reuse
+from cpu_topology import AffinityPlan, pinned
+from tracing import Tracer, maybe_traced
 
 PROMPT_THROUGHPUT = (
     "You are a language model. Generate a detailed answer about how "
@@ -10,30 +13,144 @@ PROMPT_THROUGHPUT = (
 )
 
 
-def _run_single_throughput(llm: Llama, max_tokens: int = 128) -> float:
-    """Run one deterministic throughput pass and return tokens/sec."""
-    t0 = time.time()
-    out = llm(
-        PROMPT_THROUGHPUT,
+def percentile(values, q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100) of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return float(ordered[0])
+    pos = (len(ordered) - 1) * (q / 100.0)
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    frac = pos - lo
+    return float(ordered[lo] + (ordered[hi] - ordered[lo]) * frac)
+
+
+def count_tokens(llm: Llama, text: str, add_bos: bool = False) -> int:
+    """Count tokens in text using the model's own tokenizer."""
+    if not text:
+        return 0
+    return len(llm.tokenize(text.encode("utf-8"), add_bos=add_bos))
+
+
+def _run_single_throughput(llm: Llama, max_tokens: int = 128, prompt: str = PROMPT_THROUGHPUT) -> dict:
+    """
+    Run one deterministic streaming pass and return its timing breakdown.
+
+    Approach:
+      - Reset the context so the prompt is fully prefilled every run
+        (unless a prefix cache is attached, which restores it instead)
+      - Stream the completion, timestamping every chunk
+      - TTFT covers tokenize + prefill + first sample
+      - Decode rate covers first token -> last token only
+      - Output tokens are counted with the model's tokenizer
+    """
+    prompt_tokens = count_tokens(llm, prompt, add_bos=True)
+    llm.reset()
+
+    stamps = []
+    pieces = []
+    t0 = time.perf_counter()
+    stream = llm(
+        prompt,
         max_tokens=max_tokens,
         temperature=0.0,
         stop=["<|end|>"],
+        stream=True,
     )
-    dt = time.time() - t0
-    text = out["choices"][0]["text"]
-    # Token count proxy: word count is good enough for relative throughput
-    tokens = max(len(text.split()), 1)
-    return tokens / dt if dt > 0 else 0.0
+    for chunk in stream:
+        stamps.append(time.perf_counter())
+        pieces.append(chunk["choices"][0]["text"])
+    t_end = time.perf_counter()
+
+    text = "".join(pieces)
+    output_tokens = max(count_tokens(llm, text), len(stamps))
+
+    ttft = (stamps[0] - t0) if stamps else (t_end - t0)
+    decode_time = (stamps[-1] - stamps[0]) if len(stamps) > 1 else 0.0
+    gaps_ms = [(b - a) * 1000.0 for a, b in zip(stamps, stamps[1:])]
+
+    return {
+        "input_tokens_actual": prompt_tokens,
+        "output_tokens": output_tokens,
+        "ttft_ms": ttft * 1000.0,
+        "prefill_tps": prompt_tokens / ttft if ttft > 0 else 0.0,
+        "decode_rate_tps": (output_tokens - 1) / decode_time if decode_time > 0 else 0.0,
+        "effective_throughput_tps": output_tokens / (t_end - t0) if t_end > t0 else 0.0,
+        "per_token_latency_ms": (sum(gaps_ms) / len(gaps_ms)) if gaps_ms else 0.0,
+        "latency_p50_ms": percentile(gaps_ms, 50),
+        "latency_p95_ms": percentile(gaps_ms, 95),
+        "latency_p99_ms": percentile(gaps_ms, 99),
+        "total_runtime_s": t_end - t0,
+    }
+
+
+def summarize_runs(runs: list) -> dict:
+    """Collapse per-run breakdowns into the report.csv metric columns."""
+    if not runs:
+        return {}
+
+    def mean(field):
+        return sum(r[field] for r in runs) / len(runs)
+
+    tps = [r["decode_rate_tps"] for r in runs]
+    ttft = [r["ttft_ms"] for r in runs]
+    return {
+        "runs": len(runs),
+        "input_tokens_actual": runs[0]["input_tokens_actual"],
+        "output_tokens": round(mean("output_tokens"), 1),
+        "ttft_ms": round(mean("ttft_ms"), 2),
+        "percentile_ttft_p50": round(percentile(ttft, 50), 2),
+        "percentile_ttft_p95": round(percentile(ttft, 95), 2),
+        "prefill_tps": round(mean("prefill_tps"), 2),
+        "decode_rate_tps": round(mean("decode_rate_tps"), 2),
+        "percentile_tps_p50": round(percentile(tps, 50), 2),
+        "percentile_tps_p95": round(percentile(tps, 95), 2),
+        "effective_throughput_tps": round(mean("effective_throughput_tps"), 2),
+        "per_token_latency_ms": round(mean("per_token_latency_ms"), 2),
+        "latency_p50_ms": round(mean("latency_p50_ms"), 2),
+        "latency_p95_ms": round(mean("latency_p95_ms"), 2),
+        "latency_p99_ms": round(mean("latency_p99_ms"), 2),
+        "total_runtime_s": round(mean("total_runtime_s"), 2),
+    }
+
+
+def run_throughput_profile(llm: Llama, model_key: str, runs: int = 5, max_tokens: int = 128,
+                           reuse_prefix: bool = False, affinity: AffinityPlan = None,
+                           tracer: Tracer = None, warmup: int = 1) -> dict:
+    """
+    Run N streaming passes and return the summarized timing breakdown
+    (TTFT, prefill t/s, decode t/s, per-token latency percentiles).
+
+    reuse_prefix=True prefills PROMPT_THROUGHPUT once and restores it from
+    the prefix cache on later runs; TTFT/prefill numbers then measure the
+    cached path, not a cold prefill. affinity pins the runs to a CPU plan.
+    With a tracer (or EDGE_TRACE set) the runs are traced per phase and the
+    summary gains avg_cpu_util_percent, avg_saturated_cores and phase_ms.
+    The first `warmup` runs (page faults, cold caches) are discarded; see
+    bench_runner for CI-based repetition.
+    """
+    with pinned(affinity), prefix_reuse(llm, model_key, reuse_prefix), \
+            maybe_traced(llm, tracer) as (trace, sampler):
+        for _ in range(warmup):
+            _run_single_throughput(llm, max_tokens=max_tokens)
+        results = [_run_single_throughput(llm, max_tokens=max_tokens) for _ in range(runs)]
+    summary = summarize_runs(results)
+    if trace is not None:
+        summary.update(sampler.averages())
+        summary["phase_ms"] = {name: round(ns / 1e6, 2) for name, (_, ns) in trace.totals.items() if ns}
+    summary["model_key"] = model_key
+    summary["prefix_reused"] = reuse_prefix
+    summary["cpu_affinity"] = affinity.cpus if affinity else None
+    return summary
 
 
-def run_throughput_test(llm: Llama, model_key: str, runs: int = 5) -> float:
+def run_throughput_test(llm: Llama, model_key: str, runs: int = 5, reuse_prefix: bool = False) -> float:
     """
-    Average throughput over N runs to reduce variance.
+    Average decode throughput over N runs to reduce variance.
 
-    Returns mean tokens/sec.
+    Returns mean decode tokens/sec (prefill excluded).
     """
-    speeds = []
-    for _ in range(runs):
-        s = _run_single_throughput(llm)
-        speeds.append(s)
-    return round(sum(speeds) / len(speeds), 2) if speeds else 0.0
+    profile = run_throughput_profile(llm, model_key, runs=runs, reuse_prefix=reuse_prefix)
+    return profile.get("decode_rate_tps", 0.0)
@@ -0,0 +1,127 @@
+# Single entry point: python cli.py <command> [args]. Subcommand modules are
+# imported only when their command runs, so --help, list and startup-check
+# start without llama_cpp, numpy, pandas, psutil or tabulate (edge health
+# checks call them every few seconds).
+import os
+import sys
+
+# command -> (module run as __main__, help)
+COMMANDS = {
+    "download": ("download_manager", "download registry models (resumable, parallel)"),
+    "chat": ("demo_inference", "interactive chat with a local model"),
+    "bench": ("run", "benchmark every downloaded model"),
+    "sweep": ("sweep", "thread x context sweep writing report.csv"),
+    "report": ("analysis", "thread-scaling and efficiency report from report.csv"),
+    "serve": ("inference_server", "OpenAI-compatible HTTP server"),
+}
+BUILTINS = {
+    "list": "downloaded models (cached inventory; --all for the whole registry)",
+    "startup-check": "fail if --help or list exceeds the startup budget",
+}
+
+# Startup budget for --help / list, in ms above a bare interpreter start
+STARTUP_BUDGET_ENV = "EDGE_STARTUP_BUDGET_MS"
+DEFAULT_STARTUP_BUDGET_MS = 50
+# Must stay out of the fast paths
+HEAVY_MODULES = ("llama_cpp", "numpy", "pandas", "psutil", "tabulate", "requests", "tqdm", "matplotlib")
+
+
+def usage() -> str:
+    lines = ["usage: python cli.py <command> [args]", "", "commands:"]
+    for name, (_, text) in COMMANDS.items():
+        lines.append(f"  {name:<14} {text}")
+    for name, text in BUILTINS.items():
+        lines.append(f"  {name:<14} {text}")
+    lines.append("")
+    lines.append("Run `python cli.py <command> --help` for a command's options.")
+    return "\n".join(lines)
+
+
+def list_models(show_all: bool = False):
+    from models_config import MODEL_REGISTRY, list_available_models
+
+    available = set(list_available_models())
+    keys = list(MODEL_REGISTRY) if show_all else [k for k in MODEL_REGISTRY if k in available]
+    if not keys:
+        print("No models available. Run 'python cli.py download' first.")
+        return
+    width = max(len(k) for k in keys)
+    for key in keys:
+        meta = MODEL_REGISTRY[key]
+        mark = ("✅ " if key in available else "   ") if show_all else ""
+        print(f"{mark}{key:<{width}}  {meta.get('filesize', 0):>6} GB  {meta['name']}")
+
+
+def _time_command(args: list, repeats: int) -> tuple:
+    """Median wall ms of `python <args>` in fresh processes, and the modules its last run imported."""
+    import statistics
+    import subprocess
+    import time
+
+    times = []
+    stderr = ""
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime"] + args, capture_output=True, text=True)
+        times.append((time.perf_counter() - t0) * 1000)
+        stderr = proc.stderr
+    modules = {line.rsplit("|", 1)[-1].strip() for line in stderr.splitlines() if line.startswith("import time:")}
+    return statistics.median(times), modules
+
+
+def startup_check(budget_ms: float = None, repeats: int = 5) -> bool:
+    """
+    Time `cli.py --help` and `cli.py list` in fresh interpreters against the
+    budget (ms above `python -c pass`), and check that neither imports a
+    heavy module. Returns True when both pass.
+    """
+    if budget_ms is None:
+        budget_ms = float(os.environ.get(STARTUP_BUDGET_ENV, DEFAULT_STARTUP_BUDGET_MS))
+    script = os.path.abspath(__file__)
+    baseline, _ = _time_command(["-c", "pass"], repeats)
+    print(f"python startup: {baseline:.1f} ms (budget: +{budget_ms:.0f} ms)")
+    ok = True
+    for args in (["--help"], ["list"]):
+        ms, modules = _time_command([script] + args, repeats)
+        heavy = sorted(m for m in modules if m.split(".")[0] in HEAVY_MODULES)
+        passed = ms - baseline <= budget_ms and not heavy
+        ok = ok and passed
+        note = f", imports {', '.join(heavy)}" if heavy else ""
+        print(f"{'✅' if passed else '❌'} cli.py {' '.join(args)}: {ms:.1f} ms (+{ms - baseline:.1f}){note}")
+    return ok
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ("-h", "--help", "help"):
+        print(usage())
+        return 0
+    command, rest = argv[0], argv[1:]
+
+    if command == "list":
+        list_models(show_all="--all" in rest)
+        return 0
+    if command == "startup-check":
+        import argparse
+
+        parser = argparse.ArgumentParser(prog="cli.py startup-check", description=BUILTINS["startup-check"])
+        parser.add_argument("--budget-ms", type=float, default=None,
+                            help=f"ms above a bare interpreter start (default: {STARTUP_BUDGET_ENV} or "
+                                 f"{DEFAULT_STARTUP_BUDGET_MS})")
+        parser.add_argument("--repeats", type=int, default=5)
+        args = parser.parse_args(rest)
+        return 0 if startup_check(args.budget_ms, args.repeats) else 1
+    if command not in COMMANDS:
+        print(f"Error: unknown command '{command}'\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    import runpy
+
+    # The module parses sys.argv itself, exactly as when run directly
+    sys.argv[1:] = rest
+    runpy.run_module(COMMANDS[command][0], run_name="__main__", alter_sys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+import argparse
+import functools
+import os
+import time
+
+# EDGE_CONTEXT_POLICY=sliding|turns|summarize picks the chat demo's policy
+CONTEXT_POLICY_ENV = "EDGE_CONTEXT_POLICY"
+POLICIES = ("sliding", "turns", "summarize")
+
+SUMMARY_PROMPT = "\n(Summary of the conversation so far:"
+
+
+@functools.lru_cache(maxsize=None)
+def _kv_ops() -> tuple:
+    """(seq_rm, seq_add, can_shift) from llama_cpp, imported on first compaction."""
+    import llama_cpp
+
+    # Renamed across llama.cpp releases
+    seq_rm = getattr(llama_cpp, "llama_kv_self_seq_rm", None) or getattr(llama_cpp, "llama_kv_cache_seq_rm")
+    seq_add = getattr(llama_cpp, "llama_kv_self_seq_add", None) or getattr(llama_cpp, "llama_kv_cache_seq_add")
+    can_shift = getattr(llama_cpp, "llama_kv_self_can_shift", None) or getattr(llama_cpp, "llama_kv_cache_can_shift", None)
+    return seq_rm, seq_add, can_shift
+
+
+class ChatContext:
+    """
+    Token-accounted chat history that stays inside a fixed context budget.
+
+    The sequence is sink + summary + turns. Before a new turn would overflow
+    budget (minus `reserve` tokens for the reply), the history is compacted
+    by the policy:
+      - sliding: keep the first n_sink tokens (attention sinks) and drop the
+        oldest tokens after them
+      - turns: drop the oldest whole turns, keeping the last keep_turns
+      - summarize: ask the model to summarize the history, then drop every
+        turn but the last keep_turns and keep the summary in their place
+    Dropped positions are removed from the KV cache and the retained tail is
+    shifted down (RoPE shift), so the next prompt shares its whole prefix
+    with the cache and only the new turn is prefilled. Each compaction frees
+    `slack` extra tokens so it does not run on every turn.
+    """
+
+    def __init__(self, llm, policy: str = "turns", budget: int = None, reserve: int = 128,
+                 n_sink: int = 4, keep_turns: int = 2, slack: int = None, system: str = "",
+                 summary_tokens: int = 64):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}' (choose from {', '.join(POLICIES)})")
+        self.llm = llm
+        self.policy = policy
+        self.budget = budget or llm.n_ctx()
+        self.reserve = reserve
+        self.n_sink = n_sink
+        self.keep_turns = keep_turns
+        self.slack = self.budget // 4 if slack is None else slack
+        self.summary_tokens = summary_tokens
+        self.sink = llm.tokenize(system.encode("utf-8"), add_bos=True)
+        self.summary = []
+        self.turns = []
+        self._pending = None
+        self._open_line = False
+        self.compactions = 0
+        self.dropped_tokens = 0
+        self.reprefilled_tokens = 0
+        self.last_compaction_ms = 0.0
+
+    def tokens(self) -> list:
+        out = list(self.sink) + list(self.summary)
+        for turn in self.turns:
+            out += turn
+        return out
+
+    def __len__(self) -> int:
+        return len(self.sink) + len(self.summary) + sum(len(t) for t in self.turns)
+
+    def prepare(self, user_text: str) -> list:
+        """Prompt tokens for the next turn (history + user message), compacting first if needed."""
+        newline = "\n" if self._open_line else ""
+        segment = self.llm.tokenize(f"{newline}User: {user_text}\nAI:".encode("utf-8"), add_bos=False)
+        if len(self.sink) + len(segment) + self.reserve > self.budget:
+            raise ValueError(f"Message of {len(segment)} tokens does not fit the {self.budget}-token context")
+        if len(self) + len(segment) + self.reserve > self.budget:
+            self.compact(len(segment))
+        self._pending = segment
+        return self.tokens() + segment
+
+    def commit(self, reply_ids: list):
+        """
+        Record the reply to the prepared message as one turn. reply_ids are
+        the generated tokens as they sit in the KV cache (e.g.
+        GenerationHandle.token_ids), so the next prompt reuses the whole
+        cached history instead of re-prefilling a re-tokenized reply.
+        """
+        reply = [int(t) for t in reply_ids]
+        self.turns.append(self._pending + reply)
+        self._pending = None
+        # The next "User:" goes on a new line unless the reply ended one
+        self._open_line = not reply or not self.llm.detokenize(reply[-1:]).endswith(b"\n")
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "tokens": len(self),
+            "turns": len(self.turns),
+            "summary_tokens": len(self.summary),
+            "compactions": self.compactions,
+            "dropped_tokens": self.dropped_tokens,
+            "reprefilled_tokens": self.reprefilled_tokens,
+            "last_compaction_ms": round(self.last_compaction_ms, 2),
+        }
+
+    # --- compaction ---
+
+    def compact(self, incoming: int = 0):
+        """Free room for `incoming` new tokens plus reserve and slack."""
+        t0 = time.perf_counter()
+        target = max(self.budget - self.reserve - incoming - self.slack, len(self.sink) + self.n_sink)
+        before = len(self)
+        self._fill_sink()
+        if self.policy == "summarize" and not self._summarize():
+            self._drop_turns(target)
+        elif self.policy == "turns":
+            self._drop_turns(target)
+        # Still over (or sliding): trim tokens right after the sinks/summary
+        self._drop_tokens(len(self) - target)
+        self.dropped_tokens += max(before - len(self), 0)
+        self.compactions += 1
+        self.last_compaction_ms = (time.perf_counter() - t0) * 1000
+
+    def _fill_sink(self):
+        # Without a system prompt the first tokens of the first turn become the sinks
+        while len(self.sink) < self.n_sink and self.turns:
+            take = self.n_sink - len(self.sink)
+            self.sink += self.turns[0][:take]
+            self.turns[0] = self.turns[0][take:]
+            if not self.turns[0]:
+                self.turns.pop(0)
+
+    def _drop_turns(self, target: int):
+        old = self.tokens()
+        start = len(self.sink) + len(self.summary)
+        n = 0
+        while len(self.turns) > self.keep_turns and len(self) > target:
+            n += len(self.turns.pop(0))
+        self._discard(old, start, start + n)
+
+    def _drop_tokens(self, n: int):
+        old = self.tokens()
+        start = len(self.sink) + len(self.summary)
+        n = min(max(n, 0), sum(len(t) for t in self.turns))
+        left = n
+        while left > 0:
+            if len(self.turns[0]) <= left:
+                left -= len(self.turns.pop(0))
+            else:
+                self.turns[0] = self.turns[0][left:]
+                left = 0
+        self._discard(old, start, start + n)
+
+    def cached_prefix(self, tokens: list) -> int:
+        """Length of the prefix of tokens that is already in the KV cache."""
+        llm = self.llm
+        common = 0
+        for cached, token in zip(llm.input_ids[:llm.n_tokens], tokens):
+            if cached != token:
+                break
+            common += 1
+        return common
+
+    def _can_shift(self) -> bool:
+        can_shift = _kv_ops()[2]
+        return bool(can_shift(self.llm.ctx)) if can_shift is not None else True
+
+    def _discard(self, old: list, p0: int, p1: int):
+        """Remove positions [p0, p1) of `old` from the KV cache and shift the cached rest down."""
+        if p1 <= p0:
+            return
+        llm = self.llm
+        cached = self.cached_prefix(old)
+        if cached <= p1:
+            # Nothing cached after the dropped span
+            llm.n_tokens = min(cached, p0)
+            return
+        if not self._can_shift():
+            # e.g. quantized V cache: llama re-prefills the tail on the next call
+            self.reprefilled_tokens += cached - p1
+            llm.n_tokens = p0
+            return
+        seq_rm, seq_add, _ = _kv_ops()
+        seq_rm(llm.ctx, 0, p0, p1)
+        seq_rm(llm.ctx, 0, cached, -1)
+        seq_add(llm.ctx, 0, p1, cached, p0 - p1)
+        llm.input_ids[p0:p0 + cached - p1] = llm.input_ids[p1:cached].copy()
+        llm.n_tokens = p0 + cached - p1
+
+    def _summarize(self) -> bool:
+        """
+        Summarize in place: the summary is generated after the full cached
+        history, then its KV cells are moved in front of the kept turns.
+        Returns False when there is too little to compact.
+        """
+        llm = self.llm
+        keep = self.turns[-self.keep_turns:] if self.keep_turns else []
+        dropped = self.turns[:len(self.turns) - len(keep)]
+        s = len(self.sink)
+        a = s + len(self.summary) + sum(len(t) for t in dropped)
+        base = self.tokens()
+        b = len(base)
+        instruction = llm.tokenize(SUMMARY_PROMPT.encode("utf-8"), add_bos=False)
+        room = min((a - s) - len(instruction) - 1, llm.n_ctx() - b - len(instruction))
+        if not dropped or room < 8:
+            return False
+
+        llm(base + instruction, max_tokens=min(self.summary_tokens, room), temperature=0.0, stop=["\n", ")"])
+        e = llm.n_tokens
+        block = [int(t) for t in llm.input_ids[b:e]]
+        self.summary = block
+        self.turns = keep
+        if not self._can_shift():
+            self.reprefilled_tokens += len(self) - s
+            llm.n_tokens = s
+            return True
+
+        # sink | old summary + dropped turns | kept turns | summary block
+        #   -> sink | summary block | kept turns
+        seq_rm, seq_add, _ = _kv_ops()
+        seq_rm(llm.ctx, 0, s, a)
+        seq_rm(llm.ctx, 0, e, -1)
+        seq_add(llm.ctx, 0, b, e, s - b)
+        seq_add(llm.ctx, 0, a, b, s + len(block) - a)
+        tail = list(llm.input_ids[a:b])
+        llm.input_ids[s:s + len(block)] = block
+        llm.input_ids[s + len(block):s + len(block) + len(tail)] = tail
+        llm.n_tokens = s + len(block) + len(tail)
+        return True
+
+
+def context_policy() -> str:
+    return os.environ.get(CONTEXT_POLICY_ENV, "turns")
+
+
+if __name__ == "__main__":
+    import psutil
+    from tabulate import tabulate
+
+    parser = argparse.ArgumentParser(description="Simulate a long chat and show per-turn prefill cost under a context policy.")
+    parser.add_argument("model", help="registry key")
+    parser.add_argument("--policy", choices=POLICIES, default="turns")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--message-tokens", type=int, default=96, help="user message length per turn")
+    parser.add_argument("--max-tokens", type=int, default=64, help="reply length per turn")
+    parser.add_argument("--ctx", type=int, default=2048)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    from model_pool import get_pool
+    from prompts import exact_prompt
+
+    proc = psutil.Process(os.getpid())
+    rows = []
+    with get_pool().lease(args.model, n_ctx=args.ctx, n_threads=args.threads) as llm:
+        chat = ChatContext(llm, policy=args.policy, reserve=args.max_tokens)
+        for turn in range(args.turns):
+            message = exact_prompt(llm, args.message_tokens, variant=turn)
+            prompt = chat.prepare(message)
+            cached = chat.cached_prefix(prompt)
+            t0 = time.perf_counter()
+            llm(prompt, max_tokens=args.max_tokens, temperature=0.0, stop=["User:"])
+            chat.commit(llm.input_ids[len(prompt):llm.n_tokens])
+            rows.append([turn + 1, len(prompt), len(prompt) - cached, round((time.perf_counter() - t0) * 1000, 1),
+                         chat.compactions, round(proc.memory_info().rss / (1024 ** 2), 1)])
+    print(tabulate(rows, headers=["turn", "prompt_tokens", "prefilled", "turn_ms", "compactions", "rss_mb"],
+                   tablefmt="github"))
+    print(f"\n✅ {chat.stats()}")
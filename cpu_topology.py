@@ -0,0 +1,268 @@
+import os
+from contextlib import contextmanager
+
+SYS_CPU = "/sys/devices/system/cpu"
+SYS_NODE = "/sys/devices/system/node"
+
+AFFINITY_STRATEGIES = ("physical", "smt", "numa", "compact", "none")
+
+
+def parse_cpulist(text: str) -> list:
+    """Parse a kernel cpulist like "0-3,8,10-11" into [0, 1, 2, 3, 8, 10, 11]."""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _read(path: str, default: str = "") -> str:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def allowed_cpus() -> list:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CpuInfo:
+    __slots__ = ("cpu", "core", "package", "node")
+
+    def __init__(self, cpu: int, core: int, package: int, node: int):
+        self.cpu = cpu
+        self.core = core
+        self.package = package
+        self.node = node
+
+    @property
+    def core_key(self) -> tuple:
+        return (self.package, self.core)
+
+
+class CpuTopology:
+    """Logical CPUs of this host grouped by physical core and NUMA node."""
+
+    def __init__(self, cpus: list):
+        self.cpus = sorted(cpus, key=lambda c: c.cpu)
+
+    @classmethod
+    def read(cls, restrict_to_allowed: bool = True) -> "CpuTopology":
+        """Read /sys/devices/system/{cpu,node}; falls back to a flat layout."""
+        online = parse_cpulist(_read(os.path.join(SYS_CPU, "online"))) or list(range(os.cpu_count() or 1))
+        if restrict_to_allowed:
+            allowed = set(allowed_cpus())
+            online = [c for c in online if c in allowed] or sorted(allowed)
+
+        node_of = {}
+        if os.path.isdir(SYS_NODE):
+            for entry in os.listdir(SYS_NODE):
+                if entry.startswith("node") and entry[4:].isdigit():
+                    for cpu in parse_cpulist(_read(os.path.join(SYS_NODE, entry, "cpulist"))):
+                        node_of[cpu] = int(entry[4:])
+
+        cpus = []
+        for cpu in online:
+            topo = os.path.join(SYS_CPU, f"cpu{cpu}", "topology")
+            core = int(_read(os.path.join(topo, "core_id"), str(cpu)))
+            package = int(_read(os.path.join(topo, "physical_package_id"), "0"))
+            cpus.append(CpuInfo(cpu, core, max(package, 0), node_of.get(cpu, 0)))
+        return cls(cpus)
+
+    @property
+    def logical_cores(self) -> int:
+        return len(self.cpus)
+
+    @property
+    def physical_cores(self) -> int:
+        return len({c.core_key for c in self.cpus})
+
+    @property
+    def nodes(self) -> list:
+        return sorted({c.node for c in self.cpus})
+
+    @property
+    def smt_enabled(self) -> bool:
+        return self.logical_cores > self.physical_cores
+
+    def cores(self, node: int = None) -> list:
+        """Physical cores as lists of sibling CPU ids, ordered by node then core."""
+        groups = {}
+        for c in self.cpus:
+            if node is None or c.node == node:
+                groups.setdefault((c.node, c.core_key), []).append(c.cpu)
+        return [sorted(groups[k]) for k in sorted(groups)]
+
+    def summary(self) -> dict:
+        """Host columns of report.csv."""
+        return {
+            "numa_nodes": len(self.nodes),
+            "physical_cores": self.physical_cores,
+            "logical_cores": self.logical_cores,
+            "sm_enabled": self.smt_enabled,
+        }
+
+
+def cache_sizes_kb(cpu: int = 0) -> dict:
+    """Data/unified cache sizes (KB) seen by a CPU, e.g. {"L1d": 48, "L2": 2048, "L3": 107520}."""
+    caches = {}
+    base = os.path.join(SYS_CPU, f"cpu{cpu}", "cache")
+    if not os.path.isdir(base):
+        return caches
+    for entry in sorted(os.listdir(base)):
+        if not entry.startswith("index"):
+            continue
+        kind = _read(os.path.join(base, entry, "type"))
+        if kind == "Instruction":
+            continue
+        size = _read(os.path.join(base, entry, "size"))
+        if not size:
+            continue
+        kb = int(size[:-1]) * (1024 if size.endswith("M") else 1) if size[-1] in "KM" else int(size) // 1024
+        name = f"L{_read(os.path.join(base, entry, 'level'))}" + ("d" if kind == "Data" else "")
+        caches[name] = kb
+    return caches
+
+
+def cpu_model_name() -> str:
+    for line in _read("/proc/cpuinfo").splitlines():
+        if line.startswith(("model name", "Model", "Hardware")):
+            return line.split(":", 1)[1].strip()
+    return os.uname().machine
+
+
+def host_fingerprint(topology: "CpuTopology" = None) -> str:
+    """
+    Short id of the hardware tuning results depend on: CPU model, core
+    counts, cache sizes and total RAM (GB, rounded).
+    """
+    import hashlib
+
+    topology = topology or CpuTopology.read()
+    ram_gb = round(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3)
+    caches = ",".join(f"{k}={v}" for k, v in sorted(cache_sizes_kb(topology.cpus[0].cpu).items()))
+    raw = f"{cpu_model_name()}|{topology.physical_cores}p{topology.logical_cores}l|{caches}|{ram_gb}GB"
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+class AffinityPlan:
+    """CPUs chosen for n_threads under a placement strategy."""
+
+    __slots__ = ("strategy", "n_threads", "cpus", "numa_node")
+
+    def __init__(self, strategy: str, n_threads: int, cpus: list, numa_node: int = None):
+        self.strategy = strategy
+        self.n_threads = n_threads
+        self.cpus = cpus
+        self.numa_node = numa_node
+
+    def __repr__(self):
+        node = f", node={self.numa_node}" if self.numa_node is not None else ""
+        return f"AffinityPlan({self.strategy}, threads={self.n_threads}, cpus={self.cpus}{node})"
+
+
+def _physical_first(cores: list, n: int) -> list:
+    """One CPU per physical core; SMT siblings only once every core is used."""
+    picked = []
+    depth = 0
+    while len(picked) < n and any(depth < len(c) for c in cores):
+        for siblings in cores:
+            if depth < len(siblings) and len(picked) < n:
+                picked.append(siblings[depth])
+        depth += 1
+    return picked
+
+
+def plan_affinity(n_threads: int, strategy: str = "physical", topology: CpuTopology = None,
+                  numa_node: int = None) -> AffinityPlan:
+    """
+    Choose CPUs for n_threads.
+
+    Strategies:
+      - physical: one thread per physical core (spread over nodes in order),
+        SMT siblings only after all cores are taken
+      - smt: fill both siblings of a core before moving to the next
+      - numa: like physical, but confined to one NUMA node (the given one,
+        or the node with the most usable cores) so weights and KV stay local
+      - compact: first N allowed CPUs in id order
+      - none: every allowed CPU (no pinning)
+    Explicit lists like "0,2,4" are accepted as-is.
+    """
+    topology = topology or CpuTopology.read()
+    n = max(1, n_threads)
+
+    if strategy == "none":
+        return AffinityPlan(strategy, n_threads, [c.cpu for c in topology.cpus])
+    if strategy == "compact":
+        return AffinityPlan(strategy, n_threads, [c.cpu for c in topology.cpus][:n])
+    if strategy == "physical":
+        return AffinityPlan(strategy, n_threads, sorted(_physical_first(topology.cores(), n)))
+    if strategy == "smt":
+        flat = [cpu for siblings in topology.cores() for cpu in siblings]
+        return AffinityPlan(strategy, n_threads, sorted(flat[:n]))
+    if strategy == "numa":
+        if numa_node is None:
+            numa_node = max(topology.nodes, key=lambda node: (len(topology.cores(node)), -node))
+        cpus = _physical_first(topology.cores(numa_node), n)
+        return AffinityPlan(strategy, n_threads, sorted(cpus), numa_node)
+    if all(part.strip().isdigit() for part in strategy.split(",")):
+        return AffinityPlan("explicit", n_threads, parse_cpulist(strategy))
+    raise ValueError(f"unknown affinity strategy {strategy!r} (expected one of {AFFINITY_STRATEGIES})")
+
+
+def _thread_ids() -> list:
+    """Kernel thread ids of this process (the llama.cpp / OpenMP workers included)."""
+    try:
+        return [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        return [0]
+
+
+def apply_affinity(plan: AffinityPlan) -> dict:
+    """
+    Pin every thread of the process to plan.cpus and return the previous
+    masks ({tid: cpus}) for restore_affinity().
+
+    Pinning only the calling thread (sched_setaffinity(0, ...)) is not
+    enough once a model has run: llama.cpp's compute threads (OpenMP or
+    ggml workers) already exist and keep their old mask. Threads created
+    later inherit the mask of the thread that creates them, and pages first
+    touched under the plan are allocated on its NUMA node.
+    """
+    previous = {}
+    if plan is None or not hasattr(os, "sched_setaffinity"):
+        return previous
+    for tid in _thread_ids():
+        try:
+            previous[tid] = os.sched_getaffinity(tid)
+            os.sched_setaffinity(tid, plan.cpus)
+        except OSError:
+            pass  # thread exited meanwhile
+    return previous
+
+
+def restore_affinity(previous: dict):
+    for tid, cpus in previous.items():
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            pass
+
+
+@contextmanager
+def pinned(plan: AffinityPlan):
+    """Apply plan to every thread for the duration of the block, then restore the old masks."""
+    previous = apply_affinity(plan)
+    try:
+        yield plan
+    finally:
+        restore_affinity(previous)
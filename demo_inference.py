@@ -1,7 +1,30 @@
+import asyncio
+import os
 import sys
 import time
-from llama_cpp import Llama
+from async_generation import AsyncLlama
+from context_window import ChatContext, context_policy
 from models_config import get_model_path, MODEL_REGISTRY
+from model_pool import get_pool
+from model_loader import LOAD_STRATEGY_ENV
+from prefix_cache import attach_prefix_cache
+from tracing import TRACE_ENV, SystemSampler, Tracer, instrument, serve_metrics
+
+LOAD_STRATEGY = os.environ.get(LOAD_STRATEGY_ENV, "prefetch")
+# EDGE_METRICS_PORT=9464 serves /metrics and /trace while chatting
+METRICS_PORT_ENV = "EDGE_METRICS_PORT"
+
+
+async def _stream_reply(gen, prompt, handles):
+    handle = gen.submit(prompt, max_tokens=128, stop=["User:", "\nUser"])
+    handles.append(handle)
+    try:
+        async for piece in handle:
+            print(piece, end="", flush=True)
+    finally:
+        # On Ctrl+C the task is cancelled: stop decode and let the executor settle
+        handle.cancel()
+        await handle.wait()
 
 
 def run_chat():
@@ -19,16 +42,41 @@ def run_chat():
     try:
         path = get_model_path(MODEL_KEY)
         print(f"Loading from: {path}")
-        # n_ctx=2048 to allow some history
-        llm = Llama(model_path=path, n_ctx=2048, n_threads=4, verbose=False)
+        # n_ctx=2048 to allow some history; "prefetch" cuts cold-start
+        # time to first token (override with EDGE_LOAD_STRATEGY). Decode and
+        # prompt threads come from the measured knees in report.csv, so long
+        # histories prefill on more cores than decode uses
+        pool = get_pool()
+        load_kwargs = dict(n_ctx=2048, n_threads="auto", n_threads_batch="auto", load_strategy=LOAD_STRATEGY)
+        llm = pool.get(MODEL_KEY, **load_kwargs)
+        stats = pool.load_stats(MODEL_KEY, **load_kwargs)
+        print(f"Loaded in {stats['load_time_s']}s ({stats['strategy']}, "
+              f"{stats['resident_gb']}/{stats['mapped_gb']} GB resident/mapped, "
+              f"{stats['n_threads']}/{stats['n_threads_batch']} decode/prompt threads)")
+        # Snapshot state after each turn so only the new turn is prefilled
+        attach_prefix_cache(llm, MODEL_KEY)
     except Exception as e:
         print(f"Error loading model: {e}")
         return
 
-    print("\nModel Loaded! Type 'exit' or 'quit' to stop.\n")
-
-    # 4. Chat Loop
-    history = ""
+    # Optional tracing: Chrome trace on exit (EDGE_TRACE) and/or live metrics
+    trace_path = os.environ.get(TRACE_ENV)
+    metrics_port = os.environ.get(METRICS_PORT_ENV)
+    tracer = sampler = None
+    if trace_path or metrics_port:
+        tracer = Tracer()
+        sampler = SystemSampler(tracer).start()
+        instrument(llm, tracer)
+        if metrics_port:
+            serve_metrics(tracer, port=int(metrics_port))
+            print(f"Metrics on http://127.0.0.1:{metrics_port}/metrics")
+
+    gen = AsyncLlama(llm)
+    print("\nModel Loaded! Type 'exit' or 'quit' to stop (Ctrl+C stops a reply).\n")
+
+    # 4. Chat Loop: history is kept inside n_ctx by the context policy
+    # (EDGE_CONTEXT_POLICY), shifting the KV cache instead of re-prefilling
+    chat = ChatContext(llm, policy=context_policy(), reserve=128)
 
     while True:
         try:
@@ -40,24 +88,33 @@ def run_chat():
 
         # Simple prompt format for raw completion models
         # (This model is tiny, so expect random-ish output, but the format helps)
-        prompt = f"{history}User: {user_input}\nAI:"
+        compactions = chat.compactions
+        try:
+            prompt = chat.prepare(user_input)
+        except ValueError as e:
+            print(f"⚠️ {e}")
+            continue
+        if chat.compactions > compactions:
+            stats = chat.stats()
+            print(f"[context: {stats['policy']} compaction to {stats['tokens']} tokens "
+                  f"in {stats['last_compaction_ms']} ms]")
 
         print("AI: ", end="", flush=True)
 
-        # Stream response
-        stream = llm(
-            prompt, max_tokens=128, stop=["User:", "\nUser"], echo=False, stream=True
-        )
-
-        response_text = ""
-        for output in stream:
-            token = output["choices"][0]["text"]
-            print(token, end="", flush=True)
-            response_text += token
-
-        # Update history (keep it short-ish effectively)
-        history += f"User: {user_input}\nAI:{response_text}\n"
-
+        # Stream response; Ctrl+C stops the reply (within one token) but not the chat
+        handles = []
+        try:
+            asyncio.run(_stream_reply(gen, prompt, handles))
+        except KeyboardInterrupt:
+            print(" [stopped]", end="", flush=True)
+        chat.commit(handles[0].token_ids if handles else [])
+
+    gen.close()
+    pool.release(llm)
+    if sampler is not None:
+        sampler.stop()
+    if trace_path:
+        print(f"\n💾 Wrote {tracer.write_chrome_trace(trace_path)} trace events to {trace_path}")
     print("\nBye!")
 
 
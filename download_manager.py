@@ -1,40 +1,274 @@
+import argparse
+import hashlib
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
 from tqdm import tqdm
 from models_config import MODELS_DIR, MODEL_REGISTRY
 
-def download_file(url, filename):
-    path = os.path.join(MODELS_DIR, filename)
-    if os.path.exists(path):
-        print(f"✅ Found {filename}")
+BLOCK_SIZE = 1024 * 1024  # 1MB
+MIN_CHUNK_SIZE = 64 * 1024 * 1024  # don't split files into ranges smaller than this
+FLUSH_EVERY = 32 * 1024 * 1024  # persist range progress every 32MB
+TIMEOUT_S = 60
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def verify_file(path: str, size_bytes: int = None, sha256: str = None) -> bool:
+    """Check a downloaded file against the registry size / SHA256 (when known)."""
+    if not os.path.exists(path):
+        return False
+    if size_bytes is not None and os.path.getsize(path) != size_bytes:
+        return False
+    if sha256 is not None and sha256_file(path).lower() != sha256.lower():
+        return False
+    return True
+
+
+def probe_remote(url: str, session: requests.Session):
+    """Return (total_size or None, accepts_ranges) for url, following redirects."""
+    resp = session.head(url, allow_redirects=True, timeout=TIMEOUT_S)
+    resp.raise_for_status()
+    size = resp.headers.get("content-length")
+    ranges = resp.headers.get("accept-ranges", "").lower() == "bytes"
+    return (int(size) if size else None), ranges
+
+
+def _split_ranges(total: int, chunks: int) -> list:
+    chunks = max(1, min(chunks, total // MIN_CHUNK_SIZE or 1))
+    step = -(-total // chunks)
+    return [[start, min(start + step, total) - 1, 0] for start in range(0, total, step)]
+
+
+class _PartState:
+    """
+    Progress sidecar for a .part file: a list of [start, end, done] byte
+    ranges, flushed to <file>.part.json so an interrupted download resumes
+    each range where it stopped.
+    """
+
+    def __init__(self, path: str, total: int, chunks: int):
+        self.path = path + ".json"
+        self.lock = threading.Lock()
+        self.ranges = None
+        self.total = total
+        self._unflushed = 0
+        have = os.path.getsize(path) if os.path.exists(path) else 0
+        if os.path.exists(self.path) and have == total:
+            with open(self.path) as f:
+                state = json.load(f)
+            if state.get("total") == total:
+                self.ranges = state["ranges"]
+        if self.ranges is None:
+            # No sidecar: a shorter .part is a single-stream prefix we can keep
+            kept = have if have < total else 0
+            self.ranges = _split_ranges(total, chunks)
+            for r in self.ranges:
+                r[2] = min(max(kept - r[0], 0), r[1] - r[0] + 1)
+            with open(path, "r+b" if have else "wb") as f:
+                f.truncate(total)
+
+    def done_bytes(self) -> int:
+        return sum(r[2] for r in self.ranges)
+
+    def advance(self, idx: int, n: int):
+        with self.lock:
+            self.ranges[idx][2] += n
+            self._unflushed += n
+            if self._unflushed < FLUSH_EVERY:
+                return
+            self._unflushed = 0
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"total": self.total, "ranges": self.ranges}, f)
+            os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class RangeIgnored(IOError):
+    """The server advertised byte ranges but answered a Range request with the whole file."""
+
+
+def _fetch_range(url, part_path, state, idx, session, bar):
+    start, end, done = state.ranges[idx]
+    if start + done > end:
         return
+    headers = {"Range": f"bytes={start + done}-{end}"}
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT_S) as resp:
+        if resp.status_code != 206:
+            raise RangeIgnored(f"server ignored range request (HTTP {resp.status_code})")
+        fd = os.open(part_path, os.O_WRONLY)
+        try:
+            offset = start + done
+            for data in resp.iter_content(BLOCK_SIZE):
+                os.pwrite(fd, data, offset)
+                offset += len(data)
+                state.advance(idx, len(data))
+                bar.update(len(data))
+        finally:
+            os.close(fd)
 
-    print(f"⬇️  Downloading {filename}...")
+
+def _fetch_ranges(url, part_path, total, chunks, session, bar):
+    """Parallel ranged download into a preallocated .part, progress in .part.json."""
+    state = _PartState(part_path, total, chunks)
+    bar.update(state.done_bytes())
+    state.flush()
     try:
-        response = requests.get(url, stream=True)
-        total_size = int(response.headers.get('content-length', 0))
-        block_size = 1024 * 1024  # 1MB
-
-        with open(path, 'wb') as file, tqdm(
-            desc=filename,
-            total=total_size,
-            unit='iB',
-            unit_scale=True,
-            unit_divisor=1024,
-        ) as bar:
-            for data in response.iter_content(block_size):
+        with ThreadPoolExecutor(max_workers=len(state.ranges)) as pool:
+            futures = [
+                pool.submit(_fetch_range, url, part_path, state, i, session, bar)
+                for i in range(len(state.ranges))
+            ]
+            for fut in as_completed(futures):
+                fut.result()
+    finally:
+        state.flush()
+    state.remove()
+
+
+def _fetch_stream(url, part_path, total, session, bar):
+    """Single-stream download, resuming from the current .part size."""
+    have = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if total is not None and have >= total:
+        bar.update(have)
+        return
+    headers = {"Range": f"bytes={have}-"} if have else {}
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT_S) as resp:
+        resp.raise_for_status()
+        if have and resp.status_code != 206:
+            have = 0  # server restarted from byte 0
+        bar.update(have)
+        with open(part_path, "ab" if have else "wb") as file:
+            for data in resp.iter_content(BLOCK_SIZE):
                 file.write(data)
                 bar.update(len(data))
-        print("   Success.")
+
+
+def download_file(url, filename, dest_dir: str = MODELS_DIR, size_bytes: int = None,
+                  sha256: str = None, chunks: int = 1, position: int = 0) -> bool:
+    """
+    Download url to dest_dir/filename via a resumable .part file.
+
+    Approach:
+      - An existing final file is accepted only if it passes size/SHA256 checks
+      - Probe the server for Content-Length and Accept-Ranges
+      - With ranges and chunks > 1: fetch byte ranges in parallel into a
+        preallocated .part file, progress tracked in .part.json
+      - Otherwise (or if a Range request comes back 200): single stream,
+        resumed with Range from the .part size
+      - Verify, then atomically rename .part to the final name
+    """
+    path = os.path.join(dest_dir, filename)
+    part_path = path + ".part"
+    session = requests.Session()
+
+    if os.path.exists(path):
+        if size_bytes is None and sha256 is None:
+            # Nothing in the registry to check against; use the server's size
+            try:
+                size_bytes, _ = probe_remote(url, session)
+            except requests.RequestException:
+                pass
+        if verify_file(path, size_bytes, sha256):
+            session.close()
+            print(f"✅ Found {filename}")
+            return True
+        if size_bytes is not None and os.path.getsize(path) < size_bytes and not os.path.exists(part_path):
+            print(f"↪️  Resuming truncated {filename}")
+            os.replace(path, part_path)
+        else:
+            print(f"⚠️  {filename} failed verification, re-downloading")
+            os.remove(path)
+
+    print(f"⬇️  Downloading {filename}...")
+    try:
+        total, ranges = probe_remote(url, session)
+        if size_bytes is not None and total is not None and total != size_bytes:
+            raise IOError(f"remote size {total} != registry size {size_bytes}")
+
+        with tqdm(desc=filename, total=total, unit='iB', unit_scale=True,
+                  unit_divisor=1024, position=position, leave=False) as bar:
+            resuming_ranges = os.path.exists(part_path + ".json")
+            parallel = ranges and total and (chunks > 1 or resuming_ranges)
+            if parallel:
+                try:
+                    _fetch_ranges(url, part_path, total, chunks, session, bar)
+                except RangeIgnored as e:
+                    print(f"⚠️  {filename}: {e}, falling back to a single stream")
+                    parallel = False
+            if not parallel:
+                if os.path.exists(part_path + ".json"):
+                    # Range progress is useless without range support
+                    os.remove(part_path + ".json")
+                    os.remove(part_path)
+                    bar.reset()
+                _fetch_stream(url, part_path, total, session, bar)
+
+        expected = size_bytes if size_bytes is not None else total
+        if not verify_file(part_path, expected, sha256):
+            os.remove(part_path)
+            raise IOError("size/SHA256 verification failed")
+        os.replace(part_path, path)
+        print(f"   Success: {filename}")
+        return True
     except Exception as e:
+        # Keep the .part (and its sidecar) so the next run resumes
         print(f"❌ Error downloading {filename}: {e}")
-        if os.path.exists(path):
-            os.remove(path)
+        return False
+    finally:
+        session.close()
+
+
+def download_models(keys=None, dest_dir: str = MODELS_DIR, workers: int = 2, chunks: int = 4) -> dict:
+    """Download registry models concurrently. Returns {key: ok}."""
+    keys = list(keys) if keys else list(MODEL_REGISTRY.keys())
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {}
+        for i, key in enumerate(keys):
+            meta = MODEL_REGISTRY[key]
+            fut = pool.submit(
+                download_file, meta["url"], meta["filename"], dest_dir,
+                meta.get("size_bytes"), meta.get("sha256"), chunks, i % max(1, workers),
+            )
+            futures[fut] = key
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+    return results
+
 
 if __name__ == "__main__":
-    if not os.path.exists(MODELS_DIR):
-        os.makedirs(MODELS_DIR)
-    
-    print(f"=== INITIALIZING MODEL REGISTRY ({len(MODEL_REGISTRY)} Models) ===")
-    for key, meta in MODEL_REGISTRY.items():
-        download_file(meta["url"], meta["filename"])
+    parser = argparse.ArgumentParser(description="Download GGUF models from the registry.")
+    parser.add_argument("models", nargs="*", help="registry keys (default: all)")
+    parser.add_argument("--workers", type=int, default=2, help="files downloaded concurrently")
+    parser.add_argument("--chunks", type=int, default=4, help="parallel byte ranges per file")
+    parser.add_argument("--dest", default=MODELS_DIR, help="target directory")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.dest):
+        os.makedirs(args.dest)
+
+    keys = args.models or list(MODEL_REGISTRY.keys())
+    print(f"=== INITIALIZING MODEL REGISTRY ({len(keys)} Models) ===")
+    results = download_models(keys, dest_dir=args.dest, workers=args.workers, chunks=args.chunks)
+    failed = [k for k, ok in results.items() if not ok]
+    print(f"=== DONE: {len(results) - len(failed)} ok, {len(failed)} failed ===")
+    if failed:
+        print("Failed: " + ", ".join(failed))
@@ -0,0 +1,91 @@
+import struct
+
+GGUF_MAGIC = b"GGUF"
+
+# GGUF metadata value types
+_SCALARS = {
+    0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i",
+    6: "<f", 7: "<?", 10: "<Q", 11: "<q", 12: "<d",
+}
+_STRING = 8
+_ARRAY = 9
+
+
+class GGUFError(ValueError):
+    pass
+
+
+class _Reader:
+    def __init__(self, f, version: int):
+        self.f = f
+        self.len_fmt = "<I" if version == 1 else "<Q"
+
+    def unpack(self, fmt: str):
+        size = struct.calcsize(fmt)
+        data = self.f.read(size)
+        if len(data) != size:
+            raise GGUFError("unexpected end of file in GGUF header")
+        return struct.unpack(fmt, data)[0]
+
+    def string(self) -> str:
+        n = self.unpack(self.len_fmt)
+        return self.f.read(n).decode("utf-8", errors="replace")
+
+    def skip_string(self):
+        self.f.seek(self.unpack(self.len_fmt), 1)
+
+    def value(self, vtype: int, keep: bool):
+        if vtype in _SCALARS:
+            return self.unpack(_SCALARS[vtype])
+        if vtype == _STRING:
+            if keep:
+                return self.string()
+            self.skip_string()
+            return None
+        if vtype == _ARRAY:
+            etype = self.unpack("<I")
+            count = self.unpack(self.len_fmt)
+            if not keep:
+                if etype in _SCALARS:
+                    self.f.seek(struct.calcsize(_SCALARS[etype]) * count, 1)
+                else:
+                    for _ in range(count):
+                        self.value(etype, False)
+                return None
+            return [self.value(etype, True) for _ in range(count)]
+        raise GGUFError(f"unknown GGUF value type {vtype}")
+
+
+def read_gguf_metadata(path: str, keys=None, prefixes=()) -> dict:
+    """
+    Read key/value metadata from a GGUF file header without loading weights.
+
+    keys/prefixes limit which values are decoded; everything else (e.g. the
+    tokenizer vocab arrays) is skipped. With neither given, all values are
+    returned. The GGUF version is reported under "gguf.version".
+    """
+    wanted = set(keys) if keys is not None else None
+    with open(path, "rb") as f:
+        if f.read(4) != GGUF_MAGIC:
+            raise GGUFError(f"{path} is not a GGUF file")
+        version = struct.unpack("<I", f.read(4))[0]
+        r = _Reader(f, version)
+        r.unpack(r.len_fmt)  # tensor count
+        n_kv = r.unpack(r.len_fmt)
+
+        meta = {"gguf.version": version}
+        for _ in range(n_kv):
+            key = r.string()
+            vtype = r.unpack("<I")
+            if wanted is None and not prefixes:
+                keep = True
+            else:
+                keep = (wanted is not None and key in wanted) or key.startswith(tuple(prefixes))
+            value = r.value(vtype, keep)
+            if keep:
+                meta[key] = value
+        return meta
+
+
+def model_architecture(meta: dict) -> str:
+    return meta.get("general.architecture", "llama")
@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import json
+import time
+
+from models_config import MODEL_REGISTRY
+from batch_engine import BatchEngine, GenerationRequest
+from model_loader import thread_count_arg
+from tracing import SystemSampler, Tracer
+
+CHAT_STOP = ["User:", "\nUser"]
+
+
+def format_chat(engine: BatchEngine, messages: list):
+    """
+    Render chat messages to (prompt, stop) using the GGUF chat template when
+    the model ships one, else the plain "User:/AI:" format of the demo.
+    """
+    template = engine.llm.metadata.get("tokenizer.chat_template")
+    if template:
+        from llama_cpp.llama_chat_format import Jinja2ChatFormatter
+        eos = engine.llm.detokenize([engine.llm.token_eos()]).decode("utf-8", errors="ignore")
+        bos = engine.llm.detokenize([engine.llm.token_bos()]).decode("utf-8", errors="ignore")
+        result = Jinja2ChatFormatter(template=template, eos_token=eos, bos_token=bos)(messages=messages)
+        stop = result.stop if isinstance(result.stop, list) else [result.stop] if result.stop else []
+        return result.prompt, stop
+
+    lines = []
+    for m in messages:
+        role = {"system": "System", "assistant": "AI"}.get(m.get("role"), "User")
+        lines.append(f"{role}: {m.get('content', '')}")
+    return "\n".join(lines) + "\nAI:", CHAT_STOP
+
+
+class InferenceServer:
+    """
+    Minimal OpenAI-compatible HTTP front end (asyncio) over a BatchEngine.
+
+    Routes: POST /v1/completions, POST /v1/chat/completions (both with
+    "stream": true for SSE), GET /v1/models, GET /health, and GET /metrics
+    (Prometheus text) / GET /trace (Chrome trace JSON) when the engine has
+    a tracer. Requests are
+    handed to the engine as they arrive; the engine batches their decode
+    steps together. A client that disconnects before its completion is
+    done (streamed or not) cancels its sequence.
+    """
+
+    def __init__(self, engine: BatchEngine, host: str = "127.0.0.1", port: int = 8080):
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self.engine.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.engine.stop()
+
+    # --- HTTP plumbing ---
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            body = await reader.readexactly(length) if length else b""
+            await self._route(method, path.split("?", 1)[0], body, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            await self._send_json(writer, 500, {"error": {"message": str(e), "type": "server_error"}})
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _route(self, method, path, body, reader, writer):
+        if method == "GET" and path == "/health":
+            return await self._send_json(writer, 200, {"status": "ok", **self.engine.stats()})
+        if method == "GET" and path == "/v1/models":
+            key = self.engine.model_key
+            return await self._send_json(writer, 200, {
+                "object": "list",
+                "data": [{"id": key, "object": "model", "owned_by": "local",
+                          "name": MODEL_REGISTRY[key]["name"]}],
+            })
+        tracer = self.engine.tracer
+        if method == "GET" and path == "/metrics" and tracer is not None:
+            return await self._send_text(writer, tracer.prometheus_text(), "text/plain; version=0.0.4")
+        if method == "GET" and path == "/trace" and tracer is not None:
+            return await self._send_json(writer, 200, tracer.chrome_trace())
+        if method == "POST" and path in ("/v1/completions", "/v1/chat/completions"):
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError:
+                return await self._send_json(writer, 400, {"error": {"message": "invalid JSON body"}})
+            return await self._complete(payload, reader, writer, chat=path.endswith("chat/completions"))
+        await self._send_json(writer, 404, {"error": {"message": f"no route for {method} {path}"}})
+
+    @staticmethod
+    async def _send_json(writer, status: int, obj: dict):
+        data = json.dumps(obj).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+
+    @staticmethod
+    async def _send_text(writer, text: str, content_type: str):
+        data = text.encode()
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nContent-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+
+    # --- completions ---
+
+    async def _complete(self, payload: dict, reader, writer, chat: bool):
+        if chat:
+            prompt, stop = format_chat(self.engine, payload.get("messages", []))
+        else:
+            prompt, stop = payload.get("prompt", ""), []
+            if isinstance(prompt, list):
+                prompt = prompt[0] if prompt else ""
+            template = MODEL_REGISTRY[self.engine.model_key].get("prompt_template", "{prompt}")
+            prompt = template.format(prompt=prompt)
+        extra_stop = payload.get("stop") or []
+        stop = stop + ([extra_stop] if isinstance(extra_stop, str) else list(extra_stop))
+
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def on_event(req, text, finish_reason):
+            loop.call_soon_threadsafe(events.put_nowait, (text, finish_reason))
+
+        req = GenerationRequest(
+            self.engine.tokenize(prompt),
+            max_tokens=int(payload.get("max_tokens") or 128),
+            temperature=float(payload.get("temperature", 0.0)),
+            top_p=float(payload.get("top_p", 1.0)),
+            stop=stop,
+            seed=payload.get("seed"),
+            on_event=on_event,
+        )
+        self.engine.submit(req)
+
+        kind = "chatcmpl" if chat else "cmpl"
+        meta = {"id": f"{kind}-{req.id}", "created": int(time.time()), "model": self.engine.model_key}
+
+        try:
+            if payload.get("stream"):
+                await self._stream(req, events, writer, meta, chat)
+            else:
+                text, finish_reason = await self._collect(events, reader)
+                await self._send_json(writer, 200, self._final_body(req, text, finish_reason, meta, chat))
+        except (ConnectionError, asyncio.CancelledError):
+            req.cancel()
+            raise
+
+    @staticmethod
+    async def _collect(events, reader) -> tuple:
+        """
+        Gather a non-streamed completion while watching the connection: EOF
+        from the client (nothing is written until the end, so a hang-up is
+        only seen by reading) raises ConnectionResetError.
+        """
+        pieces = []
+        finish_reason = None
+        closed = asyncio.ensure_future(reader.read())
+        try:
+            while finish_reason is None:
+                event = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait({event, closed}, return_when=asyncio.FIRST_COMPLETED)
+                if event not in done:
+                    event.cancel()
+                    raise ConnectionResetError("client disconnected")
+                text, finish_reason = event.result()
+                pieces.append(text)
+        finally:
+            closed.cancel()
+        return "".join(pieces), finish_reason
+
+    async def _stream(self, req, events, writer, meta, chat):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+        )
+        finish_reason = None
+        while finish_reason is None:
+            text, finish_reason = await events.get()
+            if chat:
+                choice = {"index": 0, "delta": {"content": text} if text else {}, "finish_reason": finish_reason}
+                obj = "chat.completion.chunk"
+            else:
+                choice = {"index": 0, "text": text, "logprobs": None, "finish_reason": finish_reason}
+                obj = "text_completion"
+            writer.write(f"data: {json.dumps({**meta, 'object': obj, 'choices': [choice]})}\n\n".encode())
+            await writer.drain()
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+
+    @staticmethod
+    def _final_body(req, text, finish_reason, meta, chat) -> dict:
+        usage = {
+            "prompt_tokens": len(req.prompt_tokens),
+            "completion_tokens": len(req.completion_tokens),
+            "total_tokens": len(req.prompt_tokens) + len(req.completion_tokens),
+        }
+        if chat:
+            choice = {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish_reason}
+            return {**meta, "object": "chat.completion", "choices": [choice], "usage": usage}
+        choice = {"index": 0, "text": text, "logprobs": None, "finish_reason": finish_reason}
+        return {**meta, "object": "text_completion", "choices": [choice], "usage": usage}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible continuous-batching server.")
+    parser.add_argument("model", help="registry key")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--ctx", type=int, default=4096, help="KV size shared by all sequences")
+    parser.add_argument("--threads", type=thread_count_arg, default=4,
+                        help='decode threads, or "auto" (knee from report.csv)')
+    parser.add_argument("--threads-batch", type=thread_count_arg, default=None,
+                        help='prompt-processing threads (default: --threads), or "auto"')
+    parser.add_argument("--parallel", type=int, default=8, help="max concurrent sequences")
+    parser.add_argument("--batch", type=int, default=512, help="tokens per llama batch")
+    parser.add_argument("--trace", action="store_true",
+                        help="trace decode steps and system counters; serves /metrics and /trace")
+    args = parser.parse_args()
+
+    if args.model not in MODEL_REGISTRY:
+        raise SystemExit(f"Error: Model '{args.model}' not found.")
+
+    engine = BatchEngine(args.model, n_ctx=args.ctx, n_threads=args.threads,
+                         n_seq_max=args.parallel, n_batch=args.batch, n_threads_batch=args.threads_batch,
+                         tracer=Tracer() if args.trace else None)
+    sampler = SystemSampler(engine.tracer).start() if args.trace else None
+    print(f"=== Serving {MODEL_REGISTRY[args.model]['name']} on http://{args.host}:{args.port} ===")
+    try:
+        asyncio.run(InferenceServer(engine, args.host, args.port).serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        engine.close()
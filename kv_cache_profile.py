@@ -4,6 +4,8 @@ import psutil
 from llama_cpp import Llama
 
 from models_config import get_model_path
+from prefix_cache import prefix_reuse
+from gguf_reader import model_architecture, read_gguf_metadata
 
 PROMPT_KV = (
     "You are profiling long-context behavior. Continue this discussion in depth "
@@ -11,33 +13,130 @@ PROMPT_KV = (
     "latency in autoregressive transformers."
 )
 
+# Bytes per element of the llama.cpp KV cache types (block types amortized)
+KV_TYPE_BYTES = {
+    "f32": 4.0,
+    "f16": 2.0,
+    "bf16": 2.0,
+    "q8_0": 34 / 32,
+    "q5_1": 24 / 32,
+    "q5_0": 22 / 32,
+    "q4_1": 20 / 32,
+    "q4_0": 18 / 32,
+}
 
-def profile_kv_growth(llm: Llama, target_tokens: int = 256) -> float:
+
+def _per_layer(value, n_layers: int) -> list:
+    """GGUF head counts are either one int or a per-layer array."""
+    if isinstance(value, list):
+        return [int(v) for v in value][:n_layers]
+    return [int(value)] * n_layers
+
+
+def kv_cache_params(model_path: str) -> dict:
     """
-    Estimate KV-cache growth in MB per 1000 generated tokens.
+    Read the KV-relevant hyperparameters from GGUF metadata:
+    n_layers, per-layer n_head_kv, and key/value head dims.
+    """
+    meta = read_gguf_metadata(model_path, keys=["general.architecture"])
+    arch = model_architecture(meta)
+    meta.update(read_gguf_metadata(model_path, prefixes=(f"{arch}.",)))
+
+    n_layers = int(meta.get(f"{arch}.block_count", 0))
+    n_embd = int(meta.get(f"{arch}.embedding_length", 0))
+    n_head = _per_layer(meta.get(f"{arch}.attention.head_count", 0), n_layers)
+    n_head_kv = _per_layer(meta.get(f"{arch}.attention.head_count_kv", meta.get(f"{arch}.attention.head_count", 0)), n_layers)
+
+    first_heads = next((h for h in n_head if h), 1)
+    head_dim = n_embd // first_heads if n_embd else 0
+    return {
+        "architecture": arch,
+        "n_layers": n_layers,
+        "n_embd": n_embd,
+        "n_head": n_head,
+        "n_head_kv": n_head_kv,
+        "key_length": int(meta.get(f"{arch}.attention.key_length", head_dim)),
+        "value_length": int(meta.get(f"{arch}.attention.value_length", head_dim)),
+    }
+
+
+def kv_bytes_per_token(params: dict, type_k: str = "f16", type_v: str = "f16") -> float:
+    """K + V bytes stored per context token, summed over layers."""
+    k_bytes = KV_TYPE_BYTES[type_k]
+    v_bytes = KV_TYPE_BYTES[type_v]
+    return sum(
+        heads * (params["key_length"] * k_bytes + params["value_length"] * v_bytes)
+        for heads in params["n_head_kv"]
+    )
+
+
+def kv_cache_mb_per_1k(model_key: str, type_k: str = "f16", type_v: str = "f16") -> float:
+    """Analytical KV-cache size in MB per 1000 context tokens for a registry model."""
+    params = kv_cache_params(get_model_path(model_key))
+    return round(kv_bytes_per_token(params, type_k, type_v) * 1000 / (1024 ** 2), 2)
+
+
+def kv_cache_mb(model_key: str, n_ctx: int, type_k: str = "f16", type_v: str = "f16") -> float:
+    """Size in MB of the KV buffer llama.cpp allocates for n_ctx."""
+    return round(kv_cache_mb_per_1k(model_key, type_k, type_v) * n_ctx / 1000, 2)
+
+
+def profile_kv_growth(llm: Llama, target_tokens: int = 256, model_key: str = "",
+                      reuse_prefix: bool = False, sample_every: int = 64) -> float:
+    """
+    Empirically estimate KV-cache growth in MB per 1000 generated tokens.
 
     Approach:
-      - Measure RSS before generation
-      - Generate target_tokens
-      - Measure RSS after generation
-      - Compute growth per 1k tokens
+      - Stream target_tokens, sampling RSS every `sample_every` tokens
+      - Fit a least-squares slope of RSS over token position
+      - Scale the slope to MB per 1k tokens
+
+    llama.cpp reserves the whole KV buffer at n_ctx, so this only sees
+    pages as they are first touched; kv_cache_mb_per_1k() is the exact
+    number. reuse_prefix=True restores the PROMPT_KV prefill from the
+    prefix cache instead of evaluating it again.
     """
-    proc = psutil.Process(os.getpid())
-    before = proc.memory_info().rss
+    samples = profile_kv_samples(llm, target_tokens, model_key, reuse_prefix, sample_every)
+    if len(samples) < 2:
+        return 0.0
+    n = len(samples)
+    mean_x = sum(x for x, _ in samples) / n
+    mean_y = sum(y for _, y in samples) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in samples)
+    if var_x == 0:
+        return 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in samples) / var_x
+    return round(max(slope, 0.0) * 1000, 2)
 
-    out = llm(
-        PROMPT_KV,
-        max_tokens=target_tokens,
-        temperature=0.2,
-        stop=["<|end|>"],
-    )
 
-    after = proc.memory_info().rss
-    delta_bytes = max(after - before, 0)
-    delta_mb = delta_bytes / (1024 ** 2)
+def profile_kv_samples(llm: Llama, target_tokens: int = 256, model_key: str = "",
+                       reuse_prefix: bool = False, sample_every: int = 64, tracer=None) -> list:
+    """
+    (tokens generated, RSS MB) pairs sampled at fixed positions while
+    streaming. With a tracer (or EDGE_TRACE set) the generation is traced
+    and each sample is also recorded as a kv_rss_mb counter.
+    """
+    from tracing import maybe_traced
+
+    proc = psutil.Process(os.getpid())
+    llm.reset()
+    samples = [(0, proc.memory_info().rss / (1024 ** 2))]
 
-    text = out["choices"][0]["text"]
-    tokens = max(len(text.split()), 1)
+    with prefix_reuse(llm, model_key, reuse_prefix), maybe_traced(llm, tracer) as (trace, _):
+        generated = 0
+        for _ in llm(
+            PROMPT_KV,
+            max_tokens=target_tokens,
+            temperature=0.2,
+            stop=["<|end|>"],
+            stream=True,
+        ):
+            generated += 1
+            if generated % sample_every == 0:
+                samples.append((generated, proc.memory_info().rss / (1024 ** 2)))
+                if trace is not None:
+                    trace.counter("kv_rss_mb", samples[-1][1])
 
-    mb_per_1k = delta_mb * (1000.0 / tokens)
-    return round(mb_per_1k, 2)
+    if generated % sample_every:
+        samples.append((generated, proc.memory_info().rss / (1024 ** 2)))
+    return samples
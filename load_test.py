@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlparse
+
+from tabulate import tabulate
+
+from models_config import MODEL_REGISTRY
+from benchmark_suite import percentile
+from batch_engine import BatchEngine, GenerationRequest
+from model_pool import get_model, get_pool
+from sweep import base_row, host_info
+from prompts import LengthDistribution, generate_workload
+from results_store import REPORT_PATH, append_row
+
+
+class RequestResult:
+    __slots__ = ("input_tokens", "output_tokens", "ttft_s", "e2e_s", "finish_reason")
+
+    def __init__(self, input_tokens, output_tokens, ttft_s, e2e_s, finish_reason):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.ttft_s = ttft_s
+        self.e2e_s = e2e_s
+        self.finish_reason = finish_reason
+
+    @property
+    def tpot_s(self) -> float:
+        """Time per output token after the first."""
+        if self.output_tokens <= 1 or self.ttft_s is None:
+            return 0.0
+        return (self.e2e_s - self.ttft_s) / (self.output_tokens - 1)
+
+
+class InProcessTarget:
+    """Drive a BatchEngine directly (no HTTP overhead)."""
+
+    def __init__(self, engine: BatchEngine):
+        self.engine = engine.start()
+
+    async def request(self, prompt: str, max_tokens: int) -> RequestResult:
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        t0 = time.perf_counter()
+
+        def on_event(req, text, finish_reason):
+            if finish_reason is not None:
+                loop.call_soon_threadsafe(done.set_result, finish_reason)
+
+        req = self.engine.submit(GenerationRequest(
+            self.engine.tokenize(prompt), max_tokens=max_tokens, on_event=on_event))
+        reason = await done
+        ttft = (req.first_token_at - req.submitted_at) if req.first_token_at else None
+        return RequestResult(len(req.prompt_tokens), len(req.completion_tokens),
+                             ttft, req.finished_at - t0, reason)
+
+
+class HttpTarget:
+    """Drive a running inference_server over streaming /v1/completions."""
+
+    def __init__(self, base_url: str, tokenizer):
+        url = urlparse(base_url)
+        self.host = url.hostname or "127.0.0.1"
+        self.port = url.port or 80
+        self.tokenizer = tokenizer
+
+    async def request(self, prompt: str, max_tokens: int) -> RequestResult:
+        body = json.dumps({"prompt": prompt, "max_tokens": max_tokens, "stream": True}).encode()
+        t0 = time.perf_counter()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(
+            f"POST /v1/completions HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+        ttft = None
+        pieces = []
+        reason = None
+        async for raw in reader:
+            line = raw.strip()
+            if not line.startswith(b"data: "):
+                continue
+            data = line[6:]
+            if data == b"[DONE]":
+                break
+            choice = json.loads(data)["choices"][0]
+            if choice.get("text") and ttft is None:
+                ttft = time.perf_counter() - t0
+            pieces.append(choice.get("text", ""))
+            reason = choice.get("finish_reason") or reason
+        e2e = time.perf_counter() - t0
+        writer.close()
+
+        text = "".join(pieces)
+        n_in = len(self.tokenizer.tokenize(prompt.encode("utf-8")))
+        n_out = len(self.tokenizer.tokenize(text.encode("utf-8"), add_bos=False)) if text else 0
+        return RequestResult(n_in, n_out, ttft, e2e, reason)
+
+
+class SLO:
+    """Latency objective a request must meet to count towards goodput."""
+
+    def __init__(self, ttft_ms: float = 1000.0, tpot_ms: float = 200.0, e2e_ms: float = None):
+        self.ttft_ms = ttft_ms
+        self.tpot_ms = tpot_ms
+        self.e2e_ms = e2e_ms
+
+    def met(self, r: RequestResult) -> bool:
+        if r.ttft_s is None or r.ttft_s * 1000 > self.ttft_ms:
+            return False
+        if r.tpot_s * 1000 > self.tpot_ms:
+            return False
+        return self.e2e_ms is None or r.e2e_s * 1000 <= self.e2e_ms
+
+
+async def _closed_loop(target, prompts, max_tokens, concurrency: int) -> list:
+    """`concurrency` clients each send their next request as soon as the last returns."""
+    work = list(prompts)
+    results = []
+
+    async def client():
+        while work:
+            results.append(await target.request(work.pop(), max_tokens))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results
+
+
+async def _open_loop(target, prompts, max_tokens, rate: float, seed: int = 0) -> list:
+    """Poisson arrivals at `rate` requests/s regardless of completions."""
+    rng = random.Random(seed)
+    tasks = []
+    for prompt in prompts:
+        tasks.append(asyncio.ensure_future(target.request(prompt, max_tokens)))
+        await asyncio.sleep(rng.expovariate(rate))
+    return list(await asyncio.gather(*tasks))
+
+
+def summarize(results: list, wall_s: float, slo: SLO) -> dict:
+    ok = [r for r in results if r.ttft_s is not None]
+    ttft = [r.ttft_s * 1000 for r in ok]
+    e2e = [r.e2e_s * 1000 for r in results]
+    tpot = [r.tpot_s * 1000 for r in ok if r.output_tokens > 1]
+    per_req_tps = [1000.0 / t for t in tpot if t > 0]
+    out_tokens = sum(r.output_tokens for r in results)
+    good = [r for r in results if slo.met(r)]
+    return {
+        "requests": len(results),
+        "input_tokens_mean": round(sum(r.input_tokens for r in results) / max(len(results), 1), 1),
+        "throughput_tps": round(out_tokens / wall_s, 2) if wall_s > 0 else 0.0,
+        "requests_per_s": round(len(results) / wall_s, 3) if wall_s > 0 else 0.0,
+        "goodput_rps": round(len(good) / wall_s, 3) if wall_s > 0 else 0.0,
+        "slo_attainment": round(len(good) / max(len(results), 1), 3),
+        "ttft_mean_ms": round(sum(ttft) / len(ttft), 2) if ttft else 0.0,
+        "ttft_p50_ms": round(percentile(ttft, 50), 2),
+        "ttft_p95_ms": round(percentile(ttft, 95), 2),
+        "ttft_p99_ms": round(percentile(ttft, 99), 2),
+        "e2e_p50_ms": round(percentile(e2e, 50), 2),
+        "e2e_p95_ms": round(percentile(e2e, 95), 2),
+        "e2e_p99_ms": round(percentile(e2e, 99), 2),
+        "tpot_mean_ms": round(sum(tpot) / len(tpot), 2) if tpot else 0.0,
+        "req_tps_p50": round(percentile(per_req_tps, 50), 2),
+        "req_tps_p95": round(percentile(per_req_tps, 95), 2),
+        "wall_s": round(wall_s, 2),
+    }
+
+
+def run_load(target, tokenizer, lengths: LengthDistribution, n_requests: int, max_tokens: int,
+             concurrency: int = None, rate: float = None, slo: SLO = None, seed: int = 0) -> dict:
+    """Run one load level (fixed concurrency, or Poisson `rate`) and summarize it."""
+    slo = slo or SLO()
+    prompts = generate_workload(tokenizer, lengths, n_requests)
+    t0 = time.perf_counter()
+    if rate:
+        results = asyncio.run(_open_loop(target, prompts, max_tokens, rate, seed))
+    else:
+        results = asyncio.run(_closed_loop(target, prompts, max_tokens, concurrency or 1))
+    return summarize(results, time.perf_counter() - t0, slo)
+
+
+def report_row(model_key: str, summary: dict, lengths: LengthDistribution, max_tokens: int,
+               n_threads: int, n_ctx: int, concurrency: int = None, rate: float = None) -> dict:
+    """
+    Map a load summary onto the report.csv schema: batch_size is the
+    concurrency of closed-loop runs; Poisson runs record their arrival rate
+    in arrival_rate_rps and leave batch_size empty.
+    """
+    row = base_row(model_key, host_info())
+    row.update({
+        "thread_count": n_threads,
+        "benchmark_type": "load",
+        "input_tokens_target": lengths.spec,
+        "input_tokens_actual": summary["input_tokens_mean"],
+        "max_output_tokens": max_tokens,
+        "context_window": n_ctx,
+        "batch_size": concurrency if rate is None else "",
+        "arrival_rate_rps": rate if rate is not None else "",
+        "ttft_ms": summary["ttft_mean_ms"],
+        "percentile_ttft_p50": summary["ttft_p50_ms"],
+        "percentile_ttft_p95": summary["ttft_p95_ms"],
+        "decode_rate_tps": summary["throughput_tps"],
+        "percentile_tps_p50": summary["req_tps_p50"],
+        "percentile_tps_p95": summary["req_tps_p95"],
+        "effective_throughput_tps": summary["throughput_tps"],
+        "per_token_latency_ms": summary["tpot_mean_ms"],
+        "total_runtime_s": summary["wall_s"],
+        "status": "success",
+    })
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load generator with latency SLO reporting.")
+    parser.add_argument("model", help="registry key (also used for tokenization)")
+    parser.add_argument("--url", help="drive a running inference_server instead of an in-process engine")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--rate", type=float, nargs="+", help="Poisson arrival rates (req/s) instead of concurrency")
+    parser.add_argument("--requests", type=int, default=64, help="requests per load level")
+    parser.add_argument("--lengths", default="lognormal:256:0.6",
+                        help='prompt length distribution, e.g. "fixed:256" or "replay:lengths.txt" (see prompts.py)')
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--ctx", type=int, default=8192)
+    parser.add_argument("--slo-ttft-ms", type=float, default=1000.0)
+    parser.add_argument("--slo-tpot-ms", type=float, default=200.0)
+    parser.add_argument("--report", default=REPORT_PATH)
+    parser.add_argument("--no-report", action="store_true", help="print only, do not append to report.csv")
+    args = parser.parse_args()
+
+    slo = SLO(args.slo_ttft_ms, args.slo_tpot_ms)
+    lengths = LengthDistribution(args.lengths, max_len=args.ctx // 2)
+    levels = args.rate or args.concurrency
+    if args.url:
+        tokenizer = get_model(args.model, n_ctx=512, n_threads=1, vocab_only=True)
+        target = HttpTarget(args.url, tokenizer)
+    else:
+        engine = BatchEngine(args.model, n_ctx=args.ctx, n_threads=args.threads,
+                             n_seq_max=max(levels) if not args.rate else 32)
+        tokenizer = engine.llm
+        target = InProcessTarget(engine)
+
+    print(f"=== LOAD TEST: {MODEL_REGISTRY[args.model]['name']} ({'HTTP' if args.url else 'in-process'}) ===")
+    table = []
+    for level in levels:
+        if args.rate:
+            summary = run_load(target, tokenizer, lengths, args.requests, args.max_tokens, rate=level, slo=slo)
+        else:
+            summary = run_load(target, tokenizer, lengths, args.requests, args.max_tokens, concurrency=int(level), slo=slo)
+        table.append([level, summary["throughput_tps"], summary["goodput_rps"], summary["slo_attainment"],
+                      summary["ttft_p50_ms"], summary["ttft_p95_ms"], summary["ttft_p99_ms"],
+                      summary["e2e_p50_ms"], summary["e2e_p95_ms"], summary["e2e_p99_ms"]])
+        if not args.no_report:
+            load = {"rate": level} if args.rate else {"concurrency": int(level)}
+            append_row(report_row(args.model, summary, lengths, args.max_tokens, args.threads, args.ctx, **load),
+                       args.report)
+
+    print(tabulate(table, headers=["Rate" if args.rate else "Users", "Tok/s", "Goodput (req/s)", "SLO met",
+                                   "TTFT p50", "TTFT p95", "TTFT p99", "E2E p50", "E2E p95", "E2E p99"],
+                   tablefmt="github"))
+    if args.url:
+        get_pool().release(tokenizer)
+    else:
+        engine.close()
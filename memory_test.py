@@ -1,22 +1,15 @@
-import os
-import psutil
-from llama_cpp import Llama
-
-from models_config import get_model_path
-
-
-def measure_static_footprint(model_key: str, n_threads: int = 4, n_ctx: int = 4096) -> float:
+def measure_static_footprint(model_key: str, n_threads: int = 4, n_ctx: int = 4096,
+                             load_strategy: str = None) -> float:
     """
     Measure static RAM cost (in GB) to load the model into memory.
 
-    This is load-time memory, no tokens generated.
+    This is load-time memory, no tokens generated. The instance stays in the
+    shared model pool (released, so evictable), so a later get() with the
+    same config reuses it.
+    With lazy mmap loading (the default) only pages touched so far count.
     """
-    proc = psutil.Process(os.getpid())
-    before = proc.memory_info().rss
-
-    path = get_model_path(model_key)
-    _ = Llama(model_path=path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+    from model_pool import get_pool
 
-    after = proc.memory_info().rss
-    delta_gb = (after - before) / (1024 ** 3)
-    return round(delta_gb, 2)
+    pool = get_pool()
+    with pool.lease(model_key, n_ctx=n_ctx, n_threads=n_threads, load_strategy=load_strategy):
+        return pool.footprint(model_key, n_ctx=n_ctx, n_threads=n_threads, load_strategy=load_strategy)
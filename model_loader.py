@@ -0,0 +1,257 @@
+import argparse
+import functools
+import mmap
+import os
+import resource
+import time
+
+import psutil
+from llama_cpp import Llama
+
+from batch_tuner import tuned_batch_params
+from models_config import MODEL_REGISTRY, get_model_path
+
+# Default strategy override, e.g. EDGE_LOAD_STRATEGY=prefetch
+LOAD_STRATEGY_ENV = "EDGE_LOAD_STRATEGY"
+
+# Llama() flags per strategy; "prefetch" also warms the page cache first
+LOAD_STRATEGIES = {
+    "mmap": {"use_mmap": True, "use_mlock": False},      # lazy: pages fault in on first use
+    "prefetch": {"use_mmap": True, "use_mlock": False},  # mmap + madvise(WILLNEED) readahead
+    "read": {"use_mmap": False, "use_mlock": False},     # full read into anonymous memory
+    "mlock": {"use_mmap": True, "use_mlock": True},      # mmap, then pin every page in RAM
+}
+
+GB = 1024 ** 3
+
+# n_threads / n_threads_batch value meaning "pick from the measured scaling curves"
+AUTO_THREADS = "auto"
+FALLBACK_THREADS = 4
+
+
+def default_strategy() -> str:
+    return os.environ.get(LOAD_STRATEGY_ENV, "mmap")
+
+
+def prefetch_file(path: str) -> float:
+    """
+    Ask the kernel to read the whole file into the page cache
+    (madvise(MADV_WILLNEED) on a private mapping, else posix_fadvise).
+    Readahead is asynchronous; returns the seconds spent issuing it.
+    """
+    t0 = time.perf_counter()
+    with open(path, "rb") as f:
+        if hasattr(mmap, "MADV_WILLNEED"):
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                m.madvise(mmap.MADV_WILLNEED)
+        elif hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+    return time.perf_counter() - t0
+
+
+def drop_file_cache(path: str) -> bool:
+    """
+    Evict the file's clean pages from the page cache for a cold-cache load.
+    Pages still mapped by a live process stay resident.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    with open(path, "rb") as f:
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    return True
+
+
+def mlock_limit_gb() -> float:
+    """RLIMIT_MEMLOCK soft limit in GB (inf when unlimited)."""
+    soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+    return float("inf") if soft == resource.RLIM_INFINITY else soft / GB
+
+
+def mapped_vs_resident(path: str, pid="self") -> tuple:
+    """(mapped GB, resident GB) of the file's mappings, from /proc/<pid>/smaps."""
+    real = os.path.realpath(path)
+    mapped = resident = 0
+    current = False
+    try:
+        with open(f"/proc/{pid}/smaps") as f:
+            for line in f:
+                first = line.split(None, 1)[0]
+                if "-" in first and not first.endswith(":"):
+                    current = line.rstrip().endswith(real)
+                elif current and first == "Size:":
+                    mapped += int(line.split()[1])
+                elif current and first == "Rss:":
+                    resident += int(line.split()[1])
+    except OSError:
+        return 0.0, 0.0
+    return mapped * 1024 / GB, resident * 1024 / GB
+
+
+def thread_count_arg(value: str):
+    """argparse type for thread counts: an integer or "auto"."""
+    return value if value == AUTO_THREADS else int(value)
+
+
+@functools.lru_cache(maxsize=4)
+def _report_picks(path: str, mtime: float) -> dict:
+    from analysis import load_results, pick_threads
+
+    picks = pick_threads(load_results(path))
+    return {name: {k: int(v) for k, v in row.items() if v == v} for name, row in picks.iterrows()}
+
+
+def _report_threads(model_name: str) -> dict:
+    from results_store import REPORT_PATH
+
+    if not os.path.exists(REPORT_PATH):
+        return {}
+    return _report_picks(REPORT_PATH, os.path.getmtime(REPORT_PATH)).get(model_name, {})
+
+
+def resolve_threads(model_key: str, n_threads=4, n_threads_batch=None) -> tuple:
+    """
+    (n_threads, n_threads_batch) with "auto" values filled in: the decode
+    and prefill knees from report.csv, else the batch_tuner optimum for
+    this host, else 4. n_threads_batch=None means "same as n_threads".
+    """
+    if AUTO_THREADS not in (n_threads, n_threads_batch):
+        return n_threads, n_threads_batch
+    from batch_tuner import lookup
+
+    picked = _report_threads(MODEL_REGISTRY[model_key]["name"])
+    tuned = lookup(model_key)
+    if n_threads == AUTO_THREADS:
+        n_threads = picked.get("n_threads") or tuned.get("decode_threads") or FALLBACK_THREADS
+    if n_threads_batch == AUTO_THREADS:
+        n_threads_batch = picked.get("n_threads_batch") or tuned.get("prefill_threads") or n_threads
+    return n_threads, n_threads_batch
+
+
+def load_model(model_key: str, strategy: str = None, n_ctx: int = 4096, n_threads=4, n_threads_batch=None,
+               **kwargs):
+    """
+    Construct a Llama for model_key with a load strategy.
+
+    Returns (llm, stats) where stats has strategy, load_time_s,
+    prefetch_s, rss_delta_gb, mapped_gb and resident_gb (file-backed
+    pages of the mapping actually in RAM), plus n_batch/n_ubatch.
+
+    Unless n_batch/n_ubatch are given, the batch_tuner optimum for this
+    model and host is applied (EDGE_AUTOTUNE=0 disables it).
+
+    n_threads drives decode and n_threads_batch prompt processing
+    (default: n_threads); either may be "auto" (see resolve_threads).
+    """
+    strategy = strategy or default_strategy()
+    if strategy not in LOAD_STRATEGIES:
+        raise ValueError(f"unknown load strategy {strategy!r}; choose from {', '.join(LOAD_STRATEGIES)}")
+    path = get_model_path(model_key)
+    if strategy == "mlock" and mlock_limit_gb() < MODEL_REGISTRY[model_key].get("filesize", 0):
+        print(f"⚠️ RLIMIT_MEMLOCK ({mlock_limit_gb():.2f} GB) is below the model size; "
+              "llama.cpp will warn and leave pages unlocked (raise it with ulimit -l).")
+
+    n_threads, n_threads_batch = resolve_threads(model_key, n_threads, n_threads_batch)
+    if "n_batch" not in kwargs and "n_ubatch" not in kwargs:
+        kwargs.update(tuned_batch_params(model_key))
+
+    proc = psutil.Process(os.getpid())
+    before = proc.memory_info().rss
+    t0 = time.perf_counter()
+    prefetch_s = prefetch_file(path) if strategy == "prefetch" else 0.0
+    llm = Llama(
+        model_path=path,
+        n_ctx=n_ctx,
+        n_threads=n_threads,
+        n_threads_batch=n_threads_batch or n_threads,
+        verbose=kwargs.pop("verbose", False),
+        **LOAD_STRATEGIES[strategy],
+        **kwargs,
+    )
+    load_time = time.perf_counter() - t0
+    mapped, resident = mapped_vs_resident(path)
+    stats = {
+        "strategy": strategy,
+        "load_time_s": round(load_time, 3),
+        "prefetch_s": round(prefetch_s, 3),
+        "rss_delta_gb": round(max(proc.memory_info().rss - before, 0) / GB, 3),
+        "mapped_gb": round(mapped, 3),
+        "resident_gb": round(resident, 3),
+        "n_threads": n_threads,
+        "n_threads_batch": n_threads_batch or n_threads,
+        "n_batch": llm.n_batch,
+        "n_ubatch": getattr(llm.context_params, "n_ubatch", None),
+    }
+    return llm, stats
+
+
+def profile_load(model_key: str, strategy: str, cold: bool = True, n_ctx: int = 2048, n_threads: int = 4) -> dict:
+    """
+    One load + first token under a strategy; meant to run in a fresh
+    worker process. cold=True drops the file from the page cache first.
+
+    Approach:
+      - Drop (cold) or keep (warm) the GGUF's page-cache pages
+      - Time the load, then the first token of a short prompt
+      - Read mapped vs resident size of the mapping after that token,
+        since lazy mmap only faults pages in once they are used
+    """
+    from benchmark_suite import _run_single_throughput
+
+    path = get_model_path(model_key)
+    dropped = drop_file_cache(path) if cold else False
+    llm, stats = load_model(model_key, strategy, n_ctx=n_ctx, n_threads=n_threads)
+    first = _run_single_throughput(llm, max_tokens=1, prompt="Hello")
+    mapped, resident = mapped_vs_resident(path)
+    stats.update({
+        "cache": "cold" if cold else "warm",
+        "cache_dropped": dropped,
+        "ttft_after_load_ms": first["ttft_ms"],
+        "startup_s": round(stats["load_time_s"] + first["ttft_ms"] / 1000, 3),
+        "mapped_gb": round(mapped, 3),
+        "resident_gb": round(resident, 3),
+        "rss_gb": round(psutil.Process(os.getpid()).memory_info().rss / GB, 3),
+    })
+    return stats
+
+
+def profile_strategies(model_key: str, strategies=None, n_ctx: int = 2048, n_threads: int = 4,
+                       timeout_s: int = 600) -> list:
+    """Cold then warm load of every strategy, each in its own worker process."""
+    from worker_pool import run_isolated_many
+
+    strategies = strategies or list(LOAD_STRATEGIES)
+    jobs = []
+    for strategy in strategies:
+        for cold in (True, False):
+            jobs.append(((strategy, cold), profile_load, (model_key, strategy, cold, n_ctx, n_threads), None))
+
+    rows = []
+    for (strategy, cold), outcome in run_isolated_many(jobs, max_workers=1, timeout_s=timeout_s):
+        if outcome["status"] == "success":
+            row = outcome["result"]
+            row["peak_rss_gb"] = outcome["peak_rss_gb"]
+        else:
+            row = {"strategy": strategy, "cache": "cold" if cold else "warm", "error": outcome["status"]}
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    from tabulate import tabulate
+
+    parser = argparse.ArgumentParser(description="Compare model load strategies (cold vs warm page cache).")
+    parser.add_argument("model", help="registry key")
+    parser.add_argument("--strategies", nargs="+", default=list(LOAD_STRATEGIES), choices=list(LOAD_STRATEGIES))
+    parser.add_argument("--ctx", type=int, default=2048)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.model not in MODEL_REGISTRY:
+        raise SystemExit(f"Error: Model '{args.model}' not found.")
+
+    print(f"=== Load strategies: {MODEL_REGISTRY[args.model]['name']} ===")
+    results = profile_strategies(args.model, args.strategies, args.ctx, args.threads)
+    columns = ["strategy", "cache", "load_time_s", "prefetch_s", "ttft_after_load_ms", "startup_s",
+               "mapped_gb", "resident_gb", "peak_rss_gb"]
+    print(tabulate([[r.get(c, "") for c in columns + ["error"]] for r in results],
+                   headers=columns + ["error"], tablefmt="github"))
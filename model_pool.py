@@ -0,0 +1,243 @@
+import gc
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import psutil
+import llama_cpp
+from llama_cpp import Llama
+
+from models_config import MODEL_REGISTRY
+from cpu_topology import AffinityPlan, pinned, plan_affinity
+from model_loader import default_strategy, load_model, resolve_threads
+
+# Budget override, e.g. EDGE_MODEL_POOL_GB=6 on a 8 GB board
+POOL_BUDGET_ENV = "EDGE_MODEL_POOL_GB"
+DEFAULT_BUDGET_FRACTION = 0.6
+
+
+def _rss_gb() -> float:
+    return psutil.Process(os.getpid()).memory_info().rss / (1024 ** 3)
+
+
+def estimate_model_gb(model_key: str) -> float:
+    """Resident size estimate for a model, seeded from the registry filesize."""
+    return float(MODEL_REGISTRY[model_key].get("filesize", 0.0))
+
+
+def budget_from_registry(model_keys, headroom: float = 1.2) -> float:
+    """Budget (GB) large enough to keep all given models resident at once."""
+    return round(sum(estimate_model_gb(k) for k in model_keys) * headroom, 2)
+
+
+def default_budget_gb() -> float:
+    env = os.environ.get(POOL_BUDGET_ENV)
+    if env:
+        return float(env)
+    return psutil.virtual_memory().total / (1024 ** 3) * DEFAULT_BUDGET_FRACTION
+
+
+class _PoolEntry:
+    __slots__ = ("llm", "size_gb", "load_rss_gb", "load_time_s", "load_stats", "users")
+
+    def __init__(self, llm: Llama, size_gb: float, load_rss_gb: float, load_time_s: float, load_stats: dict):
+        self.llm = llm
+        self.size_gb = size_gb
+        self.load_rss_gb = load_rss_gb
+        self.load_time_s = load_time_s
+        self.load_stats = load_stats
+        # Outstanding get()/lease() holders; only idle entries are closed
+        self.users = 0
+
+
+class ModelPool:
+    """
+    Shared cache of loaded Llama instances with LRU eviction.
+
+    Instances are keyed by (model key, n_ctx, n_threads, extra kwargs);
+    "auto" thread counts are resolved before keying.
+    Each entry is charged max(registry filesize, measured RSS delta at load)
+    against the budget; least recently used entries are closed until a new
+    model fits.
+
+    Every get() counts as a user of the instance until release(llm) (or use
+    the lease() context manager). Entries with users are never closed, so a
+    caller's Llama cannot be freed under it; when only in-use entries are
+    left the pool loads anyway and warns that it is over budget.
+    """
+
+    def __init__(self, budget_gb: float = None):
+        self.budget_gb = budget_gb if budget_gb is not None else default_budget_gb()
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(model_key: str, n_ctx: int, n_threads, kwargs: dict) -> tuple:
+        kwargs = dict(kwargs)
+        n_threads, n_threads_batch = resolve_threads(model_key, n_threads, kwargs.pop("n_threads_batch", None))
+        if n_threads_batch not in (None, n_threads):
+            kwargs["n_threads_batch"] = n_threads_batch
+        kwargs["load_strategy"] = kwargs.get("load_strategy") or default_strategy()
+        plan = kwargs.pop("affinity", None)
+        if isinstance(plan, AffinityPlan):
+            kwargs["affinity"] = tuple(plan.cpus)
+        elif plan is not None:
+            kwargs["affinity"] = plan
+        return (model_key, n_ctx, n_threads, tuple(sorted(kwargs.items())))
+
+    def resident_gb(self) -> float:
+        with self._lock:
+            return sum(e.size_gb for e in self._entries.values())
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def get(self, model_key: str, n_ctx: int = 4096, n_threads=4, **kwargs) -> Llama:
+        """
+        Return a pooled instance, loading (and evicting) if necessary. The
+        caller holds it until release(llm); unreleased instances stay
+        resident for the life of the process.
+
+        affinity= (an AffinityPlan or strategy name) pins the process only
+        while a model is loaded, so weights are first touched on the plan's
+        NUMA node; the previous masks are restored afterwards and cache hits
+        do not re-pin. Compute threads are placed by whoever runs the model
+        (cpu_topology.pinned() around the runs, as benchmark_suite does).
+        load_strategy= picks a model_loader strategy (mmap, prefetch, read,
+        mlock); default from EDGE_LOAD_STRATEGY, else mmap.
+        n_threads_batch= sets prompt-processing threads separately; the
+        affinity plan then covers max(n_threads, n_threads_batch) CPUs.
+        """
+        n_threads, n_threads_batch = resolve_threads(model_key, n_threads, kwargs.pop("n_threads_batch", None))
+        if n_threads_batch not in (None, n_threads):
+            kwargs["n_threads_batch"] = n_threads_batch
+        key = self._key(model_key, n_ctx, n_threads, kwargs)
+        plan = kwargs.pop("affinity", None)
+        strategy = kwargs.pop("load_strategy", None)
+        if isinstance(plan, str):
+            plan = plan_affinity(max(n_threads, n_threads_batch or 0), plan)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.users += 1
+                return entry.llm
+
+            self._make_room(estimate_model_gb(model_key))
+
+            gc.collect()
+            before = _rss_gb()
+            with pinned(plan):
+                llm, stats = load_model(model_key, strategy, n_ctx=n_ctx, n_threads=n_threads, **kwargs)
+            load_rss = max(_rss_gb() - before, 0.0)
+
+            size = max(estimate_model_gb(model_key), load_rss)
+            entry = _PoolEntry(llm, size, load_rss, stats["load_time_s"], stats)
+            entry.users = 1
+            self._entries[key] = entry
+            return llm
+
+    def release(self, llm: Llama):
+        """Drop one hold taken by get(); the instance stays pooled and becomes evictable when idle."""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.llm is llm and entry.users > 0:
+                    entry.users -= 1
+                    return
+
+    @contextmanager
+    def lease(self, model_key: str, n_ctx: int = 4096, n_threads=4, **kwargs):
+        """get() for the duration of a with-block, released on exit."""
+        llm = self.get(model_key, n_ctx=n_ctx, n_threads=n_threads, **kwargs)
+        try:
+            yield llm
+        finally:
+            self.release(llm)
+
+    def footprint(self, model_key: str, n_ctx: int = 4096, n_threads=4, **kwargs) -> float:
+        """RSS delta (GB) observed when the pooled instance was loaded."""
+        key = self._key(model_key, n_ctx, n_threads, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            return round(entry.load_rss_gb, 2) if entry else 0.0
+
+    def load_time(self, model_key: str, n_ctx: int = 4096, n_threads=4, **kwargs) -> float:
+        """Wall time (s) the pooled instance took to load."""
+        key = self._key(model_key, n_ctx, n_threads, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            return round(entry.load_time_s, 2) if entry else 0.0
+
+    def load_stats(self, model_key: str, n_ctx: int = 4096, n_threads=4, **kwargs) -> dict:
+        """model_loader stats (strategy, load time, mapped/resident GB) of the pooled instance."""
+        key = self._key(model_key, n_ctx, n_threads, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry.load_stats) if entry else {}
+
+    def evict(self, model_key: str = None) -> int:
+        """Evict all idle instances of model_key (or everything). Returns count."""
+        with self._lock:
+            matches = [k for k in self._entries if model_key is None or k[0] == model_key]
+            victims = [k for k in matches if not self._entries[k].users]
+            for k in victims:
+                self._close(self._entries.pop(k))
+            if victims:
+                gc.collect()
+            if len(victims) < len(matches):
+                print(f"⚠️ Pool kept {len(matches) - len(victims)} in-use instance(s) of {model_key or 'all models'}")
+            return len(victims)
+
+    def clear(self):
+        self.evict()
+
+    def _make_room(self, incoming_gb: float):
+        for key in list(self._entries):
+            if self.resident_gb() + incoming_gb <= self.budget_gb:
+                return
+            if not self._entries[key].users:
+                self._close(self._entries.pop(key))
+                gc.collect()
+        if self._entries and self.resident_gb() + incoming_gb > self.budget_gb:
+            print(f"⚠️ Model pool over budget: {self.resident_gb() + incoming_gb:.1f} GB needed, "
+                  f"{self.budget_gb:.1f} GB budget (remaining instances are in use)")
+
+    @staticmethod
+    def _close(entry: _PoolEntry):
+        close = getattr(entry.llm, "close", None)
+        if close is not None:
+            close()
+        entry.llm = None
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ModelPool:
+    """Process-wide model pool (created on first use)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ModelPool()
+        return _POOL
+
+
+def get_model(model_key: str, n_ctx: int = 4096, n_threads=4, **kwargs) -> Llama:
+    """Shortcut for get_pool().get(...); release with get_pool().release(llm)."""
+    return get_pool().get(model_key, n_ctx=n_ctx, n_threads=n_threads, **kwargs)
+
+
+def set_threads(llm: Llama, n_threads: int, n_threads_batch: int = None):
+    """
+    Change an already-loaded instance's thread counts without reloading it
+    (n_threads for decode, n_threads_batch for prompt processing).
+    """
+    n_threads_batch = n_threads_batch or n_threads
+    llama_cpp.llama_set_n_threads(llm.ctx, n_threads, n_threads_batch)
+    llm.n_threads = n_threads
+    llm.n_threads_batch = n_threads_batch
+    llm.context_params.n_threads = n_threads
+    llm.context_params.n_threads_batch = n_threads_batch
@@ -1,8 +1,16 @@
 import os
 
-MODELS_DIR = "/mnt/models"
+# Override with EDGE_MODELS_DIR, e.g. a directory of small local fixtures
+MODELS_DIR = os.environ.get("EDGE_MODELS_DIR", "/mnt/models")
+# Cached listing of model directories, reused while a directory's mtime is
+# unchanged (downloads finish with a rename, which bumps it)
+INVENTORY_PATH_ENV = "EDGE_INVENTORY_PATH"
+DEFAULT_INVENTORY_PATH = "model_inventory.json"
 
-# Single source of truth for models and their filenames
+# Single source of truth for models and their filenames.
+# Optional per-entry keys "size_bytes" and "sha256" are verified by
+# download_manager when present. Quant variants of an entry are added
+# on demand by register_quant_variants() with keys like "falcon3_1b@Q8_0".
 MODEL_REGISTRY = {
     # Tiny Models (< 1B)
     "tinyllama_15m": {
@@ -360,7 +368,10 @@ MODEL_REGISTRY = {
         "filename": "open-llama-7b-open-instruct.Q4_K_M.gguf",
         "url": "https://huggingface.co/mradermacher/open-llama-7b-open-instruct-GGUF/resolve/main/open-llama-7b-open-instruct.Q4_K_M.gguf?download=true",
         "prompt_template": "{prompt}",
-        "size": 7.0,    "ministral_3b": {
+        "size": 7.0,
+        "filesize": 3.80
+    },
+    "ministral_3b": {
         "name": "Ministral (3B)",
         "filename": "Ministral-3-3B-Instruct-2512-Q4_K_M.gguf",
         "url": "https://huggingface.co/mistralai/Ministral-3-3B-Instruct-2512-GGUF/resolve/main/Ministral-3-3B-Instruct-2512-Q4_K_M.gguf?download=true",
@@ -391,8 +402,6 @@ MODEL_REGISTRY = {
         "prompt_template": "{prompt}",
         "size": 6.0,
         "filesize": 4.63
-    }
-        "filesize": 3.80
     },
     "olmo_3_7b": {
         "name": "OLMo-3 (7B)",
@@ -586,11 +595,186 @@ def get_model_path(key: str) -> str:
     entry = MODEL_REGISTRY[key]
     return os.path.join(MODELS_DIR, entry["filename"])
 
+def inventory_path() -> str:
+    return os.environ.get(INVENTORY_PATH_ENV, DEFAULT_INVENTORY_PATH)
+
+
+_listings = {}  # directory -> (mtime_ns, set of *.gguf names)
+
+
+def _gguf_files(directory: str) -> set:
+    """
+    Names of the *.gguf files in directory: one stat while its mtime matches
+    the in-process or on-disk inventory, a directory scan otherwise.
+    """
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        return set()
+    cached = _listings.get(directory)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    import json
+
+    try:
+        with open(inventory_path()) as f:
+            inventory = json.load(f)
+    except (OSError, ValueError):
+        inventory = {}
+    entry = inventory.get(directory)
+    if entry and entry["mtime_ns"] == mtime:
+        files = set(entry["files"])
+    else:
+        files = {e.name for e in os.scandir(directory) if e.name.endswith(".gguf") and e.is_file()}
+        inventory[directory] = {"mtime_ns": mtime, "files": sorted(files)}
+        try:
+            tmp = inventory_path() + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(inventory, f, indent=1)
+            os.replace(tmp, inventory_path())
+        except OSError:
+            pass  # read-only working dir: the in-process copy still helps
+    _listings[directory] = (mtime, files)
+    return files
+
+
 def list_available_models():
     """Return list of keys for models that actually exist on disk."""
     available = []
     for key, meta in MODEL_REGISTRY.items():
-        path = os.path.join(MODELS_DIR, meta["filename"])
-        if os.path.exists(path):
+        directory, filename = os.path.split(os.path.join(MODELS_DIR, meta["filename"]))
+        if filename in _gguf_files(directory):
             available.append(key)
     return available
+
+
+# Approximate bits per weight of llama.cpp quant types (scales "filesize")
+QUANT_BITS = {
+    "Q2_K": 2.63,
+    "Q3_K_M": 3.91,
+    "Q4_K_M": 4.85,
+    "Q5_K_M": 5.69,
+    "Q6_K": 6.56,
+    "Q8_0": 8.50,
+    "F16": 16.0,
+}
+DEFAULT_QUANTS = ("Q2_K", "Q3_K_M", "Q4_K_M", "Q5_K_M", "Q6_K", "Q8_0")
+VARIANT_SEP = "@"
+
+_QUANT_RE = None
+
+
+def _quant_re():
+    # Compiled on first use: `re` is not needed to list or look up models
+    global _QUANT_RE
+    if _QUANT_RE is None:
+        import re
+
+        _QUANT_RE = re.compile(r"[.\-_]((?:I?Q\d[A-Z0-9_]*?)|F16|BF16|F32)\.gguf", re.IGNORECASE)
+    return _QUANT_RE
+
+
+def quant_of(filename: str) -> str:
+    """Quant type named in a GGUF filename (e.g. "Q4_K_M"), or None."""
+    match = _quant_re().search(os.path.basename(filename))
+    return match.group(1).upper() if match else None
+
+
+def family_of(key: str) -> str:
+    """Base registry key of a variant key ("falcon3_1b@Q8_0" -> "falcon3_1b")."""
+    return MODEL_REGISTRY[key].get("family", key.split(VARIANT_SEP, 1)[0])
+
+
+def make_variant(family: str, quant: str) -> dict:
+    """
+    Registry entry for another quant of `family`: the quant tag in the
+    filename and URL is swapped (keeping its case) and filesize is scaled
+    by bits per weight. Checksums are not carried over.
+    """
+    import re
+
+    base = MODEL_REGISTRY[family]
+    base_quant = quant_of(base["filename"])
+    if base_quant is None:
+        raise ValueError(f"cannot tell the quant of {base['filename']}")
+    tag = re.compile(re.escape(base_quant), re.IGNORECASE)
+
+    def swap(text: str) -> str:
+        return tag.sub(lambda m: quant if m.group(0).isupper() else quant.lower(), text)
+
+    entry = {k: v for k, v in base.items() if k not in ("size_bytes", "sha256")}
+    entry.update({
+        "name": f"{base['name']} {quant}",
+        "filename": swap(base["filename"]),
+        "url": swap(base["url"]),
+        "family": family,
+        "quant": quant,
+    })
+    if base_quant in QUANT_BITS and quant in QUANT_BITS:
+        entry["filesize"] = round(base.get("filesize", 0) * QUANT_BITS[quant] / QUANT_BITS[base_quant], 2)
+    return entry
+
+
+def register_quant_variants(families=None, quants=DEFAULT_QUANTS) -> list:
+    """
+    Add quant variants of the given base keys (default: all) to
+    MODEL_REGISTRY and return the variant keys. The base entry stands in
+    for its own quant, so "falcon3_1b" is returned rather than
+    "falcon3_1b@Q4_K_M". Families whose filename names no quant (e.g.
+    "Q4_K_M-00001-of-00001.gguf") are skipped with a warning.
+    """
+    families = families or [k for k, v in MODEL_REGISTRY.items() if "family" not in v]
+    keys = []
+    for family in families:
+        base_quant = quant_of(MODEL_REGISTRY[family]["filename"])
+        if base_quant is None:
+            print(f"⚠️ Skipping {family}: cannot tell the quant of {MODEL_REGISTRY[family]['filename']}")
+            continue
+        for quant in quants:
+            if quant == base_quant:
+                keys.append(family)
+                continue
+            key = f"{family}{VARIANT_SEP}{quant}"
+            if key not in MODEL_REGISTRY:
+                MODEL_REGISTRY[key] = make_variant(family, quant)
+            keys.append(key)
+    return keys
+
+
+def register_local_variants(directory: str) -> list:
+    """
+    Register every *.gguf in `directory` as a quant variant, e.g. small
+    fixtures for offline runs. Files whose name (minus the quant tag)
+    matches a registry entry join that family; others become a family of
+    their own. Entries use absolute paths, so no download is involved.
+    """
+    import glob
+    import re
+
+    stems = {}
+    for key, meta in MODEL_REGISTRY.items():
+        if "family" not in meta:
+            stems[_quant_re().sub("", meta["filename"]).lower()] = key
+
+    keys = []
+    for path in sorted(glob.glob(os.path.join(os.path.abspath(directory), "*.gguf"))):
+        filename = os.path.basename(path)
+        quant = quant_of(filename) or "F32"
+        stem = _quant_re().sub("", filename).lower()
+        family = stems.get(stem) or re.sub(r"[^a-z0-9]+", "_", stem.replace(".gguf", "")).strip("_")
+        filesize = round(os.path.getsize(path) / (1024 ** 3), 6)
+        base = MODEL_REGISTRY.get(family, {})
+        key = f"{family}{VARIANT_SEP}{quant}"
+        MODEL_REGISTRY[key] = {
+            "name": f"{base.get('name', family)} {quant}",
+            "filename": path,
+            "url": "",
+            "prompt_template": base.get("prompt_template", "{prompt}"),
+            "size": base.get("size") or round(filesize * 8 / QUANT_BITS.get(quant, 16.0), 6),
+            "filesize": filesize,
+            "family": family,
+            "quant": quant,
+        }
+        keys.append(key)
+    return keys
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from llama_cpp import BaseLlamaCache, Llama
+
+# Default location for persisted prefix states (unset = RAM only)
+PREFIX_CACHE_DIR_ENV = "EDGE_PREFIX_CACHE_DIR"
+
+
+def _token_digest(tokens) -> str:
+    return hashlib.sha1(",".join(map(str, tokens)).encode()).hexdigest()
+
+
+class PrefixStateCache(BaseLlamaCache):
+    """
+    Two-tier (RAM + optional disk) store of llama states keyed by token prefix.
+
+    Plugs into Llama.set_cache(): after every completion llama saves its state
+    under prompt+completion tokens, and before the next one it restores the
+    state sharing the longest token prefix with the new prompt, so only the
+    new suffix is prefilled.
+
+    RAM entries are LRU-evicted above capacity_bytes. With disk_dir set,
+    every snapshot is also pickled to disk (bounded by disk_capacity_bytes)
+    so prefixes survive process restarts.
+    """
+
+    def __init__(self, capacity_bytes: int = (1 << 30), disk_dir: str = None,
+                 disk_capacity_bytes: int = (8 << 30)):
+        super().__init__(capacity_bytes)
+        self.disk_dir = disk_dir
+        self.disk_capacity_bytes = disk_capacity_bytes
+        self._ram = OrderedDict()
+        self._disk = {}  # tokens tuple -> filename
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_index()
+
+    # --- disk index ---
+
+    def _index_path(self) -> str:
+        return os.path.join(self.disk_dir, "index.json")
+
+    def _load_index(self):
+        path = self._index_path()
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for fname, tokens in json.load(f).items():
+                if os.path.exists(os.path.join(self.disk_dir, fname)):
+                    self._disk[tuple(tokens)] = fname
+
+    def _save_index(self):
+        tmp = self._index_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({fname: list(tokens) for tokens, fname in self._disk.items()}, f)
+        os.replace(tmp, self._index_path())
+
+    def _disk_size(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.disk_dir, f)) for f in self._disk.values())
+
+    def _write_disk(self, key: tuple, state):
+        fname = _token_digest(key) + ".state"
+        path = os.path.join(self.disk_dir, fname)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        self._disk[key] = fname
+        # Oldest files go first when over the disk budget
+        by_age = sorted(self._disk.items(), key=lambda kv: os.path.getmtime(os.path.join(self.disk_dir, kv[1])))
+        while by_age and self._disk_size() > self.disk_capacity_bytes:
+            old_key, old_fname = by_age.pop(0)
+            if old_key == key:
+                continue
+            os.remove(os.path.join(self.disk_dir, old_fname))
+            del self._disk[old_key]
+        self._save_index()
+
+    # --- BaseLlamaCache interface ---
+
+    @property
+    def cache_size(self) -> int:
+        return sum(state.llama_state_size for state in self._ram.values())
+
+    def _find_longest_prefix_key(self, key):
+        best_key, best_len = None, 0
+        for k in list(self._ram.keys()) + list(self._disk.keys()):
+            n = Llama.longest_token_prefix(k, key)
+            if n > best_len:
+                best_key, best_len = k, n
+        return best_key
+
+    def __getitem__(self, key):
+        key = tuple(key)
+        with self._lock:
+            best = self._find_longest_prefix_key(key)
+            if best is None:
+                self.misses += 1
+                raise KeyError("no cached prefix")
+            self.hits += 1
+            if best in self._ram:
+                self._ram.move_to_end(best)
+                return self._ram[best]
+            with open(os.path.join(self.disk_dir, self._disk[best]), "rb") as f:
+                state = pickle.load(f)
+            self._put_ram(best, state)
+            return state
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return self._find_longest_prefix_key(tuple(key)) is not None
+
+    def __setitem__(self, key, value):
+        key = tuple(key)
+        with self._lock:
+            self._put_ram(key, value)
+            if self.disk_dir:
+                self._write_disk(key, value)
+
+    def _put_ram(self, key: tuple, state):
+        self._ram.pop(key, None)
+        self._ram[key] = state
+        while len(self._ram) > 1 and self.cache_size > self.capacity_bytes:
+            self._ram.popitem(last=False)
+
+
+def cache_dir_for(llm: Llama, model_key: str, root: str) -> str:
+    """Per-model/per-context subdirectory so states never load into another model."""
+    st = os.stat(llm.model_path)
+    fingerprint = f"{st.st_size:x}-{int(st.st_mtime):x}"
+    return os.path.join(root, f"{model_key}-ctx{llm.n_ctx()}-{fingerprint}")
+
+
+def attach_prefix_cache(llm: Llama, model_key: str, disk_dir: str = None,
+                        ram_gb: float = 1.0) -> PrefixStateCache:
+    """
+    Attach a PrefixStateCache to llm and return it.
+
+    disk_dir defaults to $EDGE_PREFIX_CACHE_DIR; pass "" to keep it RAM-only.
+    """
+    if disk_dir is None:
+        disk_dir = os.environ.get(PREFIX_CACHE_DIR_ENV) or ""
+    cache = PrefixStateCache(
+        capacity_bytes=int(ram_gb * (1 << 30)),
+        disk_dir=cache_dir_for(llm, model_key, disk_dir) if disk_dir else None,
+    )
+    llm.set_cache(cache)
+    return cache
+
+
+@contextmanager
+def prefix_reuse(llm: Llama, model_key: str, enabled: bool, disk_dir: str = None):
+    """
+    Temporarily set llm's prefix cache for a benchmark.
+
+    enabled=False detaches any cache so every run pays the full prefill;
+    enabled=True attaches a fresh PrefixStateCache so a constant prompt is
+    prefilled once and restored on later runs. The previous cache is put
+    back on exit.
+    """
+    previous = llm.cache
+    try:
+        if enabled:
+            yield attach_prefix_cache(llm, model_key, disk_dir=disk_dir)
+        else:
+            llm.set_cache(None)
+            yield None
+    finally:
+        llm.set_cache(previous)
@@ -0,0 +1,243 @@
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import threading
+
+# Persist generated prompts across runs (unset = RAM only)
+PROMPT_CACHE_DIR_ENV = "EDGE_PROMPT_CACHE_DIR"
+
+FILLER_TEXT = (
+    "Edge devices run language models on a handful of CPU cores with limited "
+    "memory bandwidth, so every layer of the inference stack matters: how the "
+    "weights are quantized, how the key-value cache grows with the context, how "
+    "threads are scheduled across physical cores, and how prompts are batched "
+    "during prefill. "
+)
+
+# Short pieces tried, in order, to close the last few tokens of a gap
+PAD_PIECES = [" the", " a", ".", ",", " and", " of", " to", " in", "\n", " x", "-"]
+
+
+def _count(llm, text: str) -> int:
+    """Prompt tokens as llm(prompt) will see them (BOS included)."""
+    return len(llm.tokenize(text.encode("utf-8"), add_bos=True))
+
+
+def tokenizer_id(llm) -> str:
+    """
+    Fingerprint of a model's tokenizer: models sharing a vocabulary
+    (e.g. one family at several quants) share cached prompts.
+    """
+    probe = llm.tokenize(FILLER_TEXT.encode("utf-8"), add_bos=True)
+    digest = hashlib.sha1(f"{llm.n_vocab()}:{','.join(map(str, probe))}".encode())
+    return digest.hexdigest()[:16]
+
+
+class PromptCache:
+    """
+    Prompts keyed by (tokenizer id, N tokens, variant), in RAM and
+    optionally as one JSON file per tokenizer under disk_dir.
+    """
+
+    def __init__(self, disk_dir: str = None):
+        self.disk_dir = disk_dir
+        self._ram = {}
+        self._loaded = set()
+        self._lock = threading.Lock()
+
+    def _path(self, tok_id: str) -> str:
+        return os.path.join(self.disk_dir, f"prompts-{tok_id}.json")
+
+    def _load(self, tok_id: str):
+        if tok_id in self._loaded or not self.disk_dir:
+            return
+        self._loaded.add(tok_id)
+        try:
+            with open(self._path(tok_id)) as f:
+                for key, text in json.load(f).items():
+                    n, variant = key.split(":")
+                    self._ram[(tok_id, int(n), int(variant))] = text
+        except (OSError, ValueError):
+            pass
+
+    def get(self, tok_id: str, n_tokens: int, variant: int = 0) -> str:
+        with self._lock:
+            self._load(tok_id)
+            return self._ram.get((tok_id, n_tokens, variant))
+
+    def put(self, tok_id: str, n_tokens: int, variant: int, text: str):
+        with self._lock:
+            self._load(tok_id)
+            self._ram[(tok_id, n_tokens, variant)] = text
+            if not self.disk_dir:
+                return
+            os.makedirs(self.disk_dir, exist_ok=True)
+            entries = {f"{n}:{v}": t for (tid, n, v), t in self._ram.items() if tid == tok_id}
+            tmp = self._path(tok_id) + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self._path(tok_id))
+
+
+_CACHE = PromptCache(os.environ.get(PROMPT_CACHE_DIR_ENV))
+
+
+def _words(variant: int, min_words: int) -> list:
+    words = FILLER_TEXT.split(" ")
+    words = [w for w in words if w]
+    # Rotate the filler so variants do not share a token prefix
+    shift = (variant * 7) % len(words)
+    words = words[shift:] + words[:shift]
+    repeats = max(1, math.ceil(min_words / len(words)))
+    return (words * repeats)[:max(min_words, 1)]
+
+
+def exact_prompt(llm, n_tokens: int, variant: int = 0) -> str:
+    """
+    Text that tokenizes to exactly n_tokens (BOS included) under llm's
+    tokenizer.
+
+    Approach:
+      - Binary-search the longest run of filler words that fits in n_tokens
+        (token count is monotone in the number of whole words)
+      - Close the remaining gap one token at a time with short pad pieces,
+        keeping a piece only if it adds exactly one token
+    """
+    if n_tokens < 1:
+        raise ValueError("n_tokens must be >= 1")
+    tok_id = tokenizer_id(llm)
+    cached = _CACHE.get(tok_id, n_tokens, variant)
+    if cached is not None:
+        return cached
+
+    words = _words(variant, n_tokens + 16)
+    lo, hi = 0, len(words)
+    while _count(llm, " ".join(words[:hi])) <= n_tokens:  # more filler needed
+        words = words + _words(variant, len(words))
+        lo, hi = hi, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if _count(llm, " ".join(words[:mid])) <= n_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    text = " ".join(words[:lo])
+    count = _count(llm, text)
+
+    while count < n_tokens:
+        for piece in PAD_PIECES:
+            if _count(llm, text + piece) == count + 1:
+                text += piece
+                count += 1
+                break
+        else:
+            raise RuntimeError(f"could not pad prompt to exactly {n_tokens} tokens (stuck at {count})")
+
+    _CACHE.put(tok_id, n_tokens, variant, text)
+    return text
+
+
+def build_prompt(llm, input_target, variant: int = 0) -> str:
+    """Prompt for an input_tokens_target: "short" (the standard throughput prompt) or a token count."""
+    if input_target == "short":
+        from benchmark_suite import PROMPT_THROUGHPUT
+        return PROMPT_THROUGHPUT
+    return exact_prompt(llm, int(input_target), variant)
+
+
+def load_recorded_lengths(path: str) -> list:
+    """
+    Prompt lengths recorded from real traffic. Accepts a text file with one
+    integer per line, a CSV with a prompt_tokens / input_tokens /
+    input_tokens_actual column, or JSONL of OpenAI responses or records
+    carrying usage.prompt_tokens or prompt_tokens.
+    """
+    lengths = []
+    with open(path) as f:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(f)
+            column = next((c for c in ("prompt_tokens", "input_tokens", "input_tokens_actual")
+                           if c in (reader.fieldnames or [])), None)
+            if column is None:
+                raise ValueError(f"{path} has no prompt_tokens/input_tokens column")
+            lengths = [int(float(r[column])) for r in reader if r[column]]
+        elif path.endswith((".jsonl", ".json")):
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                n = (record.get("usage") or {}).get("prompt_tokens", record.get("prompt_tokens"))
+                if n is not None:
+                    lengths.append(int(n))
+        else:
+            lengths = [int(line) for line in f if line.strip()]
+    if not lengths:
+        raise ValueError(f"no prompt lengths in {path}")
+    return lengths
+
+
+class LengthDistribution:
+    """
+    Prompt-length sampler parsed from a spec string:
+      "fixed:256", "uniform:64:1024", "lognormal:<median>:<sigma>",
+      "replay:<file>" (recorded lengths in order, cycling),
+      "empirical:<file>" (recorded lengths sampled with replacement),
+      or a comma-separated list of lengths sampled uniformly ("128,512,2048").
+    """
+
+    def __init__(self, spec: str, seed: int = 0, max_len: int = 4096):
+        self.spec = spec
+        self.rng = random.Random(seed)
+        self.max_len = max_len
+        kind, _, rest = spec.partition(":")
+        args = rest.split(":") if rest else []
+        if kind == "fixed":
+            self._draw = lambda: int(args[0])
+        elif kind == "uniform":
+            lo, hi = int(args[0]), int(args[1])
+            self._draw = lambda: self.rng.randint(lo, hi)
+        elif kind == "lognormal":
+            mu, sigma = math.log(float(args[0])), float(args[1])
+            self._draw = lambda: int(self.rng.lognormvariate(mu, sigma))
+        elif kind == "replay":
+            recorded = itertools.cycle(load_recorded_lengths(rest))
+            self._draw = lambda: next(recorded)
+        elif kind == "empirical":
+            recorded = load_recorded_lengths(rest)
+            self._draw = lambda: self.rng.choice(recorded)
+        else:
+            choices = [int(x) for x in spec.split(",")]
+            self._draw = lambda: self.rng.choice(choices)
+
+    def sample(self) -> int:
+        return max(1, min(self._draw(), self.max_len))
+
+
+def generate_workload(llm, lengths: LengthDistribution, n_requests: int, distinct: bool = False) -> list:
+    """
+    Token-exact prompts for n_requests draws of `lengths`. distinct=True
+    gives every request its own filler rotation (no shared prefixes).
+    """
+    return [build_prompt(llm, lengths.sample(), variant=i if distinct else 0) for i in range(n_requests)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate prompts of exact token lengths for a model.")
+    parser.add_argument("model", help="registry key (its tokenizer defines the lengths)")
+    parser.add_argument("lengths", nargs="+", type=int, help="target prompt lengths in tokens (BOS included)")
+    parser.add_argument("--show", action="store_true", help="print the prompts")
+    args = parser.parse_args()
+
+    from model_pool import get_pool
+
+    with get_pool().lease(args.model, n_ctx=512, n_threads=1, vocab_only=True) as tokenizer:
+        for n in args.lengths:
+            prompt = exact_prompt(tokenizer, n)
+            print(f"✅ {n} tokens -> {_count(tokenizer, prompt)} actual, {len(prompt)} chars")
+            if args.show:
+                print(prompt)
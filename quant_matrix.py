@@ -0,0 +1,140 @@
+import argparse
+import csv
+import os
+
+from tabulate import tabulate
+
+from models_config import (
+    DEFAULT_QUANTS, MODEL_REGISTRY, MODELS_DIR, get_model_path,
+    register_local_variants, register_quant_variants,
+)
+
+MATRIX_COLUMNS = [
+    "family", "quant", "model_key", "filesize_gb", "decode_tps", "prefill_tps", "ttft_ms",
+    "static_ram_gb", "peak_ram_gb", "acc_total", "status",
+]
+
+
+def benchmark_variant(key: str, entry: dict, n_threads: int = 4, n_ctx: int = 2048,
+                      runs: int = 3, max_tokens: int = 128, accuracy: bool = False) -> dict:
+    """
+    Benchmark one quant variant; runs in a spawned worker, so the variant's
+    registry entry is passed in rather than looked up.
+    """
+    MODEL_REGISTRY[key] = entry
+    from benchmark_suite import run_throughput_profile
+    from model_pool import get_pool
+
+    pool = get_pool()
+    with pool.lease(key, n_ctx=n_ctx, n_threads=n_threads) as llm:
+        profile = run_throughput_profile(llm, key, runs=runs, max_tokens=max_tokens)
+        row = {
+            "decode_tps": profile["decode_rate_tps"],
+            "prefill_tps": profile["prefill_tps"],
+            "ttft_ms": profile["ttft_ms"],
+            "static_ram_gb": pool.footprint(key, n_ctx=n_ctx, n_threads=n_threads),
+        }
+        if accuracy:
+            from accuracy_test import evaluate_accuracy
+            row["acc_total"] = evaluate_accuracy(llm, key)["Total"]
+    return row
+
+
+def run_matrix(keys, n_threads: int = 4, n_ctx: int = 2048, runs: int = 3, max_tokens: int = 128,
+               accuracy: bool = False, download: bool = False, timeout_s: int = 900) -> list:
+    """
+    Benchmark every variant key in its own worker. Variants not on disk are
+    downloaded first when download=True, else reported as "missing".
+    """
+    from worker_pool import run_isolated_many
+
+    missing = [k for k in keys if not os.path.exists(get_model_path(k))]
+    if missing and download:
+        from download_manager import download_models
+        download_models(missing, dest_dir=MODELS_DIR)
+        missing = [k for k in missing if not os.path.exists(get_model_path(k))]
+
+    def base_row(key):
+        meta = MODEL_REGISTRY[key]
+        return {
+            "family": meta.get("family", key),
+            "quant": meta.get("quant", ""),
+            "model_key": key,
+            "filesize_gb": meta.get("filesize", ""),
+        }
+
+    rows = [{**base_row(k), "status": "missing"} for k in missing]
+    jobs = [
+        (key, benchmark_variant, (key, MODEL_REGISTRY[key], n_threads, n_ctx, runs, max_tokens, accuracy), None)
+        for key in keys if key not in missing
+    ]
+    for key, outcome in run_isolated_many(jobs, max_workers=1, timeout_s=timeout_s):
+        row = base_row(key)
+        row["status"] = outcome["status"]
+        row["peak_ram_gb"] = outcome["peak_rss_gb"]
+        if outcome["status"] == "success":
+            row.update(outcome["result"])
+        print(f"{'✅' if outcome['status'] == 'success' else '❌'} {MODEL_REGISTRY[key]['name']}: {outcome['status']}")
+        rows.append(row)
+    return rows
+
+
+def relative_to(rows: list, reference: str = "Q4_K_M") -> list:
+    """Add decode/RAM ratios and accuracy delta against each family's reference quant."""
+    refs = {r["family"]: r for r in rows if r.get("quant") == reference and r.get("status") == "success"}
+    for row in rows:
+        ref = refs.get(row["family"])
+        ok = ref is not None and row.get("status") == "success"
+        row["decode_vs_ref"] = round(row["decode_tps"] / ref["decode_tps"], 2) if ok and ref["decode_tps"] else ""
+        row["ram_vs_ref"] = round(row["peak_ram_gb"] / ref["peak_ram_gb"], 2) if ok and ref["peak_ram_gb"] else ""
+        acc, ref_acc = row.get("acc_total"), (ref or {}).get("acc_total")
+        row["acc_delta"] = round(acc - ref_acc, 1) if ok and acc is not None and ref_acc is not None else ""
+    return rows
+
+
+def write_csv(rows: list, path: str):
+    columns = MATRIX_COLUMNS + ["decode_vs_ref", "ram_vs_ref", "acc_delta"]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark quant variants (Q2_K..Q8_0) of registry models.")
+    parser.add_argument("families", nargs="*", help="base registry keys")
+    parser.add_argument("--quants", nargs="+", default=list(DEFAULT_QUANTS))
+    parser.add_argument("--local", metavar="DIR", help="benchmark every GGUF in DIR instead (offline fixtures)")
+    parser.add_argument("--download", action="store_true", help="download variants that are not on disk")
+    parser.add_argument("--accuracy", action="store_true", help="also run the accuracy suite per variant")
+    parser.add_argument("--reference", default="Q4_K_M", help="quant the ratios are relative to")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--ctx", type=int, default=2048)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--csv", help="also write the matrix to this CSV")
+    args = parser.parse_args()
+
+    if args.local:
+        variant_keys = register_local_variants(args.local)
+        if args.families:
+            variant_keys = [k for k in variant_keys if MODEL_REGISTRY[k]["family"] in args.families]
+    else:
+        unknown = [f for f in args.families if f not in MODEL_REGISTRY]
+        if not args.families or unknown:
+            raise SystemExit(f"Error: give registry keys to benchmark (unknown: {', '.join(unknown)})")
+        variant_keys = register_quant_variants(args.families, args.quants)
+    if not variant_keys:
+        raise SystemExit("No variants to benchmark.")
+
+    print(f"=== QUANT MATRIX ({len(variant_keys)} variants) ===")
+    matrix = relative_to(run_matrix(variant_keys, args.threads, args.ctx, args.runs, args.max_tokens,
+                                    args.accuracy, args.download), args.reference)
+    matrix.sort(key=lambda r: (r["family"], r.get("filesize_gb") or 0))
+
+    columns = ["family", "quant", "filesize_gb", "decode_tps", "prefill_tps", "peak_ram_gb", "acc_total",
+               "decode_vs_ref", "ram_vs_ref", "acc_delta", "status"]
+    print(tabulate([[r.get(c, "") for c in columns] for r in matrix], headers=columns, tablefmt="github"))
+    if args.csv:
+        write_csv(matrix, args.csv)
+        print(f"\n💾 Wrote {len(matrix)} rows to {args.csv}")
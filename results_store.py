@@ -0,0 +1,342 @@
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+# Column order of report.csv
+REPORT_COLUMNS = [
+    "model_name", "parameter_count_b", "numa_nodes", "physical_cores", "logical_cores",
+    "thread_count", "cpu_affinity", "sm_enabled", "benchmark_type", "oversubscribed",
+    "input_tokens_target", "input_tokens_actual", "max_output_tokens", "context_window",
+    "batch_size", "load_time_s", "file_size_gb", "ttft_ms", "percentile_ttft_p50",
+    "percentile_ttft_p95", "decode_rate_tps", "percentile_tps_p50", "percentile_tps_p95",
+    "effective_throughput_tps", "parallel_efficiency", "per_token_latency_ms",
+    "total_runtime_s", "static_ram_gb", "peak_ram_gb", "kv_cache_growth_mb_per_1k",
+    "avg_cpu_util_percent", "avg_saturated_cores", "timeout_s", "status",
+    "tps_per_billion_params", "ram_per_billion_params", "ttft_ms_per_billion_params",
+    "cies_score", "thread_count_batch", "arrival_rate_rps",
+]
+
+# Columns appended after report.csv files already existed; rows written
+# before them end early
+ADDED_COLUMNS = ["thread_count_batch", "arrival_rate_rps"]
+
+REPORT_PATH = "report.csv"
+RESULTS_DIR = "results"
+INDEX_FILE = "_index.json"
+INDEX_COLUMNS = ("model_name", "thread_count", "benchmark_type", "input_tokens_target")
+
+INT_COLUMNS = {
+    "numa_nodes", "physical_cores", "logical_cores", "thread_count", "thread_count_batch", "input_tokens_actual",
+    "max_output_tokens", "context_window", "batch_size", "timeout_s",
+}
+BOOL_COLUMNS = {"sm_enabled", "oversubscribed"}
+STRING_COLUMNS = {"model_name", "cpu_affinity", "benchmark_type", "input_tokens_target", "status", "run_id"}
+
+
+def _pa():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError as e:
+        raise ImportError("results_store needs pyarrow: pip install pyarrow") from e
+
+
+def schema():
+    """Typed Arrow schema: report.csv columns plus run_id."""
+    pa = _pa()
+    fields = []
+    for name in REPORT_COLUMNS + ["run_id"]:
+        if name in INT_COLUMNS:
+            fields.append(pa.field(name, pa.int64()))
+        elif name in BOOL_COLUMNS:
+            fields.append(pa.field(name, pa.bool_()))
+        elif name in STRING_COLUMNS:
+            fields.append(pa.field(name, pa.string()))
+        else:
+            fields.append(pa.field(name, pa.float64()))
+    return pa.schema(fields)
+
+
+def _coerce(name: str, value):
+    if value is None or value == "":
+        return None
+    if name in STRING_COLUMNS:
+        return str(value)
+    if name in BOOL_COLUMNS:
+        return value if isinstance(value, bool) else str(value).strip().lower() == "true"
+    if name in INT_COLUMNS:
+        return int(float(value))
+    return float(value)
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", text).strip("_") or "unknown"
+
+
+def _index_key(row: dict) -> str:
+    return "|".join(str(row.get(c, "")) for c in INDEX_COLUMNS)
+
+
+def _header(path: str) -> list:
+    with open(path, newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def migrate_report(path: str = REPORT_PATH) -> list:
+    """
+    Rewrite the header of a report.csv written before columns were appended
+    to REPORT_COLUMNS; older rows simply end early (read as empty). An
+    explicit step: append_row never changes an existing file's schema.
+    Returns the columns added.
+    """
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), [])
+        if header == REPORT_COLUMNS or header != REPORT_COLUMNS[:len(header)]:
+            return []
+        body = f.read()
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        csv.writer(f).writerow(REPORT_COLUMNS)
+        f.write(body)
+    os.replace(tmp, path)
+    return REPORT_COLUMNS[len(header):]
+
+
+_warned_schema = set()
+
+
+def append_row(row: dict, path: str = REPORT_PATH):
+    """
+    Append one row to report.csv in the file's existing column order
+    (REPORT_COLUMNS for a new file). Columns the file predates are left
+    out until migrate_report() is run on it.
+    """
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    columns = REPORT_COLUMNS if new else _header(path)
+    dropped = [c for c in REPORT_COLUMNS if c not in columns and row.get(c) not in (None, "")]
+    if dropped and path not in _warned_schema:
+        _warned_schema.add(path)
+        print(f"⚠️ {path} has no {', '.join(dropped)} column(s); "
+              f"run `python results_store.py migrate {path}` to keep them")
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        if new:
+            writer.writeheader()
+        writer.writerow(row)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_report_rows(path: str = REPORT_PATH):
+    """
+    Yield report.csv rows as dicts, repairing rows whose cpu_affinity list
+    (e.g. [0,1]) was written unquoted and split across several cells.
+    """
+    aff = REPORT_COLUMNS.index("cpu_affinity")
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        columns = header if header else REPORT_COLUMNS
+        for cells in reader:
+            if not cells:
+                continue
+            extra = len(cells) - len(columns)
+            if extra > 0 and cells[aff].startswith("[") and not cells[aff].endswith("]"):
+                cells = cells[:aff] + [",".join(cells[aff:aff + extra + 1])] + cells[aff + extra + 1:]
+            if len(cells) < len(columns) and set(columns[len(cells):]) <= set(ADDED_COLUMNS):
+                cells = cells + [""] * (len(columns) - len(cells))
+            if len(cells) != len(columns):
+                continue
+            yield dict(zip(columns, cells))
+
+
+class ResultsStore:
+    """
+    Parquet results store, hive-partitioned as
+    <root>/model=<model>/run=<run_id>/part-*.parquet.
+
+    A JSON index maps (model_name, thread_count, benchmark_type,
+    input_tokens_target) to the part files holding matching rows, so
+    queries on those columns only open the relevant files.
+    """
+
+    def __init__(self, root: str = RESULTS_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._index = self._load_index()
+
+    # --- index ---
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root, INDEX_FILE)
+
+    def _load_index(self) -> dict:
+        if os.path.exists(self._index_path()):
+            with open(self._index_path()) as f:
+                return json.load(f)
+        return {}
+
+    def _save_index(self):
+        tmp = self._index_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self._index_path())
+
+    def rebuild_index(self):
+        """Rescan all part files (e.g. after files were copied in by hand)."""
+        pa = _pa()
+        index = {}
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(".parquet"):
+                    continue
+                rel = os.path.relpath(os.path.join(dirpath, name), self.root)
+                table = pa.parquet.read_table(os.path.join(self.root, rel), columns=list(INDEX_COLUMNS))
+                for row in table.to_pylist():
+                    files_for = index.setdefault(_index_key(row), [])
+                    if rel not in files_for:
+                        files_for.append(rel)
+        with self._lock:
+            self._index = index
+            self._save_index()
+
+    # --- writes ---
+
+    def append(self, rows: list, run_id: str = None) -> str:
+        """Write rows (report.csv-shaped dicts) as new part files. Returns run_id."""
+        pa = _pa()
+        run_id = run_id or time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        by_model = {}
+        for row in rows:
+            typed = {c: _coerce(c, row.get(c)) for c in REPORT_COLUMNS}
+            typed["run_id"] = run_id
+            by_model.setdefault(typed["model_name"] or "unknown", []).append(typed)
+
+        sch = schema()
+        with self._lock:
+            for model, model_rows in by_model.items():
+                part_dir = os.path.join(self.root, f"model={_slug(model)}", f"run={_slug(run_id)}")
+                os.makedirs(part_dir, exist_ok=True)
+                rel = os.path.relpath(os.path.join(part_dir, f"part-{uuid.uuid4().hex[:8]}.parquet"), self.root)
+                pa.parquet.write_table(pa.Table.from_pylist(model_rows, schema=sch), os.path.join(self.root, rel))
+                for row in model_rows:
+                    files_for = self._index.setdefault(_index_key(row), [])
+                    if rel not in files_for:
+                        files_for.append(rel)
+            self._save_index()
+        return run_id
+
+    def import_csv(self, path: str = REPORT_PATH, run_id: str = "csv-import") -> int:
+        """One-time import of an existing report.csv. Returns rows imported."""
+        rows = list(read_report_rows(path))
+        if rows:
+            self.append(rows, run_id=run_id)
+        return len(rows)
+
+    # --- reads ---
+
+    def _files_for(self, filters: dict) -> list:
+        files = []
+        for key, paths in self._index.items():
+            parts = dict(zip(INDEX_COLUMNS, key.split("|")))
+            if all(str(v) == parts[c] for c, v in filters.items() if c in INDEX_COLUMNS):
+                files.extend(p for p in paths if p not in files)
+        return files
+
+    def query(self, columns: list = None, **filters):
+        """
+        Return an Arrow table of rows matching equality filters, e.g.
+        query(model_name="Falcon3 (1B)", benchmark_type="decode").
+        Indexed columns prune files; other filters are applied after.
+        """
+        pa = _pa()
+        import pyarrow.compute as pc
+        with self._lock:
+            files = self._files_for(filters)
+        sch = schema()
+        if not files:
+            return sch.empty_table() if columns is None else sch.empty_table().select(columns)
+        tables = [pa.parquet.read_table(os.path.join(self.root, f), schema=sch) for f in files]
+        table = pa.concat_tables(tables)
+        for col, value in filters.items():
+            value = _coerce(col, value)
+            table = table.filter(pc.equal(table[col], pa.scalar(value, type=sch.field(col).type)))
+        return table.select(columns) if columns else table
+
+    def to_pandas(self, **filters):
+        return self.query(**filters).to_pandas()
+
+    def best_thread_count(self, metric: str = "decode_rate_tps", benchmark_type: str = "decode",
+                          **filters) -> list:
+        """
+        Per model, the thread_count with the highest mean `metric`.
+        Returns [{"model_name", "thread_count", metric, "speedup_vs_1t"}].
+        """
+        table = self.query(benchmark_type=benchmark_type, **filters)
+        grouped = table.group_by(["model_name", "thread_count"]).aggregate([(metric, "mean")]).to_pylist()
+        best = {}
+        base = {}
+        for row in grouped:
+            value = row[f"{metric}_mean"]
+            if value is None:
+                continue
+            if row["thread_count"] == 1:
+                base[row["model_name"]] = value
+            if row["model_name"] not in best or value > best[row["model_name"]][metric]:
+                best[row["model_name"]] = {"model_name": row["model_name"],
+                                           "thread_count": row["thread_count"], metric: round(value, 2)}
+        for name, row in best.items():
+            row["speedup_vs_1t"] = round(row[metric] / base[name], 2) if base.get(name) else None
+        return sorted(best.values(), key=lambda r: r[metric], reverse=True)
+
+    def export_csv(self, path: str, **filters) -> int:
+        """Write matching rows in report.csv layout (lists properly quoted)."""
+        rows = self.query(**filters).to_pylist()
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS, extrasaction="ignore", quoting=csv.QUOTE_MINIMAL)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: ("" if v is None else v) for k, v in row.items()})
+        return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parquet results store for benchmark rows.")
+    parser.add_argument("--root", default=RESULTS_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="import an existing report.csv")
+    imp.add_argument("csv", nargs="?", default=REPORT_PATH)
+    exp = sub.add_parser("export", help="export rows as report.csv-compatible CSV")
+    exp.add_argument("csv")
+    best = sub.add_parser("best-threads", help="best thread count per model")
+    best.add_argument("--metric", default="decode_rate_tps")
+    best.add_argument("--type", default="decode")
+    sub.add_parser("reindex", help="rebuild the index from the part files")
+    mig = sub.add_parser("migrate", help="add columns appended to the schema to an existing report.csv header")
+    mig.add_argument("csv", nargs="?", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    if args.cmd == "migrate":
+        added = migrate_report(args.csv)
+        print(f"✅ Added {', '.join(added)} to {args.csv}" if added else f"✅ {args.csv} is already current")
+        raise SystemExit(0)
+
+    store = ResultsStore(args.root)
+    if args.cmd == "import":
+        print(f"Imported {store.import_csv(args.csv)} rows into {args.root}")
+    elif args.cmd == "export":
+        print(f"Exported {store.export_csv(args.csv)} rows to {args.csv}")
+    elif args.cmd == "best-threads":
+        from tabulate import tabulate
+        rows = store.best_thread_count(args.metric, args.type)
+        print(tabulate(rows, headers="keys", tablefmt="github"))
+    elif args.cmd == "reindex":
+        store.rebuild_index()
+        print(f"Rebuilt index for {args.root}")
@@ -1,70 +1,107 @@
-import time
-import psutil
-import os
-import gc
+import argparse
 from tabulate import tabulate
-from llama_cpp import Llama
-from models_config import list_available_models, get_model_path, MODEL_REGISTRY
-from benchmark_suite import run_throughput_test
-from kv_cache_profile import profile_kv_growth
-from memory_test import measure_static_footprint
-from accuracy_test import evaluate_accuracy
-from plot_benchmark import plot_benchmark_results  # <--- Imported
+from models_config import list_available_models, MODEL_REGISTRY
+from benchmark_suite import run_throughput_profile
+from kv_cache_profile import kv_cache_mb_per_1k
+from model_pool import get_pool
+from worker_pool import run_isolated_many
+from cpu_topology import AFFINITY_STRATEGIES, plan_affinity
+from model_loader import LOAD_STRATEGIES, resolve_threads, thread_count_arg
+from speculative import find_drafters, run_speculative_profile
+from analysis import rank_models
+
+MODEL_TIMEOUT_S = 900
+
+
+def benchmark_model(key: str, n_threads=4, affinity: str = "physical", load_strategy: str = None,
+                    speculative: bool = False, n_threads_batch=None) -> dict:
+    """Benchmark one model; runs inside an isolated worker process."""
+    from accuracy_test import evaluate_accuracy
+
+    pool = get_pool()
+    n_threads, n_threads_batch = resolve_threads(key, n_threads, n_threads_batch)
+    plan = plan_affinity(max(n_threads, n_threads_batch or 0), affinity)
+    load_kwargs = dict(affinity=plan, load_strategy=load_strategy, n_threads_batch=n_threads_batch)
+    llm = pool.get(key, n_ctx=4096, n_threads=n_threads, **load_kwargs)
+
+    static_ram = pool.footprint(key, n_ctx=4096, n_threads=n_threads, **load_kwargs)
+    load_time = pool.load_time(key, n_ctx=4096, n_threads=n_threads, **load_kwargs)
+
+    profile = run_throughput_profile(llm, key, affinity=plan)
+    speed = profile["decode_rate_tps"]
+
+    acc_metrics = evaluate_accuracy(llm, key)
+    # Done with the pooled instance; speculative below may evict it
+    pool.release(llm)
+
+    # Exact K+V bytes per token from GGUF metadata (f16 cache)
+    kv_growth = kv_cache_mb_per_1k(key)
+
+    total_ram_4k = static_ram + ((kv_growth * 4) / 1024)
+
+    # Speculative decode with the smallest vocab-compatible drafter, if any
+    spec = {}
+    drafters = find_drafters(key) if speculative else []
+    if drafters:
+        spec = run_speculative_profile(key, drafters[0], n_threads=n_threads, baseline=profile)
+
+    return {
+        "model": MODEL_REGISTRY[key]['name'],
+        "speed": speed,
+        "prefill_tps": profile["prefill_tps"],
+        "ttft_ms": profile["ttft_ms"],
+        "latency_p95_ms": profile["latency_p95_ms"],
+        "static_ram": static_ram,
+        "load_time": load_time,
+        "ram_cost": round(total_ram_4k, 2),
+        "acc_total": acc_metrics["Total"],
+        "acc_code": acc_metrics["Coding"],
+        "acc_reason": acc_metrics["Reasoning"],
+        "acc_chat": acc_metrics["Chat"],
+        "spec_speed": spec.get("speculative_decode_tps"),
+        "spec_accept": spec.get("acceptance_rate"),
+        "spec_draft": spec.get("draft"),
+    }
 
-def get_ram_gb():
-    return psutil.Process(os.getpid()).memory_info().rss / (1024**3)
 
 def main():
+    parser = argparse.ArgumentParser(description="Benchmark every downloaded model.")
+    parser.add_argument("--threads", type=thread_count_arg, default=4,
+                        help='decode threads, or "auto" (decode knee from report.csv)')
+    parser.add_argument("--threads-batch", type=thread_count_arg, default=None,
+                        help='prompt-processing threads (default: --threads), or "auto" (prefill knee)')
+    parser.add_argument("--affinity", default="physical",
+                        help=f"CPU placement: {', '.join(AFFINITY_STRATEGIES)} or a CPU list like 0,2")
+    parser.add_argument("--load", default=None, choices=list(LOAD_STRATEGIES),
+                        help="model load strategy (default: EDGE_LOAD_STRATEGY or mmap)")
+    parser.add_argument("--speculative", action="store_true",
+                        help="also time speculative decoding with a compatible drafter")
+    args = parser.parse_args()
+
     models = list_available_models()
     if not models:
         print("No models available. Run 'python download_manager.py' first.")
         return
 
     raw_data = []
+    failures = []
     print("\nSTARTING MULTI-DIMENSIONAL BENCHMARK\n")
 
-    for key in models:
+    # One worker process per model: clean RSS baseline, and a crash or
+    # hang in one GGUF only costs that model's row
+    jobs = [(key, benchmark_model, (key, args.threads, args.affinity, args.load, args.speculative,
+                                    args.threads_batch), None) for key in models]
+    for key, outcome in run_isolated_many(jobs, max_workers=1, timeout_s=MODEL_TIMEOUT_S):
         name = MODEL_REGISTRY[key]['name']
-        print(f"Processing: {name}")
-
-        gc.collect()
-        base_ram = get_ram_gb()
-
-        try:
-            path = get_model_path(key)
-
-            llm = Llama(
-                model_path=path,
-                n_ctx=4096,
-                n_threads=4,
-                verbose=False
-            )
-
-            static_ram = round(get_ram_gb() - base_ram, 2)
-
-            speed = run_throughput_test(llm, key)
-
-            acc_metrics = evaluate_accuracy(llm, key)
-
-            kv_growth = profile_kv_growth(llm)
-
-            total_ram_4k = static_ram + ((kv_growth * 4) / 1024)
-
-            del llm
-            gc.collect()
-
-            raw_data.append({
-                "model": name,
-                "speed": speed,
-                "ram_cost": round(total_ram_4k, 2),
-                "acc_total": acc_metrics["Total"],
-                "acc_code": acc_metrics["Coding"],
-                "acc_reason": acc_metrics["Reasoning"],
-                "acc_chat": acc_metrics["Chat"]
-            })
-
-        except Exception as e:
-            print(f"Failure: {e}")
+        if outcome["status"] == "success":
+            row = outcome["result"]
+            row["peak_ram"] = outcome["peak_rss_gb"]
+            raw_data.append(row)
+            print(f"Processed: {name} ({outcome['wall_s']}s, peak {outcome['peak_rss_gb']} GB)")
+        else:
+            error = (outcome["error"] or "").splitlines()
+            failures.append([name, outcome["status"], error[0] if error else ""])
+            print(f"Failure: {name}: {outcome['status']}")
 
     # --- REPORTING ---
 
@@ -72,22 +109,22 @@ def main():
     print("FINAL RECOMMENDATION MATRIX")
     print("="*80)
 
-    code_rank = sorted(raw_data, key=lambda x: (x['acc_code'], x['speed']), reverse=True)
+    code_rank = rank_models(raw_data, ['acc_code', 'speed'])
     print("\nCODING USE-CASE")
     table = [[m['model'], f"{m['acc_code']}%", f"{m['speed']} t/s"] for m in code_rank]
     print(tabulate(table, headers=["Model", "Coding Score", "Speed"], tablefmt="github"))
 
-    logic_rank = sorted(raw_data, key=lambda x: (x['acc_reason'], x['speed']), reverse=True)
+    logic_rank = rank_models(raw_data, ['acc_reason', 'speed'])
     print("\nREASONING USE-CASE")
     table = [[m['model'], f"{m['acc_reason']}%", f"{m['speed']} t/s"] for m in logic_rank]
     print(tabulate(table, headers=["Model", "Reasoning Score", "Speed"], tablefmt="github"))
 
-    budget_rank = sorted(raw_data, key=lambda x: x['ram_cost'])
+    budget_rank = rank_models(raw_data, 'ram_cost', ascending=True)
     print("\nLOW HARDWARE USE-CASE")
     table = [[m['model'], f"{m['ram_cost']} GB", f"{m['acc_total']}%"] for m in budget_rank]
     print(tabulate(table, headers=["Model", "Total RAM (4k)", "Overall Acc"], tablefmt="github"))
 
-    speed_rank = sorted(raw_data, key=lambda x: x['speed'], reverse=True)
+    speed_rank = rank_models(raw_data, 'speed')
     print("\nREAL-TIME USE-CASE")
     table = [[m['model'], f"{m['speed']} t/s", f"{m['acc_total']}%"] for m in speed_rank]
     print(tabulate(table, headers=["Model", "Speed", "Overall Acc"], tablefmt="github"))
@@ -100,11 +137,16 @@ def main():
         [
             m["model"],
             f"{m['speed']} t/s",
+            f"{m['prefill_tps']} t/s",
+            f"{m['ttft_ms']} ms",
+            f"{m['latency_p95_ms']} ms",
             f"{m['acc_total']}%",
             f"{m['acc_code']}%",
             f"{m['acc_reason']}%",
             f"{m['acc_chat']}%",
-            f"{m['ram_cost']} GB"
+            f"{m['ram_cost']} GB",
+            f"{m['peak_ram']} GB",
+            f"{m['load_time']} s"
         ]
         for m in raw_data
     ]
@@ -112,15 +154,30 @@ def main():
     print(tabulate(
         rows,
         headers=[
-            "Model", "Speed", "Acc(Total)",
+            "Model", "Decode", "Prefill", "TTFT", "Tok p95",
+            "Acc(Total)",
             "Acc(Coding)", "Acc(Reason)",
-            "Acc(Chat)", "RAM(4k)"
+            "Acc(Chat)", "RAM(4k)", "Peak RSS", "Load"
         ],
         tablefmt="github"
     ))
 
+    spec_rows = [
+        [m["model"], m["spec_draft"], f"{m['speed']} t/s", f"{m['spec_speed']} t/s", f"{m['spec_accept'] * 100:.1f}%"]
+        for m in raw_data if m.get("spec_speed") is not None
+    ]
+    if spec_rows:
+        print("\nSPECULATIVE DECODING")
+        print(tabulate(spec_rows, headers=["Model", "Drafter", "Plain", "Speculative", "Acceptance"], tablefmt="github"))
+
+    if failures:
+        print("\nFAILED MODELS")
+        print(tabulate(failures, headers=["Model", "Status", "Error"], tablefmt="github"))
+
     # --- PLOTTING ---
     try:
+        from plot_benchmark import plot_benchmark_results
+
         plot_benchmark_results(raw_data)
     except Exception as e:
         print(f"\n⚠️ Plotting failed: {e}")
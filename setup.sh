@@ -55,7 +55,7 @@ source venv/bin/activate
 
 echo "Installing Python dependencies..."
 pip install --upgrade pip
-pip install psutil tabulate huggingface_hub llama-cpp-python
+pip install psutil tabulate huggingface_hub llama-cpp-python numpy pandas
 
 # -------------------------------
 # 4. Validation
@@ -0,0 +1,242 @@
+import argparse
+import os
+
+import numpy as np
+from llama_cpp.llama_speculative import LlamaDraftModel
+
+from models_config import MODEL_REGISTRY, get_model_path, list_available_models
+from gguf_reader import read_gguf_metadata
+from model_loader import load_model
+
+TOKENIZER_KEYS = [
+    "tokenizer.ggml.model",
+    "tokenizer.ggml.tokens",
+    "tokenizer.ggml.bos_token_id",
+    "tokenizer.ggml.eos_token_id",
+]
+
+# llama.cpp's speculative example tolerates this much vocab size drift
+MAX_VOCAB_SIZE_DIFF = 128
+
+# Drafters must be at most this fraction of the target's parameter count
+MAX_DRAFT_SIZE_RATIO = 0.25
+
+
+def _tokenizer_meta(model_key: str) -> dict:
+    return read_gguf_metadata(get_model_path(model_key), keys=TOKENIZER_KEYS)
+
+
+def vocab_compatible(target_key: str, draft_key: str) -> tuple:
+    """
+    (ok, reason): whether draft_key's token ids mean the same text as
+    target_key's. Compares tokenizer type, BOS/EOS ids and every token
+    string the two vocabularies share, from GGUF metadata only.
+    """
+    target = _tokenizer_meta(target_key)
+    draft = _tokenizer_meta(draft_key)
+    if target.get("tokenizer.ggml.model") != draft.get("tokenizer.ggml.model"):
+        return False, f"tokenizer type {draft.get('tokenizer.ggml.model')} != {target.get('tokenizer.ggml.model')}"
+    for key in ("tokenizer.ggml.bos_token_id", "tokenizer.ggml.eos_token_id"):
+        if target.get(key) != draft.get(key):
+            return False, f"{key.rsplit('.', 1)[-1]} differs"
+    t_tokens = target.get("tokenizer.ggml.tokens") or []
+    d_tokens = draft.get("tokenizer.ggml.tokens") or []
+    if not t_tokens or not d_tokens:
+        return False, "vocab missing from GGUF metadata"
+    if abs(len(t_tokens) - len(d_tokens)) > MAX_VOCAB_SIZE_DIFF:
+        return False, f"vocab size {len(d_tokens)} vs {len(t_tokens)}"
+    n = min(len(t_tokens), len(d_tokens))
+    mismatch = next((i for i in range(n) if t_tokens[i] != d_tokens[i]), None)
+    if mismatch is not None:
+        return False, f"token {mismatch} differs ({d_tokens[mismatch]!r} vs {t_tokens[mismatch]!r})"
+    return True, "ok"
+
+
+def find_drafters(target_key: str) -> list:
+    """Downloaded registry models small enough to draft for target_key and vocab-compatible, smallest first."""
+    limit = MODEL_REGISTRY[target_key].get("size", 0) * MAX_DRAFT_SIZE_RATIO
+    found = []
+    for key in list_available_models():
+        if key == target_key or MODEL_REGISTRY[key].get("size", 0) > limit:
+            continue
+        try:
+            ok, _ = vocab_compatible(target_key, key)
+        except (OSError, ValueError):
+            continue
+        if ok:
+            found.append(key)
+    return sorted(found, key=lambda k: MODEL_REGISTRY[k].get("size", 0))
+
+
+class RegistryDraftModel(LlamaDraftModel):
+    """
+    Greedy drafter backed by a small registry model.
+
+    Llama(draft_model=...) calls this with the target's token history after
+    every verification step, evaluates history + draft in one batched pass
+    and keeps the drafted tokens it agrees with. The drafter keeps its own
+    KV cache and only evaluates the tokens that changed since the last call.
+
+    Approach (adaptive draft length):
+      - Infer how many of the previous draft tokens were accepted from the
+        history the target hands back
+      - All accepted: k += 1 (up to k_max); under half accepted: k -= 1
+    """
+
+    def __init__(self, draft_key: str, n_ctx: int = 4096, n_threads: int = 4,
+                 k: int = 4, k_min: int = 1, k_max: int = 8, adaptive: bool = True):
+        self.draft_key = draft_key
+        self.llm, _ = load_model(draft_key, n_ctx=n_ctx, n_threads=n_threads)
+        self.k = k
+        self.k_min = k_min
+        self.k_max = k_max
+        self.adaptive = adaptive
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.drafted = 0
+        self.accepted = 0
+        self.steps = 0
+        self._last_len = None
+        self._last_draft = []
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    def _record(self, input_ids: np.ndarray):
+        if self._last_len is None or len(input_ids) <= self._last_len:
+            return
+        new = input_ids[self._last_len:]
+        accepted = 0
+        for drafted, actual in zip(self._last_draft, new):
+            if drafted != actual:
+                break
+            accepted += 1
+        self.drafted += len(self._last_draft)
+        self.accepted += accepted
+        self.steps += 1
+        if self.adaptive and self._last_draft:
+            if accepted == len(self._last_draft):
+                self.k = min(self.k + 1, self.k_max)
+            elif accepted * 2 < len(self._last_draft):
+                self.k = max(self.k - 1, self.k_min)
+
+    def __call__(self, input_ids: np.ndarray, /, **kwargs) -> np.ndarray:
+        self._record(input_ids)
+        llm = self.llm
+        tokens = [int(t) for t in input_ids]
+        room = llm.n_ctx() - len(tokens)
+        if room <= 0:
+            self._last_len, self._last_draft = None, []
+            return np.array([], dtype=np.intc)
+
+        # Reuse the drafter's KV cache for the shared prefix
+        common = 0
+        for cached, new in zip(llm.input_ids[:llm.n_tokens], tokens):
+            if cached != new:
+                break
+            common += 1
+        common = min(common, len(tokens) - 1)
+        llm.n_tokens = common
+        llm.eval(tokens[common:])
+
+        draft = []
+        eos = llm.token_eos()
+        for _ in range(min(self.k, room)):
+            token = int(np.argmax(llm.scores[llm.n_tokens - 1]))
+            draft.append(token)
+            if token == eos:
+                break
+            llm.eval([token])
+
+        self._last_len = len(tokens)
+        self._last_draft = draft
+        return np.array(draft, dtype=np.intc)
+
+    def close(self):
+        close = getattr(self.llm, "close", None)
+        if close is not None:
+            close()
+
+
+def run_speculative_profile(target_key: str, draft_key: str = None, n_ctx: int = 4096, n_threads: int = 4,
+                            runs: int = 3, max_tokens: int = 128, k: int = 4, adaptive: bool = True,
+                            baseline: dict = None) -> dict:
+    """
+    Plain vs speculative decode on the same target (greedy, so outputs
+    match). Returns baseline and speculative decode t/s, speedup,
+    acceptance rate and the final draft length. Pass an existing
+    run_throughput_profile() result as baseline to skip the plain runs.
+    """
+    from benchmark_suite import run_throughput_profile
+    from model_pool import get_pool
+
+    if draft_key is None:
+        drafters = find_drafters(target_key)
+        if not drafters:
+            raise ValueError(f"no downloaded drafter is vocab-compatible with {target_key}")
+        draft_key = drafters[0]
+    else:
+        ok, reason = vocab_compatible(target_key, draft_key)
+        if not ok:
+            raise ValueError(f"{draft_key} cannot draft for {target_key}: {reason}")
+
+    pool = get_pool()
+    if baseline is None:
+        with pool.lease(target_key, n_ctx=n_ctx, n_threads=n_threads) as base:
+            baseline = run_throughput_profile(base, target_key, runs=runs, max_tokens=max_tokens)
+    # Free idle pooled copies so the target is not resident twice (callers
+    # passing a baseline should release their instance first)
+    pool.evict(target_key)
+
+    drafter = RegistryDraftModel(draft_key, n_ctx=n_ctx, n_threads=n_threads, k=k, adaptive=adaptive)
+    try:
+        spec, _ = load_model(target_key, n_ctx=n_ctx, n_threads=n_threads, draft_model=drafter)
+        speculative = run_throughput_profile(spec, target_key, runs=runs, max_tokens=max_tokens)
+        spec.close()
+    finally:
+        drafter.close()
+
+    base_tps = baseline["decode_rate_tps"]
+    spec_tps = speculative["decode_rate_tps"]
+    return {
+        "target": target_key,
+        "draft": draft_key,
+        "baseline_decode_tps": base_tps,
+        "speculative_decode_tps": spec_tps,
+        "speedup": round(spec_tps / base_tps, 2) if base_tps else 0.0,
+        "acceptance_rate": round(drafter.acceptance_rate, 3),
+        "draft_tokens": drafter.drafted,
+        "final_k": drafter.k,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speculative decoding with a small registry model as drafter.")
+    parser.add_argument("target", help="registry key of the model to accelerate")
+    parser.add_argument("--draft", help="registry key of the drafter (default: smallest compatible)")
+    parser.add_argument("--k", type=int, default=4, help="initial draft length")
+    parser.add_argument("--fixed-k", action="store_true", help="disable adaptive draft length")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--list", action="store_true", help="only list compatible drafters")
+    args = parser.parse_args()
+
+    if args.target not in MODEL_REGISTRY:
+        raise SystemExit(f"Error: Model '{args.target}' not found.")
+    if not os.path.exists(get_model_path(args.target)):
+        raise SystemExit(f"Error: {args.target} is not downloaded.")
+
+    if args.list:
+        for key in find_drafters(args.target):
+            print(f"✅ {key}: {MODEL_REGISTRY[key]['name']}")
+        raise SystemExit(0)
+
+    result = run_speculative_profile(args.target, args.draft, n_threads=args.threads, runs=args.runs,
+                                     max_tokens=args.max_tokens, k=args.k, adaptive=not args.fixed_k)
+    print(f"=== {MODEL_REGISTRY[args.target]['name']} drafted by {MODEL_REGISTRY[result['draft']]['name']} ===")
+    print(f"Baseline:    {result['baseline_decode_tps']} t/s")
+    print(f"Speculative: {result['speculative_decode_tps']} t/s ({result['speedup']}x)")
+    print(f"Acceptance:  {result['acceptance_rate'] * 100:.1f}% of {result['draft_tokens']} drafted, final k={result['final_k']}")
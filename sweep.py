@@ -0,0 +1,245 @@
+import argparse
+import itertools
+import time
+
+import psutil
+
+from models_config import list_available_models, MODEL_REGISTRY
+from benchmark_suite import _run_single_throughput, summarize_runs
+from model_pool import get_pool, set_threads
+from worker_pool import read_peak_rss_gb, run_isolated_many
+from cpu_topology import CpuTopology, apply_affinity, plan_affinity, restore_affinity
+from kv_cache_profile import kv_cache_mb_per_1k
+from analysis import DERIVED_DECIMALS, derived_metrics
+from prompts import build_prompt
+from results_store import REPORT_COLUMNS, REPORT_PATH, ResultsStore, append_row
+
+
+class SweepConfig:
+    """Grid of benchmark dimensions expanded for every model."""
+
+    def __init__(self, threads=(1, 2, 4, 8), affinities=("physical",), n_ctx=(4096,),
+                 decode_outputs=(256, 1024, 2048), prefill_inputs=(256, 1024, 2048),
+                 prefill_output: int = 128, runs: int = 3, threads_batch=None):
+        self.threads = sorted(set(threads))
+        # None: prompt processing uses the decode thread count
+        self.threads_batch = sorted(set(threads_batch)) if threads_batch else None
+        self.affinities = list(affinities)
+        self.n_ctx = list(n_ctx)
+        self.decode_outputs = list(decode_outputs)
+        self.prefill_inputs = list(prefill_inputs)
+        self.prefill_output = prefill_output
+        self.runs = runs
+
+    def workloads(self) -> list:
+        """(benchmark_type, input_tokens_target, max_output_tokens) triples."""
+        decode = [("decode", "short", n) for n in self.decode_outputs]
+        prefill = [("prefill", n, self.prefill_output) for n in self.prefill_inputs]
+        return decode + prefill
+
+    def expand(self, model_key: str) -> list:
+        """
+        All runs for one model, ordered so the model is loaded once per
+        n_ctx and each workload sees the 1-thread baseline first.
+
+        With threads_batch set, prefill workloads run every (threads,
+        threads_batch) pair; decode workloads keep threads_batch = threads.
+        """
+        runs = []
+        for n_ctx in self.n_ctx:
+            for workload, affinity, threads in itertools.product(self.workloads(), self.affinities, self.threads):
+                batch_options = [threads]
+                if self.threads_batch and workload[0] == "prefill":
+                    batch_options = self.threads_batch
+                for threads_batch in batch_options:
+                    runs.append({
+                        "model_key": model_key,
+                        "n_ctx": n_ctx,
+                        "benchmark_type": workload[0],
+                        "input_tokens_target": workload[1],
+                        "max_output_tokens": workload[2],
+                        "affinity": affinity,
+                        "thread_count": threads,
+                        "thread_count_batch": threads_batch,
+                    })
+        return runs
+
+
+def host_info() -> dict:
+    return CpuTopology.read().summary()
+
+
+def run_timeout_s(input_target, max_output: int, filesize_gb: float) -> int:
+    """Per-run time budget recorded in the timeout_s column."""
+    tokens = max_output + (input_target if isinstance(input_target, int) else 0)
+    base = 120 if tokens <= 512 else 300 if tokens <= 1536 else 600
+    return base * (2 if filesize_gb > 4 else 1)
+
+
+def base_row(model_key: str, host: dict) -> dict:
+    """A report.csv row with the model and host columns filled in and the rest blank."""
+    meta = MODEL_REGISTRY[model_key]
+    row = dict.fromkeys(REPORT_COLUMNS, "")
+    row.update(host)
+    row["model_name"] = meta["name"]
+    row["parameter_count_b"] = meta.get("size", "")
+    row["file_size_gb"] = meta.get("filesize", "")
+    row["batch_size"] = 1
+    return row
+
+
+def sweep_model(model_key: str, config: SweepConfig, report_path: str = REPORT_PATH,
+                store_root: str = None, run_id: str = None) -> int:
+    """
+    Run every grid point for one model and append each row as it finishes.
+    With store_root, the model's rows are also written to the Parquet
+    results store under run_id once the model is done.
+
+    Runs inside a worker process; returns the number of rows written.
+    """
+    topology = CpuTopology.read()
+    host = topology.summary()
+    pool = get_pool()
+    original_affinity = {}
+    baselines = {}
+    rows = []
+    kv_per_1k = kv_cache_mb_per_1k(model_key)
+
+    for n_ctx, runs in itertools.groupby(config.expand(model_key), key=lambda r: r["n_ctx"]):
+        llm = pool.get(model_key, n_ctx=n_ctx, n_threads=config.threads[0])
+        # Discarded warmup: the first pass pays page faults and cold caches
+        _run_single_throughput(llm, max_tokens=16)
+        prompts = {}
+        for run in runs:
+            threads = run["thread_count"]
+            threads_batch = run["thread_count_batch"]
+            plan = plan_affinity(max(threads, threads_batch), run["affinity"], topology)
+            # Moves every thread, so llama's existing compute threads run on
+            # plan.cpus too (the model is not reloaded per plan)
+            previous = apply_affinity(plan)
+            for tid, cpus in previous.items():
+                original_affinity.setdefault(tid, cpus)
+            set_threads(llm, threads, threads_batch)
+
+            target = run["input_tokens_target"]
+            if target not in prompts:
+                prompts[target] = build_prompt(llm, target)
+
+            psutil.cpu_percent(interval=None)
+            results = [
+                _run_single_throughput(llm, max_tokens=run["max_output_tokens"], prompt=prompts[target])
+                for _ in range(config.runs)
+            ]
+            cpu_util = psutil.cpu_percent(interval=None)
+            summary = summarize_runs(results)
+
+            # Prefill scales with the prompt-processing threads
+            prefill = run["benchmark_type"] == "prefill"
+            rate_key = "prefill_tps" if prefill else "decode_rate_tps"
+            scaling_threads = threads_batch if prefill else threads
+            group = (n_ctx, run["benchmark_type"], target, run["max_output_tokens"], run["affinity"])
+            if scaling_threads == 1 and group not in baselines:
+                baselines[group] = summary[rate_key]
+            base = baselines.get(group)
+
+            row = base_row(model_key, host)
+            row.update({k: v for k, v in summary.items() if k in REPORT_COLUMNS})
+            row.update({
+                "thread_count": threads,
+                "thread_count_batch": threads_batch,
+                "cpu_affinity": str(plan.cpus),
+                "benchmark_type": run["benchmark_type"],
+                "oversubscribed": (max(threads, threads_batch) > len(plan.cpus)
+                                   or max(threads, threads_batch) > host["physical_cores"]),
+                "input_tokens_target": target,
+                "max_output_tokens": run["max_output_tokens"],
+                "context_window": n_ctx,
+                "load_time_s": pool.load_time(model_key, n_ctx=n_ctx, n_threads=config.threads[0]),
+                "parallel_efficiency": round(summary[rate_key] / (base * scaling_threads), 3) if base else "",
+                "static_ram_gb": pool.footprint(model_key, n_ctx=n_ctx, n_threads=config.threads[0]),
+                "peak_ram_gb": round(read_peak_rss_gb(), 2),
+                "kv_cache_growth_mb_per_1k": kv_per_1k,
+                "avg_cpu_util_percent": round(cpu_util, 2),
+                "avg_saturated_cores": round(cpu_util * host["logical_cores"] / 100.0, 2),
+                "timeout_s": run_timeout_s(target, run["max_output_tokens"], MODEL_REGISTRY[model_key].get("filesize", 0)),
+                "status": "success",
+            })
+            if row["parameter_count_b"] and row["peak_ram_gb"]:
+                metrics = derived_metrics(float(row["parameter_count_b"]), summary["effective_throughput_tps"],
+                                          summary["decode_rate_tps"], row["peak_ram_gb"], summary["ttft_ms"])
+                if run["benchmark_type"] != "decode":
+                    metrics.pop("cies_score")
+                row.update({k: round(v, DERIVED_DECIMALS[k]) for k, v in metrics.items()})
+            append_row(row, report_path)
+            rows.append(row)
+
+        restore_affinity(original_affinity)
+        original_affinity.clear()
+        pool.release(llm)
+        pool.evict(model_key)
+    if store_root and rows:
+        ResultsStore(store_root).append(rows, run_id)
+    return len(rows)
+
+
+def model_timeout_s(model_key: str, config: SweepConfig) -> int:
+    filesize = MODEL_REGISTRY[model_key].get("filesize", 0)
+    return sum(run_timeout_s(r["input_tokens_target"], r["max_output_tokens"], filesize) * config.runs
+               for r in config.expand(model_key))
+
+
+def run_sweep(models=None, config: SweepConfig = None, report_path: str = REPORT_PATH,
+              store_root: str = None, run_id: str = None):
+    """
+    Sweep every model in its own worker process. A model whose worker
+    crashes or times out gets a single status row; rows already written
+    by that worker are kept. Pass store_root to also record the run in
+    the Parquet results store.
+    """
+    config = config or SweepConfig()
+    models = models or list_available_models()
+    host = host_info()
+    timeout = max([model_timeout_s(k, config) for k in models] or [0])
+    run_id = run_id or time.strftime("%Y%m%dT%H%M%S")
+    jobs = [(key, sweep_model, (key, config, report_path, store_root, run_id), None) for key in models]
+    for key, outcome in run_isolated_many(jobs, max_workers=1, timeout_s=timeout):
+        name = MODEL_REGISTRY[key]["name"]
+        if outcome["status"] == "success":
+            print(f"✅ {name}: {outcome['result']} rows in {outcome['wall_s']}s")
+            continue
+        print(f"❌ {name}: {outcome['status']}")
+        row = base_row(key, host)
+        row.update({
+            "peak_ram_gb": outcome["peak_rss_gb"] or "",
+            "total_runtime_s": outcome["wall_s"],
+            "timeout_s": outcome["timeout_s"],
+            "status": outcome["status"],
+        })
+        append_row(row, report_path)
+        if store_root:
+            ResultsStore(store_root).append([row], run_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Thread x context sweep writing report.csv rows.")
+    parser.add_argument("models", nargs="*", help="registry keys (default: all downloaded)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads-batch", type=int, nargs="+", default=None,
+                        help="prompt-processing thread counts swept for prefill runs (default: same as --threads)")
+    parser.add_argument("--affinity", nargs="+", default=["physical"],
+                        help='plans (physical, smt, numa, compact, none) or explicit CPU lists like "0,2"')
+    parser.add_argument("--ctx", type=int, nargs="+", default=[4096])
+    parser.add_argument("--outputs", type=int, nargs="+", default=[256, 1024, 2048],
+                        help="max_output_tokens for decode runs")
+    parser.add_argument("--inputs", type=int, nargs="+", default=[256, 1024, 2048],
+                        help="input token targets for prefill runs")
+    parser.add_argument("--runs", type=int, default=3, help="repetitions per grid point")
+    parser.add_argument("--report", default=REPORT_PATH)
+    parser.add_argument("--store", default=None, metavar="DIR",
+                        help="also write rows to a Parquet results store (needs pyarrow)")
+    args = parser.parse_args()
+
+    cfg = SweepConfig(threads=args.threads, affinities=args.affinity, n_ctx=args.ctx,
+                      decode_outputs=args.outputs, prefill_inputs=args.inputs, runs=args.runs,
+                      threads_batch=args.threads_batch)
+    run_sweep(args.models, cfg, args.report, store_root=args.store)
@@ -0,0 +1,28 @@
+import csv
+
+from analysis import load_results, write_filled
+from results_store import ADDED_COLUMNS, REPORT_COLUMNS
+
+
+def test_fill_report_without_added_columns(tmp_path):
+    # A report.csv written before thread_count_batch / arrival_rate_rps existed
+    old = [c for c in REPORT_COLUMNS if c not in ADDED_COLUMNS]
+    source = tmp_path / "report.csv"
+    with open(source, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=old, restval="")
+        writer.writeheader()
+        for threads, tps in ((1, 10.0), (2, 18.0)):
+            writer.writerow({"model_name": "Tiny", "parameter_count_b": 1.0, "thread_count": threads,
+                             "benchmark_type": "decode", "input_tokens_target": "64", "decode_rate_tps": tps,
+                             "effective_throughput_tps": tps, "peak_ram_gb": 2.0, "ttft_ms": 50.0,
+                             "status": "success"})
+
+    data = load_results(str(source))
+    filled = tmp_path / "filled.csv"
+    write_filled(data, str(filled))
+
+    with open(filled, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == REPORT_COLUMNS
+    assert [r["thread_count_batch"] for r in rows] == ["", ""]
+    assert float(rows[1]["cies_score"]) == 18.0 / (2.0 * 1.0)
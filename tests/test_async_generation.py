@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from async_generation import AsyncLlama
+
+
+class StubLlm:
+    """Streams "t0 ", "t1 ", ... like llm(stream=True), honouring stopping_criteria."""
+
+    def __init__(self, delay_s: float = 0.0):
+        self.delay_s = delay_s
+        self.decoded = 0
+        # No KV cache: every handle ends with empty token_ids
+        self.input_ids = []
+        self.n_tokens = 0
+
+    def tokenize(self, text, add_bos=True, special=False):
+        return []
+
+    def __call__(self, prompt, stream, stopping_criteria, max_tokens=16, **kwargs):
+        def chunks():
+            for i in range(max_tokens):
+                time.sleep(self.delay_s)
+                self.decoded += 1
+                if stopping_criteria(None, None):
+                    yield {"choices": [{"text": "", "finish_reason": "stop"}]}
+                    return
+                yield {"choices": [{"text": f"t{i} ", "finish_reason": None}]}
+            yield {"choices": [{"text": "", "finish_reason": "length"}]}
+        return chunks()
+
+
+def test_slow_consumer_receives_every_piece():
+    async def main():
+        gen = AsyncLlama(StubLlm(), max_queue=4)
+        handle = gen.submit("x", max_tokens=10)
+        pieces = []
+        async for piece in handle:
+            pieces.append(piece)
+            await asyncio.sleep(0.05)
+        gen.close()
+        return pieces, handle
+
+    pieces, handle = asyncio.run(main())
+    assert pieces == [f"t{i} " for i in range(10)]
+    assert "".join(pieces) == handle.text
+    assert handle.finish_reason == "length"
+
+
+def test_backpressure_pauses_decode():
+    async def main():
+        llm = StubLlm()
+        gen = AsyncLlama(llm, max_queue=4)
+        handle = gen.submit("x", max_tokens=100)
+        await asyncio.sleep(0.3)
+        decoded = llm.decoded
+        handle.cancel()
+        await handle.wait()
+        gen.close()
+        return decoded, handle
+
+    decoded, handle = asyncio.run(main())
+    assert decoded <= 6
+    assert handle.finish_reason == "cancelled"
+
+
+def test_cancel_stops_within_one_token():
+    async def main():
+        llm = StubLlm(delay_s=0.01)
+        gen = AsyncLlama(llm, max_queue=4)
+        handle = gen.submit("x", max_tokens=100)
+        async for piece in handle:
+            if handle.tokens >= 3:
+                handle.cancel()
+        await handle.wait()
+        gen.close()
+        return llm, handle
+
+    llm, handle = asyncio.run(main())
+    assert handle.finish_reason == "cancelled"
+    assert llm.decoded <= handle.tokens + 2
+
+
+def test_deadline():
+    async def main():
+        gen = AsyncLlama(StubLlm(delay_s=0.01), max_queue=4)
+        handle = gen.submit("x", max_tokens=1000, deadline_s=0.2)
+        t0 = time.monotonic()
+        await handle.result()
+        await handle.wait()
+        gen.close()
+        return handle, time.monotonic() - t0
+
+    handle, elapsed = asyncio.run(main())
+    assert handle.finish_reason == "deadline"
+    assert elapsed < 1.0
+
+
+def test_close_right_after_result():
+    # close() blocks the loop; the producer must not still be waiting on it
+    async def main():
+        gen = AsyncLlama(StubLlm(), max_queue=4)
+        texts = [await gen.submit("x", max_tokens=3).result() for _ in range(3)]
+        gen.close()
+        return texts
+
+    assert asyncio.run(main()) == ["t0 t1 t2 "] * 3
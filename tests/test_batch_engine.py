@@ -0,0 +1,63 @@
+import pytest
+
+llama_cpp = pytest.importorskip("llama_cpp")
+
+import batch_engine
+from batch_engine import WEIGHTS_CTX, BatchEngine
+
+
+class StubLlm:
+    model = None
+
+    def n_vocab(self):
+        return 32
+
+    def token_eos(self):
+        return 2
+
+
+class StubPool:
+    def __init__(self):
+        self.released = []
+
+    def release(self, llm):
+        self.released.append(llm)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = StubPool()
+    loads = []
+
+    def get_model(model_key, n_ctx, n_threads, **kwargs):
+        loads.append(n_ctx)
+        return StubLlm()
+
+    freed = []
+    monkeypatch.setattr(batch_engine, "get_model", get_model)
+    monkeypatch.setattr(batch_engine, "get_pool", lambda: pool)
+    monkeypatch.setattr(BatchEngine, "_resolve_eog", staticmethod(lambda llm: None))
+    monkeypatch.setattr(llama_cpp, "llama_new_context_with_model", lambda model, params: object())
+    monkeypatch.setattr(llama_cpp, "llama_batch_init", lambda n_batch, embd, n_seq_max: object())
+    monkeypatch.setattr(llama_cpp, "llama_batch_free", lambda batch: None)
+    monkeypatch.setattr(llama_cpp, "llama_free", freed.append)
+    pool.loads = loads
+    pool.freed = freed
+    return pool
+
+
+def test_pooled_engine_loads_small_context_and_releases(pool):
+    engine = BatchEngine("tinyllama_15m", n_ctx=4096, n_threads=1)
+    engine.close()
+
+    assert pool.loads == [WEIGHTS_CTX]
+    assert pool.released == [engine.llm]
+    assert len(pool.freed) == 1 and engine.ctx is None
+
+
+def test_passed_in_llm_is_not_released(pool):
+    llm = StubLlm()
+    engine = BatchEngine("tinyllama_15m", n_ctx=2048, n_threads=1, llm=llm)
+    engine.close()
+
+    assert pool.loads == [] and pool.released == []
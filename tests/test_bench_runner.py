@@ -0,0 +1,18 @@
+from bench_runner import gate_failures
+
+
+def rows(*statuses):
+    return [{"model": f"m{i}", "status": status} for i, status in enumerate(statuses)]
+
+
+def test_gate_passes_clean_runs():
+    assert gate_failures(rows("unchanged", "improvement", "saved", "no baseline")) == []
+
+
+def test_gate_fails_regressions_and_broken_workers():
+    failed = gate_failures(rows("unchanged", "regression", "crashed", "timeout", "error"))
+    assert [r["status"] for r in failed] == ["regression", "crashed", "timeout", "error"]
+
+
+def test_gate_can_require_a_baseline():
+    assert [r["status"] for r in gate_failures(rows("unchanged", "no baseline"), require_baseline=True)] == ["no baseline"]
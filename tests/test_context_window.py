@@ -0,0 +1,83 @@
+import asyncio
+
+import numpy as np
+
+from async_generation import AsyncLlama
+from context_window import ChatContext
+
+
+class FakeLlm:
+    """
+    Byte-level tokenizer (BOS = 1) and a KV cache (input_ids / n_tokens)
+    that reuses the longest common prefix like llama does. Every reply is
+    `reply`; as in llama, the last sampled token is never evaluated.
+    """
+
+    def __init__(self, reply: bytes = b" ok, noted", n_ctx: int = 1024):
+        self.reply = reply
+        self._n_ctx = n_ctx
+        self.input_ids = np.zeros(n_ctx, dtype=np.intc)
+        self.n_tokens = 0
+        self.prefilled = []
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False):
+        return ([1] if add_bos else []) + list(text)
+
+    def detokenize(self, tokens):
+        return bytes(t for t in tokens if t != 1)
+
+    def __call__(self, prompt, max_tokens=16, stream=False, stopping_criteria=None, **kwargs):
+        cached = 0
+        for have, want in zip(self.input_ids[:self.n_tokens], prompt):
+            if have != want:
+                break
+            cached += 1
+        self.prefilled.append(len(prompt) - cached)
+        reply = list(self.reply[:max_tokens])
+        tokens = list(prompt) + reply[:-1]
+        self.input_ids[:len(tokens)] = tokens
+        self.n_tokens = len(tokens)
+        chunks = [{"choices": [{"text": chr(t), "finish_reason": None}]} for t in reply]
+        chunks.append({"choices": [{"text": "", "finish_reason": "length"}]})
+        if stream:
+            return (chunk for chunk in chunks)
+        return {"choices": [{"text": bytes(reply).decode(), "finish_reason": "length"}]}
+
+
+def test_committed_ids_keep_history_cached():
+    llm = FakeLlm()
+    chat = ChatContext(llm, policy="turns")
+    for turn in range(4):
+        prompt = chat.prepare(f"message {turn}")
+        history = len(chat)
+        assert chat.cached_prefix(prompt) == (history if turn else 0)
+        llm(prompt, max_tokens=32)
+        if turn:
+            # Only the new user message is prefilled
+            assert llm.prefilled[-1] == len(prompt) - history
+        chat.commit(llm.input_ids[len(prompt):llm.n_tokens])
+
+    text = llm.detokenize(chat.tokens()).decode()
+    assert text.startswith("User: message 0\nAI: ok, note\nUser: message 1\nAI:")
+
+
+def test_handle_token_ids_commit():
+    llm = FakeLlm()
+    chat = ChatContext(llm, policy="turns")
+
+    async def main():
+        gen = AsyncLlama(llm)
+        for turn in range(3):
+            prompt = chat.prepare(f"message {turn}")
+            assert chat.cached_prefix(prompt) == (len(chat) if turn else 0)
+            handle = gen.submit(prompt, max_tokens=32)
+            assert await handle.result() == " ok, noted"
+            assert bytes(handle.token_ids) == b" ok, note"
+            chat.commit(handle.token_ids)
+        gen.close()
+
+    asyncio.run(main())
+    assert llm.prefilled[1:] == [len(f"\nUser: message {t}\nAI:") for t in (1, 2)]
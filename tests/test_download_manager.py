@@ -0,0 +1,125 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import download_manager
+from download_manager import download_file
+
+DATA = bytes(range(256)) * 64  # 16 KiB
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves DATA at any path. server.mode: "ranges" (206 for Range requests),
+    "no-ranges" (no Accept-Ranges, always 200) or "ignores-range"
+    (advertises Accept-Ranges but still answers 200).
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _headers(self, status, length, start=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        if self.server.mode != "no-ranges":
+            self.send_header("Accept-Ranges", "bytes")
+        if start is not None:
+            self.send_header("Content-Range", f"bytes {start}-{start + length - 1}/{len(DATA)}")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers(200, len(DATA))
+
+    def do_GET(self):
+        spec = self.headers.get("Range")
+        self.server.ranges.append(spec)
+        if spec and self.server.mode == "ranges":
+            first, _, last = spec.split("=", 1)[1].partition("-")
+            start, end = int(first), int(last) if last else len(DATA) - 1
+            body = DATA[start:end + 1]
+            self._headers(206, len(body), start)
+        else:
+            body = DATA
+            self._headers(200, len(body))
+        self.wfile.write(body)
+
+
+@pytest.fixture(params=["ranges", "no-ranges", "ignores-range"])
+def server(request):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.mode = request.param
+    httpd.ranges = []
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/model.gguf"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_resumes_truncated_part(server, tmp_path):
+    (tmp_path / "model.gguf.part").write_bytes(DATA[:5000])
+
+    assert download_file(server.url, "model.gguf", str(tmp_path), size_bytes=len(DATA))
+
+    assert (tmp_path / "model.gguf").read_bytes() == DATA
+    assert not (tmp_path / "model.gguf.part").exists()
+    # A server that ignores Range answers 200 and the download restarts from byte 0
+    assert server.ranges == ["bytes=5000-"]
+
+
+def test_resumes_ranged_part(server, tmp_path):
+    # Interrupted two-range download: first range done, second 1000 bytes in
+    (tmp_path / "model.gguf.part").write_bytes(DATA[:9192] + bytes(len(DATA) - 9192))
+    state = {"total": len(DATA), "ranges": [[0, 8191, 8192], [8192, len(DATA) - 1, 1000]]}
+    (tmp_path / "model.gguf.part.json").write_text(json.dumps(state))
+
+    assert download_file(server.url, "model.gguf", str(tmp_path), size_bytes=len(DATA))
+
+    assert (tmp_path / "model.gguf").read_bytes() == DATA
+    assert not (tmp_path / "model.gguf.part.json").exists()
+    expected = {"ranges": ["bytes=9192-16383"], "no-ranges": [None], "ignores-range": ["bytes=9192-16383", None]}
+    assert server.ranges == expected[server.mode]
+
+
+def test_multi_chunk(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_manager, "MIN_CHUNK_SIZE", 1024)
+    sha = hashlib.sha256(DATA).hexdigest()
+
+    assert download_file(server.url, "model.gguf", str(tmp_path), size_bytes=len(DATA), sha256=sha, chunks=4)
+
+    assert (tmp_path / "model.gguf").read_bytes() == DATA
+    assert not (tmp_path / "model.gguf.part").exists()
+    assert not (tmp_path / "model.gguf.part.json").exists()
+    chunks = ["bytes=0-4095", "bytes=12288-16383", "bytes=4096-8191", "bytes=8192-12287"]
+    if server.mode == "ranges":
+        assert sorted(server.ranges) == chunks
+    elif server.mode == "no-ranges":
+        assert server.ranges == [None]
+    else:
+        # Every range came back 200, so it fell back to one plain stream
+        assert sorted(server.ranges[:-1]) == chunks and server.ranges[-1] is None
+
+
+def test_sha256_mismatch(server, tmp_path):
+    assert not download_file(server.url, "model.gguf", str(tmp_path), size_bytes=len(DATA), sha256="0" * 64)
+
+    assert not (tmp_path / "model.gguf").exists()
+    assert not (tmp_path / "model.gguf.part").exists()
+
+
+def test_size_mismatch(server, tmp_path):
+    assert not download_file(server.url, "model.gguf", str(tmp_path), size_bytes=len(DATA) + 1)
+
+    assert not (tmp_path / "model.gguf").exists()
+    assert server.ranges == []
+
+
+def test_existing_file_verified(server, tmp_path):
+    (tmp_path / "model.gguf").write_bytes(DATA)
+
+    assert download_file(server.url, "model.gguf", str(tmp_path), sha256=hashlib.sha256(DATA).hexdigest())
+    assert server.ranges == []
@@ -0,0 +1,84 @@
+import os
+import struct
+
+import pytest
+
+import models_config
+from gguf_reader import read_gguf_metadata
+from models_config import MODEL_REGISTRY, make_variant, register_local_variants, register_quant_variants
+from quant_matrix import relative_to
+
+
+def write_gguf(path, architecture: str = "llama"):
+    """Smallest valid GGUF: header, no tensors, one metadata string."""
+    def string(text):
+        data = text.encode()
+        return struct.pack("<Q", len(data)) + data
+
+    with open(path, "wb") as f:
+        f.write(b"GGUF" + struct.pack("<IQQ", 3, 0, 1))
+        f.write(string("general.architecture") + struct.pack("<I", 8) + string(architecture))
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    saved = dict(MODEL_REGISTRY)
+    yield MODEL_REGISTRY
+    MODEL_REGISTRY.clear()
+    MODEL_REGISTRY.update(saved)
+
+
+def test_register_local_variants(tmp_path):
+    for name in ("tinyllama-15M.Q4_K_M.gguf", "tinyllama-15M.Q8_0.gguf", "my-model.Q2_K.gguf", "untagged.gguf"):
+        write_gguf(tmp_path / name)
+
+    keys = register_local_variants(str(tmp_path))
+
+    assert sorted(keys) == ["my_model@Q2_K", "tinyllama_15m@Q4_K_M", "tinyllama_15m@Q8_0", "untagged@F32"]
+    entry = MODEL_REGISTRY["tinyllama_15m@Q8_0"]
+    assert entry["family"] == "tinyllama_15m"
+    assert entry["quant"] == "Q8_0"
+    assert entry["filename"] == str(tmp_path / "tinyllama-15M.Q8_0.gguf")
+    assert entry["name"] == "TinyLlama (15M) Q8_0"
+    assert entry["filesize"] == round(os.path.getsize(entry["filename"]) / (1024 ** 3), 6)
+    assert read_gguf_metadata(entry["filename"])["general.architecture"] == "llama"
+    # Absolute filenames resolve outside MODELS_DIR
+    assert models_config.get_model_path("my_model@Q2_K") == str(tmp_path / "my-model.Q2_K.gguf")
+
+
+def test_make_variant_swaps_quant_and_scales_size():
+    base = MODEL_REGISTRY["tinyllama_15m"]
+    entry = make_variant("tinyllama_15m", "Q8_0")
+
+    assert entry["filename"] == "tinyllama-15M.Q8_0.gguf"
+    assert "Q8_0" in entry["url"] and "Q4_K_M" not in entry["url"]
+    assert entry["family"] == "tinyllama_15m"
+    assert entry["filesize"] == round(base["filesize"] * 8.50 / 4.85, 2)
+    assert "sha256" not in entry
+
+
+def test_register_quant_variants_skips_unparseable_families(capsys):
+    keys = register_quant_variants()
+
+    assert "tinyllama_15m" in keys and "tinyllama_15m@Q2_K" in keys
+    assert not any(k.startswith(("falcon_11b", "starcoder2_15b")) for k in keys)
+    assert "Skipping falcon_11b" in capsys.readouterr().out
+
+
+def test_relative_to_reference_quant():
+    rows = [
+        {"family": "f", "quant": "Q4_K_M", "status": "success", "decode_tps": 20.0, "peak_ram_gb": 1.0,
+         "acc_total": 50.0},
+        {"family": "f", "quant": "Q8_0", "status": "success", "decode_tps": 15.0, "peak_ram_gb": 1.6,
+         "acc_total": 52.5},
+        {"family": "f", "quant": "Q2_K", "status": "crashed"},
+        {"family": "g", "quant": "Q8_0", "status": "success", "decode_tps": 9.0, "peak_ram_gb": 2.0},
+    ]
+
+    out = relative_to(rows, "Q4_K_M")
+
+    assert (out[0]["decode_vs_ref"], out[0]["ram_vs_ref"], out[0]["acc_delta"]) == (1.0, 1.0, 0.0)
+    assert (out[1]["decode_vs_ref"], out[1]["ram_vs_ref"], out[1]["acc_delta"]) == (0.75, 1.6, 2.5)
+    assert (out[2]["decode_vs_ref"], out[2]["ram_vs_ref"], out[2]["acc_delta"]) == ("", "", "")
+    # No reference quant in the family
+    assert out[3]["decode_vs_ref"] == ""
@@ -0,0 +1,37 @@
+import csv
+
+from results_store import ADDED_COLUMNS, REPORT_COLUMNS, append_row, migrate_report, read_report_rows
+
+OLD_COLUMNS = [c for c in REPORT_COLUMNS if c not in ADDED_COLUMNS]
+
+
+def read(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_append_keeps_existing_schema_until_migrated(tmp_path):
+    path = str(tmp_path / "report.csv")
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerow(OLD_COLUMNS)
+    row = {"model_name": "Tiny", "thread_count": 2, "arrival_rate_rps": 1.5, "status": "success"}
+
+    append_row(row, path)
+    header, first = read(path)
+    assert header == OLD_COLUMNS
+    assert len(first) == len(OLD_COLUMNS)
+
+    assert migrate_report(path) == ADDED_COLUMNS
+    assert migrate_report(path) == []
+    append_row(row, path)
+    header, first, second = read(path)
+    assert header == REPORT_COLUMNS
+    assert len(first) == len(OLD_COLUMNS)
+    rows = list(read_report_rows(path))
+    assert [r["arrival_rate_rps"] for r in rows] == ["", "1.5"]
+
+
+def test_new_file_gets_full_schema(tmp_path):
+    path = str(tmp_path / "report.csv")
+    append_row({"model_name": "Tiny"}, path)
+    assert read(path)[0] == REPORT_COLUMNS
@@ -0,0 +1,5 @@
+import cli
+
+
+def test_startup_within_budget():
+    assert cli.startup_check()
@@ -0,0 +1,367 @@
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psutil
+
+# EDGE_TRACE=<path> makes the demo and benchmarks write a Chrome trace there
+TRACE_ENV = "EDGE_TRACE"
+
+DEFAULT_CAPACITY = 1 << 16
+
+# Sampled values that only ever grow (exported as Prometheus counters)
+CUMULATIVE = {"ctx_switches_voluntary", "ctx_switches_involuntary"}
+
+# Event kinds
+SPAN = 0      # start + duration
+INSTANT = 1   # a point in time (e.g. a token)
+COUNTER = 2   # a sampled value (RSS, CPU, context switches)
+
+
+class Tracer:
+    """
+    Fixed-size ring buffer of trace events plus running totals.
+
+    Every slot list is allocated up front, so recording an event is a few
+    list stores and a counter bump: no allocation and no lock (the slot
+    index comes from itertools.count, which is atomic under the GIL).
+    Once the buffer wraps, the oldest events are overwritten; the per-name
+    totals behind the Prometheus metrics keep counting.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._kind = [0] * capacity
+        self._name = [0] * capacity
+        self._ts = [0] * capacity
+        self._dur = [0] * capacity
+        self._value = [0.0] * capacity
+        self._tid = [0] * capacity
+        self._next = itertools.count()
+        self._last = -1
+        self._names = []
+        self._ids = {}
+        self._names_lock = threading.Lock()
+        self.totals = {}      # name -> [count, total ns] for spans and instants
+        self.gauges = {}      # name -> last sampled value
+        self.t0 = time.perf_counter_ns()
+        self.enabled = True
+
+    def name_id(self, name: str) -> int:
+        nid = self._ids.get(name)
+        if nid is None:
+            with self._names_lock:
+                nid = self._ids.get(name)
+                if nid is None:
+                    self._names.append(name)
+                    self.totals.setdefault(name, [0, 0])
+                    nid = self._ids[name] = len(self._names) - 1
+        return nid
+
+    def _put(self, kind: int, name: str, ts: int, dur: int, value: float):
+        j = next(self._next)
+        i = j % self.capacity
+        self._kind[i] = kind
+        self._name[i] = self.name_id(name)
+        self._ts[i] = ts
+        self._dur[i] = dur
+        self._value[i] = value
+        self._tid[i] = threading.get_ident()
+        self._last = j
+
+    def span(self, name: str, start_ns: int, end_ns: int, value: float = 0.0):
+        """Record a finished phase (perf_counter_ns timestamps); value e.g. a token count."""
+        if not self.enabled:
+            return
+        self._put(SPAN, name, start_ns, end_ns - start_ns, value)
+        total = self.totals[name]
+        total[0] += 1
+        total[1] += end_ns - start_ns
+
+    def instant(self, name: str, value: float = 0.0, ts: int = None):
+        if not self.enabled:
+            return
+        self._put(INSTANT, name, ts or time.perf_counter_ns(), 0, value)
+        self.totals[name][0] += 1
+
+    def counter(self, name: str, value: float, ts: int = None):
+        if not self.enabled:
+            return
+        self._put(COUNTER, name, ts or time.perf_counter_ns(), 0, value)
+        self.gauges[name] = value
+
+    @contextmanager
+    def phase(self, name: str, value: float = 0.0):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.span(name, start, time.perf_counter_ns(), value)
+
+    def events(self) -> list:
+        """Buffered events, oldest first, as (kind, name, ts_ns, dur_ns, value, tid)."""
+        n = self._last + 1
+        count = min(n, self.capacity)
+        start = n - count
+        out = []
+        for j in range(start, n):
+            i = j % self.capacity
+            out.append((self._kind[i], self._names[self._name[i]], self._ts[i], self._dur[i],
+                        self._value[i], self._tid[i]))
+        return out
+
+    def clear(self):
+        self._next = itertools.count()
+        self._last = -1
+        self.totals = {name: [0, 0] for name in self._names}
+        self.gauges = {}
+
+    # --- export ---
+
+    def chrome_trace(self) -> dict:
+        """Chrome trace / Perfetto JSON (open in ui.perfetto.dev or chrome://tracing)."""
+        pid = os.getpid()
+        trace = []
+        for kind, name, ts, dur, value, tid in self.events():
+            us = (ts - self.t0) / 1000.0
+            if kind == SPAN:
+                trace.append({"name": name, "ph": "X", "ts": us, "dur": dur / 1000.0, "pid": pid, "tid": tid,
+                              "args": {"value": value} if value else {}})
+            elif kind == INSTANT:
+                trace.append({"name": name, "ph": "i", "s": "t", "ts": us, "pid": pid, "tid": tid,
+                              "args": {"value": value} if value else {}})
+            else:
+                trace.append({"name": name, "ph": "C", "ts": us, "pid": pid, "args": {name: value}})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str) -> int:
+        trace = self.chrome_trace()
+        with open(path, "w") as f:
+            json.dump(trace, f)
+        return len(trace["traceEvents"])
+
+    def prometheus_text(self, prefix: str = "edge") -> str:
+        """Prometheus text exposition: per-phase counts/seconds and the sampled gauges."""
+        lines = [
+            f"# HELP {prefix}_phase_seconds_total Time spent per traced phase.",
+            f"# TYPE {prefix}_phase_seconds_total counter",
+        ]
+        for name, (count, ns) in sorted(self.totals.items()):
+            if ns:
+                lines.append(f'{prefix}_phase_seconds_total{{phase="{name}"}} {ns / 1e9:.6f}')
+        lines += [
+            f"# HELP {prefix}_events_total Traced phases and instants (e.g. tokens).",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, (count, _) in sorted(self.totals.items()):
+            if count:
+                lines.append(f'{prefix}_events_total{{event="{name}"}} {count}')
+        for name, value in sorted(self.gauges.items()):
+            cumulative = name in CUMULATIVE
+            metric = f"{prefix}_{name}" + ("_total" if cumulative else "")
+            lines.append(f"# TYPE {metric} {'counter' if cumulative else 'gauge'}")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class SystemSampler:
+    """
+    Background thread adding RSS, CPU utilization, saturated cores and
+    context-switch counters to a tracer every interval_s. CPU figures match
+    report.csv's avg_cpu_util_percent / avg_saturated_cores definitions.
+    """
+
+    def __init__(self, tracer: Tracer, interval_s: float = 0.1):
+        self.tracer = tracer
+        self.interval_s = interval_s
+        self.proc = psutil.Process(os.getpid())
+        self.logical_cores = psutil.cpu_count() or 1
+        self._stop = threading.Event()
+        self._thread = None
+        self.n_samples = 0
+        self._util_sum = 0.0
+
+    def sample(self):
+        util = psutil.cpu_percent(interval=None)
+        switches = self.proc.num_ctx_switches()
+        ts = time.perf_counter_ns()
+        values = {
+            "rss_bytes": self.proc.memory_info().rss,
+            "cpu_util_percent": util,
+            "saturated_cores": round(util * self.logical_cores / 100.0, 2),
+            "process_cpu_percent": self.proc.cpu_percent(interval=None),
+            "ctx_switches_voluntary": switches.voluntary,
+            "ctx_switches_involuntary": switches.involuntary,
+        }
+        for name, value in values.items():
+            self.tracer.counter(name, value, ts)
+        self.n_samples += 1
+        self._util_sum += util
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.sample()
+
+    def start(self):
+        psutil.cpu_percent(interval=None)
+        self.proc.cpu_percent(interval=None)
+        self._thread = threading.Thread(target=self._run, name="trace-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def averages(self) -> dict:
+        """avg_cpu_util_percent / avg_saturated_cores over the samples taken."""
+        if not self.n_samples:
+            return {}
+        util = self._util_sum / self.n_samples
+        return {
+            "avg_cpu_util_percent": round(util, 2),
+            "avg_saturated_cores": round(util * self.logical_cores / 100.0, 2),
+        }
+
+
+def instrument(llm, tracer: Tracer):
+    """
+    Trace a Llama's hot path by shadowing its methods on the instance:
+    tokenize, eval (multi-token = prefill, one token = decode), sample
+    (one "token" instant per sampled token) and detokenize.
+    uninstrument() restores the class methods.
+    """
+    perf = time.perf_counter_ns
+    tokenize, eval_, sample, detokenize = llm.tokenize, llm.eval, llm.sample, llm.detokenize
+
+    def traced_tokenize(*args, **kwargs):
+        start = perf()
+        out = tokenize(*args, **kwargs)
+        tracer.span("tokenize", start, perf(), len(out))
+        return out
+
+    def traced_eval(tokens):
+        start = perf()
+        out = eval_(tokens)
+        n = len(tokens)
+        tracer.span("prefill" if n > 1 else "decode", start, perf(), n)
+        return out
+
+    def traced_sample(*args, **kwargs):
+        start = perf()
+        token = sample(*args, **kwargs)
+        end = perf()
+        tracer.span("sample", start, end)
+        tracer.instant("token", token, end)
+        return token
+
+    def traced_detokenize(*args, **kwargs):
+        start = perf()
+        out = detokenize(*args, **kwargs)
+        tracer.span("detokenize", start, perf())
+        return out
+
+    llm.tokenize = traced_tokenize
+    llm.eval = traced_eval
+    llm.sample = traced_sample
+    llm.detokenize = traced_detokenize
+    llm._tracer = tracer
+    return llm
+
+
+def uninstrument(llm):
+    for attr in ("tokenize", "eval", "sample", "detokenize", "_tracer"):
+        llm.__dict__.pop(attr, None)
+    return llm
+
+
+@contextmanager
+def traced(llm, tracer: Tracer = None, sample_interval_s: float = 0.1, path: str = None):
+    """
+    Instrument llm and sample system counters for the block; writes a
+    Chrome trace to path on exit if given. Yields (tracer, sampler).
+    """
+    tracer = tracer or Tracer()
+    sampler = SystemSampler(tracer, sample_interval_s).start()
+    instrument(llm, tracer)
+    try:
+        yield tracer, sampler
+    finally:
+        uninstrument(llm)
+        sampler.stop()
+        if path:
+            tracer.write_chrome_trace(path)
+
+
+def maybe_traced(llm, tracer: Tracer = None):
+    """traced() if a tracer is given or EDGE_TRACE names an output file, else a no-op yielding (None, None)."""
+    path = os.environ.get(TRACE_ENV)
+    if tracer is None and not path:
+        return nullcontext((None, None))
+    return traced(llm, tracer, path=path)
+
+
+def serve_metrics(tracer: Tracer, host: str = "127.0.0.1", port: int = 9464) -> ThreadingHTTPServer:
+    """
+    Serve GET /metrics (Prometheus text) and GET /trace (Chrome trace JSON)
+    from a daemon thread. Returns the server (call shutdown() to stop).
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                body, ctype = tracer.prometheus_text().encode(), "text/plain; version=0.0.4"
+            elif path == "/trace":
+                body, ctype = json.dumps(tracer.chrome_trace()).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trace one generation and export a Chrome trace.")
+    parser.add_argument("model", help="registry key")
+    parser.add_argument("--out", default="trace.json", help="Chrome trace / Perfetto JSON path")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--serve", type=int, metavar="PORT", help="keep serving /metrics and /trace on PORT")
+    args = parser.parse_args()
+
+    from benchmark_suite import _run_single_throughput
+    from model_pool import get_pool
+
+    with get_pool().lease(args.model, n_ctx=2048, n_threads=args.threads) as model:
+        with traced(model, path=args.out) as (trace, system):
+            result = _run_single_throughput(model, max_tokens=args.max_tokens)
+    phases = {name: round(ns / 1e6, 2) for name, (_, ns) in trace.totals.items() if ns}
+    print(f"✅ {result['decode_rate_tps']:.2f} t/s decode, TTFT {result['ttft_ms']:.1f} ms")
+    print(f"   Phase totals (ms): {phases}")
+    print(f"   System: {system.averages()}")
+    print(f"💾 Wrote {args.out}")
+    if args.serve:
+        serve_metrics(trace, port=args.serve)
+        print(f"Serving http://127.0.0.1:{args.serve}/metrics and /trace (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,124 @@
+import multiprocessing as mp
+import time
+import traceback
+from multiprocessing.connection import wait
+
+# spawn: workers start from a clean interpreter, so their RSS only
+# contains what the job itself loaded (no inherited llama allocations)
+_CTX = mp.get_context("spawn")
+
+
+def read_peak_rss_gb(pid="self") -> float:
+    """Peak resident set (VmHWM) of a process (default: this one) in GB."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / (1024 ** 2)
+    except OSError:
+        if pid != "self":
+            return None
+    import resource
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2)
+
+
+def _worker_main(conn, fn, args, kwargs):
+    try:
+        result = fn(*args, **kwargs)
+        conn.send(("success", result, None, read_peak_rss_gb()))
+    except BaseException as e:
+        conn.send(("error", None, f"{e!r}\n{traceback.format_exc()}", read_peak_rss_gb()))
+    finally:
+        conn.close()
+
+
+class _Job:
+    __slots__ = ("job_id", "proc", "conn", "started", "timeout_s")
+
+    def __init__(self, job_id, fn, args, kwargs, timeout_s):
+        parent, child = _CTX.Pipe(duplex=False)
+        self.job_id = job_id
+        self.conn = parent
+        self.timeout_s = timeout_s
+        self.proc = _CTX.Process(target=_worker_main, args=(child, fn, args, kwargs), daemon=True)
+        self.proc.start()
+        child.close()
+        self.started = time.monotonic()
+
+    def deadline(self) -> float:
+        return self.started + self.timeout_s
+
+    def outcome(self, status=None) -> dict:
+        out = {
+            "status": status or "crashed",
+            "result": None,
+            "error": None,
+            "peak_rss_gb": None,
+            "exitcode": None,
+            "timeout_s": self.timeout_s,
+            "wall_s": round(time.monotonic() - self.started, 2),
+        }
+        if status is None and self.conn.poll():
+            try:
+                out["status"], out["result"], out["error"], peak = self.conn.recv()
+                out["peak_rss_gb"] = round(peak, 3)
+            except (EOFError, OSError):
+                pass
+        if status == "timeout":
+            peak = read_peak_rss_gb(self.proc.pid)
+            out["peak_rss_gb"] = round(peak, 3) if peak is not None else None
+        else:
+            self.proc.join(timeout=10)
+        if self.proc.is_alive():
+            self.proc.kill()
+        self.proc.join()
+        out["exitcode"] = self.proc.exitcode
+        if out["status"] == "crashed":
+            out["error"] = f"worker exited with code {self.proc.exitcode}"
+        self.conn.close()
+        return out
+
+
+def run_isolated_many(jobs, max_workers: int = 1, timeout_s: float = 900):
+    """
+    Run jobs in separate worker processes and yield (job_id, outcome).
+
+    jobs: iterable of (job_id, fn, args, kwargs); fn must be importable
+    (module-level) because workers are spawned.
+
+    At most max_workers processes run at once. Each outcome dict carries
+    status ("success", "error", "timeout" or "crashed"), result, error,
+    the worker's own peak RSS (VmHWM) and wall time. A worker that
+    segfaults or overruns timeout_s is killed and reported; the rest of
+    the jobs keep running.
+    """
+    pending = list(jobs)
+    pending.reverse()
+    active = []
+
+    while pending or active:
+        while pending and len(active) < max(1, max_workers):
+            job_id, fn, args, kwargs = pending.pop()
+            active.append(_Job(job_id, fn, args, kwargs or {}, timeout_s))
+
+        next_deadline = min(j.deadline() for j in active)
+        handles = [j.conn for j in active] + [j.proc.sentinel for j in active]
+        ready = wait(handles, timeout=max(0.0, next_deadline - time.monotonic()))
+
+        now = time.monotonic()
+        still_active = []
+        for job in active:
+            if job.conn in ready or job.proc.sentinel in ready:
+                yield job.job_id, job.outcome()
+            elif now >= job.deadline():
+                yield job.job_id, job.outcome("timeout")
+            else:
+                still_active.append(job)
+        active = still_active
+
+
+def run_isolated(fn, *args, timeout_s: float = 900, **kwargs) -> dict:
+    """Run fn(*args, **kwargs) in one worker process and return its outcome."""
+    for _, outcome in run_isolated_many([(0, fn, args, kwargs)], timeout_s=timeout_s):
+        return outcome